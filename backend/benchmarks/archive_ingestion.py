@@ -0,0 +1,128 @@
+"""
+Archive ingestion benchmark against a local stub of the Chess.com API.
+
+Serves --months synthetic monthly archives of --games games each for one player
+(ETag, Last-Modified and 304 support, the current month changing on every request
+unless --static) from a thread on localhost, then loads the player's archives
+through ArchiveIngestionService three times: cold, warm, and warm after the
+refresh interval ran out. Reports time, upstream requests and streaming parse speed.
+
+Usage (from backend/):
+    python -m benchmarks.archive_ingestion [--months 12] [--games 500] [--static]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import tempfile
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from services.archive_ingestion import ArchiveIngestionService, iter_archive_games
+
+PLAYER = "stubplayer"
+PGN = ('[Event "Live Chess"]\n[White "stubplayer"]\n[Black "opponent"]\n[Result "1-0"]\n\n'
+       '1. e4 e5 2. Nf3 Nc6 3. Bb5 a6 4. Ba4 Nf6 5. O-O Be7 6. Re1 b5 7. Bb3 d6 1-0\n')
+
+
+def stub_server(months, games: int, static: bool):
+    """Chess.com-like API on an ephemeral port; returns (server, request counter)"""
+    bodies = {}
+    for year, month in months:
+        bodies[f"/player/{PLAYER}/games/{year:04d}/{month:02d}"] = json.dumps({"games": [
+            {"url": f"https://www.chess.com/game/live/{year}{month:02d}{i}", "pgn": PGN, "time_class": "blitz",
+             "end_time": 0, "rules": "chess", "white": {"username": PLAYER}, "black": {"username": "opponent"}}
+            for i in range(games)
+        ]}).encode()
+    bodies[f"/player/{PLAYER}/games/archives"] = json.dumps({"archives": [
+        f"https://api.chess.com/pub/player/{PLAYER}/games/{y:04d}/{m:02d}" for y, m in months
+    ]}).encode()
+    current = f"/player/{PLAYER}/games/{months[-1][0]:04d}/{months[-1][1]:02d}"
+    counter = {"requests": 0, "bytes": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            counter["requests"] += 1
+            body = bodies.get(self.path)
+            if body is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if self.path == current and not static:
+                body = body[:-2] + b', {"pgn": ""}]}'  # a game was played since the last request
+                bodies[self.path] = body
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            counter["bytes"] += len(body)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", formatdate(usegmt=True))
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, counter
+
+
+async def run(args):
+    now = time.gmtime()
+    months = []
+    year, month = now.tm_year, now.tm_mon
+    for _ in range(args.months):
+        months.append((year, month))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    months.reverse()
+    server, counter = stub_server(months, args.games, args.static)
+    service = ArchiveIngestionService(
+        cache_dir=tempfile.mkdtemp(prefix="archives_"),
+        chesscom_url=f"http://127.0.0.1:{server.server_port}",
+        refresh_seconds=3600,
+    )
+
+    print(f"{'load':<28}{'seconds':>9}{'requests':>10}{'MB':>8}")
+    paths = []
+    for label in ("cold", "warm", "warm, refresh expired"):
+        if label.startswith("warm, refresh"):
+            service.refresh_seconds = 0
+        before = dict(counter)
+        start = time.perf_counter()
+        paths = await service.recent_archives(PLAYER, args.months)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<28}{elapsed:>9.3f}{counter['requests'] - before['requests']:>10}"
+              f"{(counter['bytes'] - before['bytes']) / 1e6:>8.2f}")
+    await service.close()
+    server.shutdown()
+
+    start = time.perf_counter()
+    parsed = sum(1 for path in paths for _ in iter_archive_games(path))
+    elapsed = time.perf_counter() - start
+    print(f"\nstreaming parse: {parsed:,} games in {elapsed:.2f}s ({parsed / max(elapsed, 1e-9):,.0f} games/s)")
+    print(f"service counters: {service.stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--games", type=int, default=500)
+    parser.add_argument("--static", action="store_true", help="The current month doesn't change between requests")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Cache entry encoding benchmark: JSON vs the compact binary format (utils/eval_codec.py).
+
+Builds realistic cache entries (multi-line analyses with 10-20 move PVs, from
+random playouts) and reports, per entry, encode and decode time and payload size
+for both formats. With --redis it also writes both versions to Redis and compares
+MEMORY USAGE, which includes the key and Redis' own per-entry overhead.
+
+Usage (from backend/):
+    python -m benchmarks.cache_encoding [--entries 5000] [--multipv 3] [--redis redis://localhost:6379]
+"""
+import argparse
+import json
+import random
+import time
+import chess
+from utils.eval_codec import encode_eval, decode_eval
+
+
+def random_entry(rng: random.Random, multipv: int):
+    board = chess.Board()
+    for _ in range(rng.randint(8, 60)):
+        moves = list(board.legal_moves)
+        if not moves or board.is_game_over():
+            break
+        board.push(rng.choice(moves))
+    if board.is_game_over():
+        board = chess.Board()
+
+    pvs = []
+    for first in rng.sample(list(board.legal_moves), min(multipv, board.legal_moves.count())):
+        line = board.copy()
+        line.push(first)
+        moves = [first.uci()]
+        for _ in range(rng.randint(9, 19)):
+            if line.is_game_over():
+                break
+            move = rng.choice(list(line.legal_moves))
+            line.push(move)
+            moves.append(move.uci())
+        if rng.random() < 0.05:
+            pvs.append({"moves": " ".join(moves), "cp": None, "mate": rng.choice([-1, 1]) * rng.randint(1, 20)})
+        else:
+            pvs.append({"moves": " ".join(moves), "cp": rng.randint(-600, 600), "mate": None})
+    return {"fen": board.fen(), "knodes": rng.randint(500, 200000), "depth": rng.randint(14, 40), "pvs": pvs}
+
+
+def time_per_entry(fn, items) -> float:
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+
+def redis_memory(url: str, payloads, prefix: str) -> float:
+    from redis import Redis
+    client = Redis.from_url(url)
+    keys = [f"bench:{prefix}:{i:08x}{'0' * 24}" for i in range(len(payloads))]
+    pipe = client.pipeline(transaction=False)
+    for key, payload in zip(keys, payloads):
+        pipe.set(key, payload)
+    pipe.execute()
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.memory_usage(key, samples=0)
+    usage = pipe.execute()
+    client.delete(*keys)
+    return sum(usage) / len(usage)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=5000)
+    parser.add_argument("--multipv", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--redis", help="Redis URL to compare MEMORY USAGE per key")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    entries = [random_entry(rng, args.multipv) for _ in range(args.entries)]
+    json_payloads = [json.dumps(e) for e in entries]
+    binary_payloads = [encode_eval(e) for e in entries]
+    fens = [e["fen"] for e in entries]
+
+    # The binary format round-trips everything but the (externally keyed) FEN
+    assert all(decode_eval(b, e["fen"]) == e for b, e in zip(binary_payloads, entries))
+
+    results = {
+        "json": (
+            time_per_entry(json.dumps, entries),
+            time_per_entry(json.loads, json_payloads),
+            sum(len(p.encode()) for p in json_payloads) / len(entries),
+        ),
+        "binary": (
+            time_per_entry(encode_eval, entries),
+            time_per_entry(lambda p: decode_eval(p[0], p[1]), list(zip(binary_payloads, fens))),
+            sum(len(p) for p in binary_payloads) / len(entries),
+        ),
+    }
+
+    print(f"{args.entries} entries, {args.multipv} lines each\n")
+    json_size = results["json"][2]
+    print(f"{'format':<8}{'encode (us)':>13}{'decode (us)':>13}{'bytes':>9}{'vs json':>10}")
+    for name, (encode_us, decode_us, size) in results.items():
+        print(f"{name:<8}{encode_us:>13.1f}{decode_us:>13.1f}{size:>9.1f}{json_size / size:>9.2f}x")
+
+    if args.redis:
+        json_mem = redis_memory(args.redis, json_payloads, "json")
+        binary_mem = redis_memory(args.redis, binary_payloads, "binary")
+        print(f"\nRedis MEMORY USAGE per key: json {json_mem:.0f} B, binary {binary_mem:.0f} B "
+              f"({json_mem / binary_mem:.2f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
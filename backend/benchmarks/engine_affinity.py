@@ -0,0 +1,87 @@
+"""
+Nodes-to-depth benchmark: cold engines vs one warm engine per game.
+
+Analyses every position of a game to a fixed depth and reports the total nodes
+and time needed in three modes:
+
+- cold:     hash cleared before every position (`ucinewgame`), like a fresh engine
+- forward:  one warm engine, plies in game order, no `ucinewgame` between them
+- backward: one warm engine, plies from the last to the first (what reviews use)
+
+The review pipeline's choices (one warm engine per game, backward order) rest on
+the "nodes vs cold" column. Those figures depend on the Stockfish build, Hash size
+and depth, so none are recorded in the code: run this against the engine you
+deploy, at the depth of the profile you tune. Engines that don't report `nodes`
+(or test doubles with fixed node counts) make every mode read 1.00x.
+
+Usage (from backend/):
+    python -m benchmarks.engine_affinity [--engine PATH] [--depth 16] [--pgn game.pgn]
+"""
+import argparse
+import io
+import os
+import shutil
+import time
+import chess
+import chess.engine
+import chess.pgn
+
+SAMPLE_PGN = """
+1. e4 e5 2. Nf3 Nc6 3. Bb5 a6 4. Ba4 Nf6 5. O-O Be7 6. Re1 b5 7. Bb3 d6 8. c3 O-O
+9. h3 Nb8 10. d4 Nbd7 11. Nbd2 Bb7 12. Bc2 Re8 13. Nf1 Bf8 14. Ng3 g6 15. a4 c5
+16. d5 c4 17. Bg5 h6 18. Be3 Nc5 19. Qd2 h5 20. Bg5 Be7 21. Bh6 Nh7 *
+"""
+
+
+def game_positions(pgn_text: str):
+    game = chess.pgn.read_game(io.StringIO(pgn_text))
+    board = game.board()
+    positions = [board.copy()]
+    for move in game.mainline_moves():
+        board.push(move)
+        positions.append(board.copy())
+    return [p for p in positions if not p.is_game_over()]
+
+
+def run(engine: chess.engine.SimpleEngine, positions, depth: int, mode: str):
+    order = list(reversed(positions)) if mode == "backward" else positions
+    game = object()
+    nodes = 0
+    start = time.perf_counter()
+    for board in order:
+        token = object() if mode == "cold" else game
+        info = engine.analyse(board, chess.engine.Limit(depth=depth), game=token)
+        nodes += info.get("nodes", 0)
+    return nodes, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engine", default=os.getenv("STOCKFISH_PATH") or shutil.which("stockfish"))
+    parser.add_argument("--depth", type=int, default=16)
+    parser.add_argument("--hash", type=int, default=64, help="Hash size in MB")
+    parser.add_argument("--pgn", help="PGN file to analyse (defaults to a built-in game)")
+    args = parser.parse_args()
+    if not args.engine:
+        parser.error("no engine found: pass --engine or set STOCKFISH_PATH")
+
+    pgn_text = open(args.pgn).read() if args.pgn else SAMPLE_PGN
+    positions = game_positions(pgn_text)
+    print(f"{len(positions)} positions, depth {args.depth}, Hash {args.hash} MB, engine {args.engine}\n")
+
+    results = {}
+    for mode in ("cold", "forward", "backward"):
+        # Fresh process per mode so no mode inherits another's hash
+        with chess.engine.SimpleEngine.popen_uci(args.engine) as engine:
+            engine.configure({"Threads": 1, "Hash": args.hash})
+            results[mode] = run(engine, positions, args.depth, mode)
+
+    cold_nodes, cold_time = results["cold"]
+    print(f"{'mode':<10}{'nodes':>14}{'nodes/pos':>12}{'time (s)':>11}{'nodes vs cold':>16}")
+    for mode, (nodes, elapsed) in results.items():
+        speedup = cold_nodes / nodes if nodes else float("inf")
+        print(f"{mode:<10}{nodes:>14,}{nodes // len(positions):>12,}{elapsed:>11.2f}{speedup:>15.2f}x")
+
+
+if __name__ == "__main__":
+    main()
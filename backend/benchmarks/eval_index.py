@@ -0,0 +1,67 @@
+"""
+On-disk evaluation index lookup benchmark.
+
+Builds an index of --entries synthetic positions (keys random, records real-sized
+3-line analyses) in a temporary directory, or opens an existing one with --path,
+and reports the latency of hits and misses with and without decoding the record,
+next to a compaction of the whole log.
+
+Usage (from backend/):
+    python -m benchmarks.eval_index [--entries 1000000] [--lookups 200000] [--path DIR]
+"""
+import argparse
+import random
+import tempfile
+import time
+from services.eval_index import EvalIndex
+from utils.eval_codec import encode_eval, decode_eval
+from benchmarks.cache_encoding import random_entry
+
+
+def per_lookup_us(fn, keys) -> float:
+    start = time.perf_counter()
+    for key in keys:
+        fn(key)
+    return (time.perf_counter() - start) / len(keys) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=200_000)
+    parser.add_argument("--path", help="Existing index directory (skips the build)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    path = args.path or tempfile.mkdtemp(prefix="eval_index_")
+    index = EvalIndex(path, compact_bytes=1 << 62)
+
+    if not args.path:
+        samples = [encode_eval(random_entry(rng, 3)) for _ in range(1000)]
+        start = time.perf_counter()
+        batch = []
+        for _ in range(args.entries):
+            batch.append((rng.getrandbits(64), rng.choice(samples)))
+            if len(batch) == 10000:
+                index.put_many(batch)
+                batch = []
+        index.put_many(batch)
+        append_s = time.perf_counter() - start
+        start = time.perf_counter()
+        index.compact()
+        print(f"built {args.entries:,} entries in {path}: append {append_s:.1f}s, "
+              f"compact {time.perf_counter() - start:.1f}s")
+
+    keys = [key for key, _ in index.items()]
+    hits = [rng.choice(keys) for _ in range(args.lookups)]
+    misses = [rng.getrandbits(64) for _ in range(args.lookups)]
+    print(f"{len(index):,} positions indexed, {args.lookups:,} lookups each\n")
+    print(f"{'lookup':<22}{'us':>8}")
+    print(f"{'hit':<22}{per_lookup_us(index.get, hits):>8.2f}")
+    print(f"{'miss':<22}{per_lookup_us(index.get, misses):>8.2f}")
+    print(f"{'hit + decode':<22}{per_lookup_us(lambda k: decode_eval(index.get(k), ''), hits):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+UCI output parsing benchmark: python-chess vs services.uci_engine.
+
+Builds the `info` stream of one search (every depth up to --depth for each of
+--multipv lines, PVs growing with depth, plus `currmove` lines) and reports the
+parsing cost per search:
+
+- python-chess: every line parsed (PV replayed on a board) and merged, as `SimpleEngine` does
+- uci_engine:   latest raw line kept per multipv, parsed once at `bestmove`
+
+With --engine, also runs --searches real searches through `SimpleEngine.analyse`
+and `UciEngine.search` and reports searches per second.
+
+Usage (from backend/):
+    python -m benchmarks.uci_parsing [--depth 20] [--multipv 3] [--engine PATH] [--searches 200]
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import time
+import chess
+import chess.engine
+from services.uci_engine import UciEngine, parse_info, _multipv
+
+FEN = "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4"
+
+
+def random_line(board: chess.Board, length: int, rng: random.Random):
+    board = board.copy()
+    moves = []
+    for _ in range(length):
+        legal = list(board.legal_moves)
+        if not legal:
+            break
+        move = rng.choice(legal)
+        moves.append(move.uci())
+        board.push(move)
+    return moves
+
+
+def search_output(board: chess.Board, depth: int, multipv: int, seed: int = 1):
+    """`info` lines of one search, Stockfish style"""
+    rng = random.Random(seed)
+    roots = list(board.legal_moves)
+    lines = []
+    for d in range(1, depth + 1):
+        nodes = 1200 * d * d
+        for k in range(1, multipv + 1):
+            pv = " ".join(random_line(board, max(1, d - k + 2), rng))
+            lines.append(f"info depth {d} seldepth {d + 4} multipv {k} score cp {rng.randint(-80, 80)} "
+                         f"nodes {nodes} nps 1500000 hashfull {d * 7} tbhits 0 time {nodes // 1500} pv {pv}")
+        if d > depth // 2:
+            for n, move in enumerate(roots[:5], 1):
+                lines.append(f"info depth {d} currmove {move.uci()} currmovenumber {n}")
+    return lines
+
+
+def parse_python_chess(lines, board: chess.Board):
+    multipv = [{}]
+    for line in lines:
+        info = chess.engine._parse_uci_info(line[5:], board)
+        k = info.get("multipv", 1)
+        while len(multipv) < k:
+            multipv.append({})
+        multipv[k - 1].update(info)
+    return multipv
+
+
+def parse_uci_engine(lines, board: chess.Board):
+    latest = {}
+    for line in lines:
+        if line.startswith("info ") and " score " in line and "bound" not in line:
+            latest[_multipv(line)] = line
+    return [parse_info(latest[k], board.turn) for k in sorted(latest)]
+
+
+def per_search_us(parse, lines, board, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse(lines, board)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+async def native_searches(path: str, board: chess.Board, limit: chess.engine.Limit, multipv: int, n: int) -> float:
+    engine = await UciEngine.popen(path)
+    game = object()
+    start = time.perf_counter()
+    for _ in range(n):
+        await engine.search(board, limit, multipv, game)
+    elapsed = time.perf_counter() - start
+    await engine.quit()
+    return elapsed
+
+
+def simple_searches(path: str, board: chess.Board, limit: chess.engine.Limit, multipv: int, n: int) -> float:
+    with chess.engine.SimpleEngine.popen_uci(path) as engine:
+        game = object()
+        start = time.perf_counter()
+        for _ in range(n):
+            engine.analyse(board, limit, multipv=multipv, game=game)
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depth", type=int, default=20)
+    parser.add_argument("--multipv", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=200, help="Parses of the synthetic search to time")
+    parser.add_argument("--engine", default=os.getenv("STOCKFISH_PATH") or shutil.which("stockfish"))
+    parser.add_argument("--searches", type=int, default=200, help="Real searches per client (with --engine)")
+    parser.add_argument("--search-depth", type=int, default=8)
+    args = parser.parse_args()
+
+    board = chess.Board(FEN)
+    lines = search_output(board, args.depth, args.multipv)
+    ours = parse_uci_engine(lines, board)
+    theirs = parse_python_chess(lines, board)
+    assert [(i["score"], i["pv"], i["depth"]) for i in ours] == [(i["score"], i["pv"], i["depth"]) for i in theirs]
+
+    print(f"synthetic search: depth {args.depth}, multipv {args.multipv}, {len(lines)} info lines\n")
+    print(f"{'parser':<16}{'us/search':>12}{'us/line':>10}")
+    baseline = None
+    for name, parse in (("python-chess", parse_python_chess), ("uci_engine", parse_uci_engine)):
+        us = per_search_us(parse, lines, board, args.repeat)
+        baseline = baseline or us
+        print(f"{name:<16}{us:>12,.0f}{us / len(lines):>10.1f}   {baseline / us:.1f}x")
+
+    if not args.engine:
+        print("\nno engine (--engine / STOCKFISH_PATH): skipping real searches")
+        return
+    limit = chess.engine.Limit(depth=args.search_depth)
+    print(f"\n{args.searches} searches at depth {args.search_depth}, multipv {args.multipv}: {args.engine}")
+    print(f"{'client':<16}{'seconds':>9}{'searches/s':>12}")
+    for name, elapsed in (
+        ("SimpleEngine", simple_searches(args.engine, board, limit, args.multipv, args.searches)),
+        ("UciEngine", asyncio.run(native_searches(args.engine, board, limit, args.multipv, args.searches))),
+    ):
+        print(f"{name:<16}{elapsed:>9.2f}{args.searches / elapsed:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,3 +7,23 @@ LICHESS_API_TOKEN = os.getenv("LICHESS_API_TOKEN")
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./chess.db")
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 STOCKFISH_PATH = os.getenv("STOCKFISH_PATH")  # Optional: specify custom Stockfish path
+DEFAULT_ANALYSIS_PROFILE = os.getenv("ANALYSIS_PROFILE", "standard")  # fast | standard | deep
+OPENING_BOOK_PATH = os.getenv("OPENING_BOOK_PATH")  # Optional: Polyglot .bin opening book
+OPENING_NAMES_PATH = os.getenv("OPENING_NAMES_PATH")  # Optional: ECO names TSV file or directory
+SYZYGY_PATH = os.getenv("SYZYGY_PATH")  # Optional: directory of Syzygy tablebase files
+SYZYGY_MAX_PIECES = int(os.getenv("SYZYGY_MAX_PIECES", "5"))
+EVAL_INDEX_PATH = os.getenv("EVAL_INDEX_PATH")  # Optional: directory for the on-disk evaluation index
+EVAL_INDEX_COMPACT_MB = int(os.getenv("EVAL_INDEX_COMPACT_MB", "64"))  # Append log size that triggers a compaction
+PLAYER_ARCHIVE_DIR = os.getenv("PLAYER_ARCHIVE_DIR", "archives")  # Local game archives (PGN, or Chess.com monthly JSON) for player reports
+CHESSCOM_API_URL = os.getenv("CHESSCOM_API_URL", "https://api.chess.com/pub")  # Overridable to point ingestion at a stub server
+LICHESS_API_URL = os.getenv("LICHESS_API_URL", "https://lichess.org")
+ARCHIVE_REFRESH_SECONDS = float(os.getenv("ARCHIVE_REFRESH_SECONDS", "300"))  # Current-month archives served from disk this long before revalidating
+PLAYER_REPORT_MAX_GAMES = int(os.getenv("PLAYER_REPORT_MAX_GAMES", "200"))  # Games reviewed per player report
+ENGINE_POOL_SIZE = int(os.getenv("ENGINE_POOL_SIZE", "2"))  # Stockfish processes kept warm for analysis
+ENGINE_RESERVED_INTERACTIVE = int(os.getenv("ENGINE_RESERVED_INTERACTIVE", "0"))  # Pool engines kept free for board requests
+REVIEW_DEADLINE_SECONDS = float(os.getenv("REVIEW_DEADLINE_SECONDS", "300"))  # Budget for multi-position requests (game review, batch, PGN)
+POSITION_DEADLINE_SECONDS = float(os.getenv("POSITION_DEADLINE_SECONDS", "30"))  # Budget for a single position request
+# Admission control: queued engine checkouts per pooled engine at which analysis degrades
+ADMISSION_DEGRADE_AT = float(os.getenv("ADMISSION_DEGRADE_AT", "1"))  # cheaper profile
+ADMISSION_CACHE_ONLY_AT = float(os.getenv("ADMISSION_CACHE_ONLY_AT", "3"))  # cache / Lichess cloud answers only
+ADMISSION_REJECT_AT = float(os.getenv("ADMISSION_REJECT_AT", "6"))  # 503 with Retry-After
@@ -0,0 +1,39 @@
+import logging
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+from config import DATABASE_URL
+from models.games import Base
+
+logger = logging.getLogger(__name__)
+
+# SQLite connections are used from executor threads, not just the creating thread
+connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+
+engine = create_engine(DATABASE_URL, connect_args=connect_args, pool_pre_ping=True)
+SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+def _add_missing_columns():
+    """
+    `create_all` never alters a table that already exists: add the (nullable) columns
+    models gained since the table was created
+    """
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable:
+                    raise RuntimeError(f"Table {table.name} lacks required column {column.name}; migrate it by hand")
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}"))
+                logger.warning(f"Added missing column {table.name}.{column.name} ({column_type})")
+
+def init_db():
+    """Create any missing tables, and missing columns of existing ones"""
+    Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
@@ -1,14 +1,36 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from routers import game_router
 from services.game_review_service import get_game_review_service
+from services.analysis_profiles import get_analysis_profile
+from services.engine_pool import get_engine_pool
+from services.archive_ingestion import get_archive_service
+from utils.request_scope import run_request_scoped, ClientDisconnected
+from services.admission import Overloaded
+from services.startup import run_startup, startup_state
+from services.review_rescoring import rescore_reviews
+from config import REVIEW_DEADLINE_SECONDS
 from pydantic import BaseModel
+from typing import Optional
 
 # Additional classes for analysis
 class AnalyzeGameRequest(BaseModel):
     pgn: str
+    profile: Optional[str] = None  # analysis profile: fast | standard | deep
+    variations: bool = False  # also classify the moves of the PGN's sidelines
 
-app = FastAPI(title="CHESSER")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Discover Stockfish, connect caches and prewarm the engines before serving; stop them (and the archive client) on shutdown"""
+    await run_startup()
+    yield
+    await get_engine_pool().close()
+    await get_archive_service().close()
+
+app = FastAPI(title="CHESSER", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -30,9 +52,25 @@ print("APP is Running")
 class GameReviewRequest(BaseModel):
     pgn: str
 
+class RescoreReviewsRequest(BaseModel):
+    profile: Optional[str] = None  # only reviews made with this analysis profile
+    workers: Optional[int] = None  # scoring processes (default: CPU count)
+    dry_run: bool = False
+
 # include routers
 app.include_router(game_router.router, prefix="/games", tags=["games"])
 
+@app.get("/ready")
+async def ready():
+    """
+    Readiness probe: what startup found (Stockfish path, prewarmed engines, Redis,
+    opening book, tablebase, review database). 503 until analysis can be served.
+    """
+    return JSONResponse(
+        status_code=200 if startup_state["ready"] else 503,
+        content={**startup_state, "engine_pool": get_engine_pool().stats()}
+    )
+
 @app.get("/test-stockfish")
 async def test_stockfish():
     """
@@ -60,7 +98,7 @@ async def test_stockfish():
         }
 
 @app.post("/analyze-game-review")
-async def analyze_game_review(request: AnalyzeGameRequest):
+async def analyze_game_review(request: AnalyzeGameRequest, http_request: Request):
     """
     Analyze a complete game and return move classifications like Chess.com
     """
@@ -68,14 +106,30 @@ async def analyze_game_review(request: AnalyzeGameRequest):
     print(f"📥 [API ENDPOINT] Request received with PGN length: {len(request.pgn)}")
     print(f"📝 [API ENDPOINT] PGN preview: {request.pgn[:200]}...")
     
+    try:
+        profile = get_analysis_profile(request.profile)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     try:
         print("🚀 [API ENDPOINT] Starting game analysis...")
         service = get_game_review_service()
         print(f"🔧 [API ENDPOINT] Service created, Stockfish path: {service.stockfish_path}")
-        analysis = await service.analyze_game(request.pgn)
+        analysis = await run_request_scoped(
+            http_request, service.analyze_game(request.pgn, profile.name, request.variations), REVIEW_DEADLINE_SECONDS
+        )
         print("✅ [API ENDPOINT] Analysis completed successfully")
         print(f"📊 [API ENDPOINT] Returning analysis with {len(analysis.get('moves', []))} moves")
         return analysis
+    except ClientDisconnected:
+        print("🔌 [API ENDPOINT] Client disconnected, analysis cancelled")
+        return Response(status_code=499)
+    except Overloaded as e:
+        print(f"🚦 [API ENDPOINT] Review shed ({e.status_code}): {e.detail}")
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers)
+    except asyncio.TimeoutError:
+        print(f"⏱️ [API ENDPOINT] Analysis exceeded {REVIEW_DEADLINE_SECONDS:.0f}s deadline, cancelled")
+        raise HTTPException(status_code=504, detail="Game review took too long and was cancelled")
     except Exception as e:
         print(f"💥 [API ENDPOINT] Error during analysis: {e}")
         print(f"🔍 [API ENDPOINT] Error type: {type(e).__name__}")
@@ -83,6 +137,23 @@ async def analyze_game_review(request: AnalyzeGameRequest):
         print(f"📋 [API ENDPOINT] Full error:\n{traceback.format_exc()}")
         return {"error": str(e)}
 
+@app.post("/rescore-game-reviews")
+async def rescore_game_reviews(request: RescoreReviewsRequest):
+    """
+    Recompute classifications and accuracy of every stored review from its stored
+    per-ply engine outputs (no engine runs). Same as `python -m tools.rescore_reviews`.
+    """
+    print(f"♻️ [API ENDPOINT] Rescoring stored reviews (profile: {request.profile or 'all'})")
+    try:
+        loop = asyncio.get_running_loop()
+        stats = await loop.run_in_executor(
+            None, rescore_reviews, request.profile, request.workers, request.dry_run
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    print(f"✅ [API ENDPOINT] Rescored {stats['rescored']} reviews in {stats['seconds']}s")
+    return stats
+
 @app.post("/debug-pgn")
 async def debug_pgn(request: AnalyzeGameRequest):
     """Debug endpoint to test PGN parsing without analysis"""
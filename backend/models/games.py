@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, JSON, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -15,3 +15,31 @@ class Game(Base):
     inaccuracies = Column(Integer)
     result = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+class GameReview(Base):
+    """Completed game review, keyed by the normalised move sequence and analysis profile"""
+    __tablename__ = "game_reviews"
+    __table_args__ = (UniqueConstraint("moves_hash", "profile", name="uq_game_reviews_moves_profile"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    moves_hash = Column(String(64), nullable=False, index=True)
+    profile = Column(String(32), nullable=False)
+    pgn = Column(String, nullable=False)
+    total_moves = Column(Integer)
+    white_accuracy = Column(Float)
+    black_accuracy = Column(Float)
+    review = Column(JSON, nullable=False)
+    plies = Column(JSON(none_as_null=True))  # raw per-ply scoring inputs, so reviews can be rescored without the engine
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ReviewPosition(Base):
+    """Engine result for one position, shared by every stored review that reached it"""
+    __tablename__ = "review_positions"
+    __table_args__ = (UniqueConstraint("profile", "position_key", name="uq_review_positions_profile_key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    profile = Column(String(32), nullable=False)
+    position_key = Column(String(16), nullable=False)  # Zobrist hash, hex
+    eval = Column(Float, nullable=False)  # pawns, side to move, utils.score review scale
+    best_move = Column(String(8))
+    full = Column(Boolean, nullable=False, default=False)  # searched with the full profile, not the screening one
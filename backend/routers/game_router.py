@@ -1,28 +1,41 @@
-from fastapi import APIRouter, HTTPException, Query
-from schemas.game import GameAnalysisRequest, GameAnalysisResponse, MoveAnalysis
+from fastapi import APIRouter, HTTPException, Query, Request, Response, WebSocket
+from fastapi.responses import StreamingResponse
+from schemas.game import GameAnalysisRequest, GameAnalysisResponse, MoveAnalysis, PlayerReportRequest
 from services.lichess_services import fetch_game_by_url
-from utils.chess_utils import parse_pgn_moves, pgn_to_fens
+from utils.chess_utils import parse_pgn_moves, pgn_to_fens, tree_positions
 from services.analysis_services import calculate_accuracy
 from services.enhanced_analysis_service import get_analysis_service
+from services.analysis_profiles import get_analysis_profile
+from services.live_analysis import LiveAnalysisSession
+from services.player_report import player_report_events, read_archive
+from services.archive_ingestion import get_archive_service, iter_archive_games, ArchiveNotFound
+from services.engine_pool import get_engine_pool
+from services.admission import get_admission_controller, Overloaded, QUALITY_REJECTED
+from utils.request_scope import run_request_scoped, ClientDisconnected
+from config import POSITION_DEADLINE_SECONDS, REVIEW_DEADLINE_SECONDS
 from typing import List, Optional
+import asyncio
+import json
+import os
 import httpx
 import chess
 
 router = APIRouter()
 
 @router.post("/analyze", response_model=GameAnalysisResponse)
-async def analyze_game(request: GameAnalysisRequest):
+async def analyze_game(request: GameAnalysisRequest, http_request: Request):
     print("/analyze endpoint was hit")
 
     # 1️⃣ Get PGN either from Lichess URL or directly
     if request.lichess_url:
         try:
             data = await fetch_game_by_url(request.lichess_url)
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code == 404:
-                raise HTTPException(status_code=400, detail="Lichess game not found. Please check the URL.")
-            else:
-                raise HTTPException(status_code=400, detail=f"Error fetching game from Lichess: {e}")
+        except ArchiveNotFound:
+            raise HTTPException(status_code=400, detail="Lichess game not found. Please check the URL.")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except httpx.HTTPError as e:
+            raise HTTPException(status_code=400, detail=f"Error fetching game from Lichess: {e}")
         pgn = data.get("pgn")
         if not pgn:
             raise HTTPException(status_code=400, detail="Unable to fetch PGN from Lichess")
@@ -39,11 +52,21 @@ async def analyze_game(request: GameAnalysisRequest):
     if not moves:
         raise HTTPException(status_code=400, detail="No valid moves found in PGN. Please check the PGN format.")
 
-    # 3️⃣ Calculate real accuracy using Lichess analysis API
+    # 3️⃣ Calculate accuracy from local analysis of every position (cache → cloud → engine pool)
     try:
-        accuracy, blunders, mistakes, inaccuracies, move_analysis_data = await calculate_accuracy(pgn)
+        accuracy, blunders, mistakes, inaccuracies, move_analysis_data = await run_request_scoped(
+            http_request, calculate_accuracy(pgn), REVIEW_DEADLINE_SECONDS
+        )
+    except Overloaded as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers)
+    except ClientDisconnected:
+        return Response(status_code=499)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Game analysis took too long and was cancelled")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching Lichess analysis: {e}")
+        raise HTTPException(status_code=500, detail=f"Game analysis failed: {e}")
 
     # 4️⃣ Convert move analysis to Pydantic models
     move_analysis = [MoveAnalysis(**m) for m in move_analysis_data]
@@ -59,13 +82,20 @@ async def analyze_game(request: GameAnalysisRequest):
 
 @router.get("/analyze-fen")
 async def analyze_fen(
+    http_request: Request,
     fen: str = Query(..., description="FEN string to analyze"),
-    depth: int = Query(15, description="Analysis depth for Stockfish fallback"),
-    multi_pv: int = Query(1, description="Number of principal variations")
+    depth: Optional[int] = Query(None, description="Analysis depth for Stockfish fallback (overrides the profile depth)"),
+    multi_pv: int = Query(1, description="Number of principal variations"),
+    profile: Optional[str] = Query(None, description="Analysis profile: fast, standard or deep")
 ):
     """
     Analyze a single FEN position with Lichess Cloud Eval + Stockfish fallback
     """
+    try:
+        analysis_profile = get_analysis_profile(profile)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
         # Validate FEN
         board = chess.Board(fen)
@@ -74,7 +104,11 @@ async def analyze_fen(
         
         # Analyze the position
         service = get_analysis_service()
-        result = await service.analyze_position(fen, multi_pv, depth)
+        result = await run_request_scoped(
+            http_request,
+            service.analyze_position(fen, multi_pv, depth, analysis_profile.name),
+            POSITION_DEADLINE_SECONDS
+        )
         
         return {
             "success": True,
@@ -82,24 +116,56 @@ async def analyze_fen(
             "fen": result.fen,
             "evaluation": result.evaluation,
             "depth": result.depth,
-            "time_taken": result.time_taken
+            "time_taken": result.time_taken,
+            "profile": analysis_profile.name,
+            "quality": result.quality
         }
         
+    except Overloaded as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers)
+    except ClientDisconnected:
+        # The board moved on to another position; the search was stopped
+        return Response(status_code=499)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Analysis took too long and was cancelled")
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Invalid FEN: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+@router.websocket("/live")
+async def live_analysis(websocket: WebSocket):
+    """
+    Live engine analysis for the interactive board: send positions, receive
+    streamed depth/score/PV updates. A new position stops the previous search.
+    """
+    await websocket.accept()
+    await LiveAnalysisSession(websocket).run()
+
+@router.get("/engine-stats")
+async def engine_stats():
+    """
+    Engine pool scheduler metrics: engines in use and queue wait per traffic class
+    (interactive board requests, game reviews, bulk batches)
+    """
+    return get_engine_pool().stats()
+
 @router.post("/analyze-batch")
 async def analyze_batch_fens(
-    request: dict  # {"fens": ["fen1", "fen2", ...], "depth": 12}
+    http_request: Request,
+    request: dict  # {"fens": ["fen1", "fen2", ...], "depth": 12, "profile": "fast"}
 ):
     """
     Analyze multiple FEN positions efficiently
     """
+    try:
+        analysis_profile = get_analysis_profile(request.get("profile"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
         fens = request.get("fens", [])
-        depth = request.get("depth", 12)
+        depth = request.get("depth")
         
         if not fens:
             raise HTTPException(status_code=400, detail="No FENs provided")
@@ -116,56 +182,95 @@ async def analyze_batch_fens(
             except ValueError:
                 raise HTTPException(status_code=400, detail=f"Invalid FEN at index {i}: {fen}")
         
+        # Shed bulk work up front when the engines are saturated
+        admission = get_admission_controller()
+        if admission.quality("bulk") == QUALITY_REJECTED:
+            raise admission.reject("bulk")
+        
         # Analyze all positions
         service = get_analysis_service()
-        results = await service.analyze_multiple_positions(fens, depth)
+        results = await run_request_scoped(
+            http_request,
+            service.analyze_multiple_positions(fens, depth, analysis_profile.name),
+            REVIEW_DEADLINE_SECONDS
+        )
         
         return {
             "success": True,
             "total_positions": len(fens),
+            "profile": analysis_profile.name,
             "results": [
                 {
                     "source": result.source,
                     "fen": result.fen,
                     "evaluation": result.evaluation,
                     "depth": result.depth,
-                    "time_taken": result.time_taken
+                    "time_taken": result.time_taken,
+                    "quality": result.quality
                 }
                 for result in results
             ]
         }
         
+    except Overloaded as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers)
+    except ClientDisconnected:
+        return Response(status_code=499)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Batch analysis took too long and was cancelled")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Batch analysis failed: {str(e)}")
 
 @router.post("/analyze-pgn")
 async def analyze_pgn_positions(
-    request: dict  # {"pgn": "...", "depth": 12, "every_n_moves": 2}
+    http_request: Request,
+    request: dict  # {"pgn": "...", "depth": 12, "every_n_moves": 2, "profile": "fast", "variations": false}
 ):
     """
-    Analyze key positions from a PGN game
+    Analyze key positions from a PGN game. With "variations", every line of the PGN
+    tree is sampled; positions reached in several lines or by transposition are
+    analysed once, so the cost follows the number of unique positions.
     """
+    try:
+        analysis_profile = get_analysis_profile(request.get("profile"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
         pgn = request.get("pgn", "")
-        depth = request.get("depth", 12)
+        depth = request.get("depth")
         every_n_moves = request.get("every_n_moves", 2)  # Analyze every 2nd move to save time
+        variations = bool(request.get("variations", False))
         
         if not pgn:
             raise HTTPException(status_code=400, detail="No PGN provided")
         
         # Convert PGN to FENs
-        fens = pgn_to_fens(pgn, every_n_moves)
+        if variations:
+            positions = tree_positions(pgn, every_n_moves)
+            fens = [position["fen"] for position in positions]
+        else:
+            fens = pgn_to_fens(pgn, every_n_moves)
         
         if not fens:
             raise HTTPException(status_code=400, detail="No valid positions found in PGN")
         
+        admission = get_admission_controller()
+        if admission.quality("bulk") == QUALITY_REJECTED:
+            raise admission.reject("bulk")
+        
         # Analyze positions
         service = get_analysis_service()
-        results = await service.analyze_multiple_positions(fens, depth)
+        results = await run_request_scoped(
+            http_request,
+            service.analyze_multiple_positions(fens, depth, analysis_profile.name),
+            REVIEW_DEADLINE_SECONDS
+        )
         
-        return {
+        response = {
             "success": True,
             "pgn": pgn,
+            "profile": analysis_profile.name,
             "total_positions": len(fens),
             "analyzed_every_n_moves": every_n_moves,
             "results": [
@@ -175,11 +280,115 @@ async def analyze_pgn_positions(
                     "fen": result.fen,
                     "evaluation": result.evaluation,
                     "depth": result.depth,
-                    "time_taken": result.time_taken
+                    "time_taken": result.time_taken,
+                    "quality": result.quality
                 }
                 for i, result in enumerate(results)
             ]
         }
+        if variations:
+            # Positions are listed once: the first ply reaching each, and how many tree nodes do
+            for item, position in zip(response["results"], positions):
+                item["move_number"] = (position["ply"] + 1) // 2
+                item["ply"] = position["ply"]
+                item["nodes"] = position["nodes"]
+            response["total_nodes"] = sum(position["nodes"] for position in positions)
+        return response
         
+    except Overloaded as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers)
+    except ClientDisconnected:
+        return Response(status_code=499)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="PGN analysis took too long and was cancelled")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"PGN analysis failed: {str(e)}")
+
+@router.post("/player-report")
+async def player_report(request: PlayerReportRequest, http_request: Request):
+    """
+    Review a batch of one player's games (PGNs, a local archive file or their latest
+    Chess.com months, fetched through the archive cache) across the
+    engine pool and report aggregate accuracy, classification distribution, opening
+    performance and worst moments. Streams newline-delimited JSON progress events
+    ending with the report unless `stream` is false.
+    """
+    try:
+        profile = get_analysis_profile(request.profile)
+        loop = asyncio.get_running_loop()
+        # Archives are megabytes of JSON / PGN: parse them off the event loop
+        if request.chesscom_months:
+            paths = await get_archive_service().recent_archives(request.player, request.chesscom_months)
+            pgns = await loop.run_in_executor(
+                None, lambda: [game["pgn"] for path in paths for game in iter_archive_games(path) if game.get("pgn")]
+            )
+        else:
+            pgns = request.pgns or await loop.run_in_executor(None, lambda: list(read_archive(request.archive)))
+    except (FileNotFoundError, ArchiveNotFound) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Error fetching archives from Chess.com: {e}")
+
+    admission = get_admission_controller()
+    if admission.quality("review") == QUALITY_REJECTED:
+        e = admission.reject("review")
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers)
+
+    events = player_report_events(request.player, pgns, profile.name)
+    try:
+        first = await events.__anext__()  # validation errors surface before the response starts
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if request.stream:
+        async def lines():
+            yield json.dumps(first) + "\n"
+            async for event in events:
+                yield json.dumps(event) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    async def collect():
+        report = first
+        async for event in events:
+            report = event
+        return report
+
+    try:
+        return await run_request_scoped(http_request, collect())
+    except ClientDisconnected:
+        return Response(status_code=499)
+
+@router.get("/archives/{username}")
+async def player_archives(
+    username: str,
+    months: int = Query(1, ge=1, le=24, description="Latest monthly archives to include")
+):
+    """
+    A Chess.com player's games of the latest months, in the Chess.com API format
+    ({"games": [...]}), through the server-side archive cache: finished months are
+    fetched once, the current one is revalidated with conditional requests.
+    """
+    service = get_archive_service()
+    try:
+        paths = await service.recent_archives(username, months)
+    except ArchiveNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Error fetching archives from Chess.com: {e}")
+    games = await asyncio.get_running_loop().run_in_executor(
+        None, lambda: [game for path in paths for game in iter_archive_games(path)]
+    )
+    return {
+        "username": username,
+        "archives": [os.path.basename(path)[:-len(".json")] for path in paths],
+        "games": games,
+    }
+
+@router.get("/archive-stats")
+async def archive_stats():
+    """Archive ingestion counters: upstream requests (and 304s among them) and files served from disk"""
+    return get_archive_service().stats
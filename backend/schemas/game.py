@@ -24,3 +24,17 @@ class GameAnalysisResponse(BaseModel):
     mistakes: int
     inaccuracies: int
     move_analysis: List[MoveAnalysis]
+
+class PlayerReportRequest(BaseModel):
+    player: str  # username as it appears in the White/Black headers
+    pgns: Optional[List[str]] = None
+    archive: Optional[str] = None  # file in PLAYER_ARCHIVE_DIR: PGN or Chess.com monthly JSON
+    chesscom_months: Optional[int] = None  # the player's latest Chess.com monthly archives
+    profile: Optional[str] = None
+    stream: bool = True  # newline-delimited JSON progress events, then the report
+
+    @model_validator(mode='after')
+    def one_source(self):
+        if sum(map(bool, (self.pgns, self.archive, self.chesscom_months))) != 1:
+            raise ValueError("Provide exactly one of 'pgns', 'archive' or 'chesscom_months' in the request body.")
+        return self
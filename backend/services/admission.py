@@ -0,0 +1,110 @@
+"""
+Admission control in front of the analysis services: degrade, then shed, as the engines saturate
+"""
+import math
+import logging
+from typing import Dict
+from config import ADMISSION_DEGRADE_AT, ADMISSION_CACHE_ONLY_AT, ADMISSION_REJECT_AT
+from services.engine_pool import EnginePool, get_engine_pool
+
+logger = logging.getLogger(__name__)
+
+# Quality levels, best first. Responses report the level they were served at.
+QUALITY_FULL = "full"          # requested profile
+QUALITY_DEGRADED = "degraded"  # cheaper profile (see AnalysisProfile.degraded)
+QUALITY_CACHED = "cached"      # cache, tablebase or Lichess cloud only - no engine search
+QUALITY_REJECTED = "rejected"
+
+# Bulk work feels the pressure first, so it degrades and sheds before board and review traffic
+CLASS_SENSITIVITY: Dict[str, float] = {"interactive": 1.0, "review": 1.0, "bulk": 2.0}
+
+# Queued checkouts one class may have before its new requests get 429
+MAX_QUEUED: Dict[str, int] = {"interactive": 50, "review": 10, "bulk": 10}
+
+
+class Overloaded(Exception):
+    """Request shed by the admission controller; maps to an HTTP 503/429 with Retry-After"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(self.retry_after)}
+
+
+class AdmissionController:
+    """
+    Picks the quality level for a new request from the engine pool's queue depth.
+
+    Pressure is queued engine checkouts per pooled engine (scaled by the traffic
+    class's sensitivity). Below ADMISSION_DEGRADE_AT requests run at full quality,
+    then with a degraded profile, then from cached / cloud answers only, and past
+    ADMISSION_REJECT_AT they are rejected. Callers still serve a request at the
+    "rejected" level if a cache answer exists; `reject()` builds the error otherwise.
+    """
+
+    def __init__(self, pool: EnginePool, degrade_at: float = 1.0,
+                 cache_only_at: float = 3.0, reject_at: float = 6.0):
+        self.pool = pool
+        self.degrade_at = degrade_at
+        self.cache_only_at = cache_only_at
+        self.reject_at = reject_at
+
+    def pressure(self, priority: str) -> float:
+        stats = self.pool.scheduler.stats()
+        waiting = sum(c["waiting"] for c in stats["classes"].values())
+        return waiting / self.pool.size * CLASS_SENSITIVITY.get(priority, 1.0)
+
+    def quality(self, priority: str) -> str:
+        """Quality level a new `priority` request should be served at"""
+        waiting = self.pool.scheduler.stats()["classes"][priority]["waiting"]
+        if waiting >= MAX_QUEUED.get(priority, 10):
+            return QUALITY_REJECTED
+        pressure = self.pressure(priority)
+        if pressure >= self.reject_at:
+            return QUALITY_REJECTED
+        if pressure >= self.cache_only_at:
+            return QUALITY_CACHED
+        if pressure >= self.degrade_at:
+            return QUALITY_DEGRADED
+        return QUALITY_FULL
+
+    def retry_after(self, priority: str) -> int:
+        """Seconds until a retry is likely to be admitted, from recent queue waits"""
+        p95_ms = self.pool.scheduler.stats()["classes"][priority]["p95_wait_ms"]
+        return max(1, min(60, math.ceil(p95_ms / 1000)))
+
+    def reject(self, priority: str) -> Overloaded:
+        """The error for a request that can't be served at any quality level"""
+        retry_after = self.retry_after(priority)
+        waiting = self.pool.scheduler.stats()["classes"][priority]["waiting"]
+        if waiting >= MAX_QUEUED.get(priority, 10):
+            # This class has more queued work than its share: the client should back off
+            logger.warning(f"Shedding {priority} request: {waiting} already queued")
+            return Overloaded(429, f"Too many queued {priority} analysis requests", retry_after)
+        logger.warning(f"Shedding {priority} request: engines saturated (pressure {self.pressure(priority):.1f})")
+        return Overloaded(503, "Analysis engines are saturated", retry_after)
+
+    def admit(self, priority: str) -> str:
+        """Quality level for a request that needs an engine; raises Overloaded when shed"""
+        level = self.quality(priority)
+        if level == QUALITY_REJECTED:
+            raise self.reject(priority)
+        return level
+
+
+# Global instance - lazy initialization
+admission_controller = None
+
+def get_admission_controller():
+    """Get or create the admission controller for the shared engine pool"""
+    global admission_controller
+    if admission_controller is None:
+        admission_controller = AdmissionController(
+            get_engine_pool(), ADMISSION_DEGRADE_AT, ADMISSION_CACHE_ONLY_AT, ADMISSION_REJECT_AT
+        )
+    return admission_controller
@@ -0,0 +1,100 @@
+"""
+Named analysis profiles ("fast", "standard", "deep") shared by every analysis service.
+
+A profile bundles the search limits (depth / nodes / time) with the engine
+options used for the search, so the same name means the same cost whether the
+position comes from /games/analyze-fen or from a full game review.
+The node budget is the primary limit: it gives a deterministic, load-independent
+cost per position. Depth and time only act as ceilings.
+"""
+from typing import Optional, Dict, Any, Union
+import chess.engine
+from pydantic import BaseModel, ConfigDict
+from config import DEFAULT_ANALYSIS_PROFILE
+
+
+class AnalysisProfile(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    name: str
+    depth: Optional[int] = None
+    nodes: Optional[int] = None
+    time: Optional[float] = None  # seconds per position (safety ceiling)
+    threads: int = 1
+    hash_mb: int = 16
+    parent: Optional[str] = None  # set on derived screening profiles (see `shallow()`)
+
+    def limit(self) -> chess.engine.Limit:
+        """python-chess search limit for this profile"""
+        return chess.engine.Limit(depth=self.depth, nodes=self.nodes, time=self.time)
+
+    def engine_options(self) -> Dict[str, Any]:
+        """UCI options to configure before searching with this profile"""
+        return {"Threads": self.threads, "Hash": self.hash_mb}
+
+    def go_command(self) -> str:
+        """Raw UCI `go` command enforcing the same limits as `limit()`"""
+        parts = ["go"]
+        if self.depth:
+            parts += ["depth", str(self.depth)]
+        if self.nodes:
+            parts += ["nodes", str(self.nodes)]
+        if self.time:
+            parts += ["movetime", str(int(self.time * 1000))]
+        return " ".join(parts)
+
+    def with_depth(self, depth: Optional[int]) -> "AnalysisProfile":
+        """Copy of this profile with an explicit depth override (None keeps the profile depth)"""
+        if not depth or depth == self.depth:
+            return self
+        return self.model_copy(update={"depth": depth})
+
+    def shallow(self) -> "AnalysisProfile":
+        """Cheap screening budget derived from this profile (used for first-pass game reviews)"""
+        return self.model_copy(update={
+            "name": f"{self.name}-shallow",
+            "parent": self.name,
+            "depth": max(6, self.depth // 2) if self.depth else None,
+            "nodes": max(20_000, self.nodes // 10) if self.nodes else None,
+            "time": self.time / 4 if self.time else None,
+        })
+
+    def degraded(self) -> "AnalysisProfile":
+        """
+        Cheaper profile served when the engines are saturated: the next lower named
+        profile, or a reduced copy of the cheapest one
+        """
+        lower = DEGRADED_PROFILES.get(self.name)
+        if lower:
+            return ANALYSIS_PROFILES[lower]
+        return self.model_copy(update={
+            "name": f"{self.name}-degraded",
+            "depth": max(6, self.depth - 4) if self.depth else None,
+            "nodes": max(20_000, self.nodes // 3) if self.nodes else None,
+            "time": self.time / 2 if self.time else None,
+        })
+
+
+ANALYSIS_PROFILES: Dict[str, AnalysisProfile] = {
+    "fast": AnalysisProfile(name="fast", depth=10, nodes=150_000, time=0.3, threads=1, hash_mb=16),
+    "standard": AnalysisProfile(name="standard", depth=15, nodes=600_000, time=1.0, threads=1, hash_mb=64),
+    "deep": AnalysisProfile(name="deep", depth=22, nodes=4_000_000, time=5.0, threads=2, hash_mb=256),
+}
+
+# Profile served instead of each named profile under load (see `AnalysisProfile.degraded`)
+DEGRADED_PROFILES: Dict[str, str] = {"deep": "standard", "standard": "fast"}
+
+
+def get_analysis_profile(profile: Union[str, AnalysisProfile, None] = None) -> AnalysisProfile:
+    """
+    Resolve a profile name (or an already resolved profile) to an AnalysisProfile.
+    None selects the configured default. Raises ValueError for unknown names.
+    """
+    if isinstance(profile, AnalysisProfile):
+        return profile
+    name = (profile or DEFAULT_ANALYSIS_PROFILE).lower()
+    if name not in ANALYSIS_PROFILES:
+        raise ValueError(
+            f"Unknown analysis profile '{name}'. Available: {', '.join(ANALYSIS_PROFILES)}"
+        )
+    return ANALYSIS_PROFILES[name]
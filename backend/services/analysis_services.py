@@ -1,29 +1,81 @@
-import httpx
+import chess
+import chess.pgn
+from io import StringIO
+from typing import Any, Dict, List, Optional
+from services.enhanced_analysis_service import get_analysis_service
+from utils.score import Score
 
-async def calculate_accuracy(pgn: str):
+def _white_cp(evaluation: Dict[str, Any]) -> Optional[int]:
     """
-    Calculates real accuracy using Lichess analysis API.
-    Returns accuracy %, blunders, mistakes, inaccuracies, and move analysis list.
+    Score of the best line from White's perspective on the review scale (utils.score:
+    mates rank above every centipawn score), or None if the position wasn't analysed
     """
-    async with httpx.AsyncClient() as client:
-        # Send PGN to Lichess Cloud Analysis
-        url = "https://lichess.org/api/cloud-eval"
-        headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        data = {"pgn": pgn}
-        response = await client.post(url, data=data, headers=headers)
+    pvs = evaluation.get("pvs") or []
+    score = Score.from_pv(pvs[0]) if pvs else None
+    return None if score is None else round(score.pawns() * 100)
+
+def _terminal_cp(board: chess.Board) -> int:
+    if board.is_checkmate():
+        mated = round(Score(mate=0).pawns() * 100)
+        return mated if board.turn == chess.WHITE else -mated
+    return 0
+
+def _best_move(board: chess.Board, evaluation: Dict[str, Any]) -> Optional[chess.Move]:
+    pvs = evaluation.get("pvs") or []
+    moves = pvs[0].get("moves", "").split() if pvs else []
+    try:
+        move = chess.Move.from_uci(moves[0]) if moves else None
+    except ValueError:
+        return None
+    return move if move in board.legal_moves else None
 
-    if response.status_code != 200:
-        raise ValueError("Failed to fetch Lichess analysis")
+def _game_positions(pgn: str):
+    game = chess.pgn.read_game(StringIO(pgn))
+    if not game:
+        raise ValueError("No valid game found in PGN.")
+    board = game.board()
+    boards = [board.copy()]
+    moves = []
+    for move in game.mainline_moves():
+        moves.append(move)
+        board.push(move)
+        boards.append(board.copy())
+    if not moves:
+        raise ValueError("No valid moves found in PGN.")
+    return boards, moves
+
+async def calculate_accuracy(pgn: str, profile: Optional[str] = None):
+    """
+    Calculates accuracy from local analysis of every position of the game: cache,
+    Lichess cloud lookup per FEN, then the engine pool (see EnhancedAnalysisService).
+    Returns accuracy %, blunders, mistakes, inaccuracies, and move analysis list.
+    """
+    boards, moves = _game_positions(pgn)
+    service = get_analysis_service()
+    # Finished positions are scored from the rules; everything else is analysed in one batch
+    live = [i for i, b in enumerate(boards) if not b.is_game_over()]
+    results = await service.evaluate_positions([boards[i].fen() for i in live], profile, priority="review")
+    evaluations: List[Dict[str, Any]] = [{} for _ in boards]
+    for i, result in zip(live, results):
+        evaluations[i] = result.evaluation
+    scores = [_terminal_cp(b) if b.is_game_over() else _white_cp(e) for b, e in zip(boards, evaluations)]
 
-    eval_data = response.json()  # contains per-move evaluation
     move_analysis = []
     blunders = mistakes = inaccuracies = 0
 
-    for move_info in eval_data["moves"]:
-        move = move_info["san"]
-        eval_cp = move_info.get("cp", 0)  # centipawn evaluation
-        # Determine type based on centipawn loss
-        cp_loss = abs(move_info.get("loss", 0))  # Lichess sometimes gives 'loss'
+    for i, move in enumerate(moves):
+        board = boards[i]
+        best = _best_move(board, evaluations[i])
+        before, after = scores[i], scores[i + 1]
+        if after is None:
+            after = before
+        # Centipawns lost by the side that moved (none when it played the engine's choice)
+        if move == best or before is None or after is None:
+            cp_loss = 0
+        else:
+            sign = 1 if board.turn == chess.WHITE else -1
+            cp_loss = max(0, (before - after) * sign)
+
         if cp_loss > 100:
             move_type = "blunder"
             blunders += 1
@@ -37,9 +89,9 @@ async def calculate_accuracy(pgn: str):
             move_type = "good"
 
         move_analysis.append({
-            "move": move,
-            "eval": round(eval_cp / 100, 2),  # convert to pawns
-            "best_move": move_info.get("best", move),
+            "move": board.san(move),
+            "eval": round((after or 0) / 100, 2),  # convert to pawns
+            "best_move": board.san(best) if best else board.san(move),
             "type": move_type
         })
 
@@ -0,0 +1,256 @@
+"""
+Game archive ingestion: Chess.com monthly archives and Lichess games, fetched through one
+pooled HTTP client and kept on disk, so repeat loads of a player don't go upstream
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+import calendar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import httpx
+from config import (PLAYER_ARCHIVE_DIR, CHESSCOM_API_URL, LICHESS_API_URL, LICHESS_API_TOKEN,
+                    ARCHIVE_REFRESH_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+USERNAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,50}$")
+LICHESS_GAME_PATTERN = re.compile(r"^[A-Za-z0-9]{8}")
+# A month's archive is final once the month is over; games ending at midnight land a bit later
+MONTH_GRACE_SECONDS = 86400
+READ_SIZE = 1 << 16
+_GAMES_ARRAY = re.compile(r'"games"\s*:\s*\[')
+
+
+class ArchiveNotFound(Exception):
+    """The player, month or game doesn't exist upstream"""
+
+
+def iter_archive_games(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Games of a Chess.com archive file ({"games": [...]}) one at a time, parsed
+    incrementally: a busy month is several megabytes and is never held in memory whole.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buffer = ""
+        while True:
+            chunk = f.read(READ_SIZE)
+            buffer += chunk
+            match = _GAMES_ARRAY.search(buffer)
+            if match:
+                buffer = buffer[match.end():]
+                break
+            if not chunk:
+                return
+            buffer = buffer[-16:]  # the key may straddle two reads
+        eof = False
+        while True:
+            buffer = buffer.lstrip(" \t\r\n,")
+            if buffer.startswith("]"):
+                return
+            if buffer:
+                try:
+                    game, end = decoder.raw_decode(buffer)
+                except json.JSONDecodeError:
+                    # Incomplete object: read more (a game never decodes from a truncated one)
+                    if eof:
+                        raise ValueError(f"Truncated archive: {path}")
+                else:
+                    buffer = buffer[end:]
+                    yield game
+                    continue
+            elif eof:
+                raise ValueError(f"Truncated archive: {path}")
+            chunk = f.read(READ_SIZE)
+            eof = not chunk
+            buffer += chunk
+
+
+def lichess_game_id(url: str) -> str:
+    """Game ID of a Lichess game URL (or ID); the player-colour suffix and extra path parts are dropped"""
+    path = re.sub(r"^https?://[^/]+", "", url.strip()).strip("/")
+    match = LICHESS_GAME_PATTERN.match(path.split("/")[0] if path else "")
+    if not match:
+        raise ValueError(f"Not a Lichess game URL: {url}")
+    return match.group(0)
+
+
+class ArchiveIngestionService:
+    """
+    Files are cached under PLAYER_ARCHIVE_DIR (so player reports can read them directly):
+
+    - chesscom/<user>/archives.json    list of the player's monthly archives
+    - chesscom/<user>/<YYYY>-<MM>.json monthly archive, as served by the Chess.com API
+    - lichess/<game id>.json           exported Lichess game
+
+    Each file has a `.meta` sidecar with its ETag, Last-Modified and fetch time.
+    Finished months and finished games never change and are never requested again;
+    the archive list and the current month are served from disk for
+    ARCHIVE_REFRESH_SECONDS, then revalidated with a conditional request (a 304
+    costs no body). Responses are streamed to disk, and concurrent loads of the
+    same file share one request.
+    """
+
+    def __init__(self, cache_dir: str = PLAYER_ARCHIVE_DIR, chesscom_url: str = CHESSCOM_API_URL,
+                 lichess_url: str = LICHESS_API_URL, refresh_seconds: float = ARCHIVE_REFRESH_SECONDS,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.cache_dir = cache_dir
+        self.chesscom_url = chesscom_url.rstrip("/")
+        self.lichess_url = lichess_url.rstrip("/")
+        self.refresh_seconds = refresh_seconds
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0, read=30.0),
+            limits=httpx.Limits(max_connections=8, max_keepalive_connections=8),
+            headers={"User-Agent": "CHESSER archive ingestion"},
+            follow_redirects=True,
+            transport=transport,
+        )
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.stats = {"upstream": 0, "notModified": 0, "fromDisk": 0}
+
+    async def close(self):
+        await self.client.aclose()
+
+    # Conditional, cached fetches
+
+    @staticmethod
+    def _read_meta(path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path + ".meta") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_meta(path: str, meta: Dict[str, Any]):
+        tmp = path + ".meta.tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, path + ".meta")
+
+    def _fresh(self, path: str, meta: Optional[Dict[str, Any]]) -> bool:
+        if meta is None or not os.path.exists(path):
+            return False
+        return meta.get("final", False) or time.time() - meta.get("fetchedAt", 0) < self.refresh_seconds
+
+    async def _fetch(self, url: str, path: str, final_after: Optional[float] = None,
+                     headers: Optional[Dict[str, str]] = None) -> str:
+        """
+        Local copy of `url` at `path`, fetched or revalidated when needed. The copy is
+        final (never revalidated) when fetched after `final_after` (a Unix time).
+        """
+        lock = self._locks.setdefault(path, asyncio.Lock())
+        async with lock:
+            meta = self._read_meta(path)
+            if self._fresh(path, meta):
+                self.stats["fromDisk"] += 1
+                return path
+
+            request_headers = dict(headers or {})
+            if meta and os.path.exists(path):
+                if meta.get("etag"):
+                    request_headers["If-None-Match"] = meta["etag"]
+                if meta.get("lastModified"):
+                    request_headers["If-Modified-Since"] = meta["lastModified"]
+
+            fetched_at = time.time()
+            final = final_after is not None and fetched_at > final_after
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            async with self.client.stream("GET", url, headers=request_headers) as response:
+                self.stats["upstream"] += 1
+                if response.status_code == 304:
+                    self.stats["notModified"] += 1
+                    self._write_meta(path, {**(meta or {}), "fetchedAt": fetched_at, "final": final})
+                    return path
+                if response.status_code == 404:
+                    raise ArchiveNotFound(f"Not found upstream: {url}")
+                response.raise_for_status()
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    async for chunk in response.aiter_bytes():
+                        f.write(chunk)
+                os.replace(tmp, path)
+                self._write_meta(path, {
+                    "url": url,
+                    "etag": response.headers.get("ETag"),
+                    "lastModified": response.headers.get("Last-Modified"),
+                    "fetchedAt": fetched_at,
+                    "final": final,
+                })
+            logger.info(f"Fetched {url}")
+            return path
+
+    # Chess.com
+
+    def _player_dir(self, username: str) -> str:
+        if not USERNAME_PATTERN.match(username):
+            raise ValueError(f"Invalid username: {username}")
+        return os.path.join(self.cache_dir, "chesscom", username.lower())
+
+    async def archive_months(self, username: str) -> List[Tuple[int, int]]:
+        """(year, month) of every monthly archive of the player, oldest first"""
+        path = os.path.join(self._player_dir(username), "archives.json")
+        await self._fetch(f"{self.chesscom_url}/player/{username.lower()}/games/archives", path)
+        with open(path) as f:
+            urls = json.load(f).get("archives", [])
+        months = []
+        for url in urls:
+            year, month = url.rstrip("/").split("/")[-2:]
+            months.append((int(year), int(month)))
+        return sorted(months)
+
+    async def month_archive(self, username: str, year: int, month: int) -> str:
+        """Path of the player's archive for one month (a Chess.com monthly archive JSON file)"""
+        path = os.path.join(self._player_dir(username), f"{year:04d}-{month:02d}.json")
+        month_end = calendar.timegm((year, month, calendar.monthrange(year, month)[1], 23, 59, 59))
+        return await self._fetch(
+            f"{self.chesscom_url}/player/{username.lower()}/games/{year:04d}/{month:02d}",
+            path, final_after=month_end + MONTH_GRACE_SECONDS,
+        )
+
+    async def recent_archives(self, username: str, months: int = 1) -> List[str]:
+        """Paths of the player's latest `months` monthly archives (oldest first), loaded concurrently"""
+        latest = (await self.archive_months(username))[-months:] if months > 0 else []
+        return list(await asyncio.gather(*(self.month_archive(username, y, m) for y, m in latest)))
+
+    # Lichess
+
+    async def lichess_game(self, url: str) -> Dict[str, Any]:
+        """Exported Lichess game (JSON with the PGN); finished games are cached for good"""
+        game_id = lichess_game_id(url)
+        path = os.path.join(self.cache_dir, "lichess", f"{game_id}.json")
+        # The export is PGN text unless JSON is asked for
+        headers = {"Accept": "application/json"}
+        if LICHESS_API_TOKEN:
+            headers["Authorization"] = f"Bearer {LICHESS_API_TOKEN}"
+        # Exports of finished games never change; a game still in progress is refetched
+        await self._fetch(f"{self.lichess_url}/game/export/{game_id}?moves=true&pgnInJson=true",
+                          path, final_after=0, headers=headers)
+        try:
+            with open(path) as f:
+                game = json.load(f)
+        except ValueError:
+            # Never keep an unreadable body as a final copy: drop it so the next load refetches
+            for stale in (path, path + ".meta"):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+            raise ValueError(f"Unreadable Lichess export for game {game_id}")
+        if game.get("status") in ("created", "started"):
+            self._write_meta(path, {**(self._read_meta(path) or {}), "final": False})
+        return game
+
+
+# Global instance - lazy initialization
+archive_service = None
+
+def get_archive_service():
+    """Get or create the archive ingestion service"""
+    global archive_service
+    if archive_service is None:
+        archive_service = ArchiveIngestionService()
+    return archive_service
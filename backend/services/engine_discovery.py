@@ -0,0 +1,83 @@
+"""
+Stockfish discovery: probe candidate paths concurrently with a short UCI handshake
+"""
+import os
+import shutil
+import asyncio
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List
+from config import STOCKFISH_PATH
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds a candidate gets to answer `uci` with `uciok`
+PROBE_TIMEOUT = 2.0
+
+_discovered = False
+_stockfish_path: Optional[str] = None
+
+
+def candidate_paths() -> List[str]:
+    """Places Stockfish is looked for, in order of preference"""
+    candidates = [
+        STOCKFISH_PATH,
+        os.path.join(BACKEND_DIR, "engines", "stockfish.exe"),
+        os.path.join(BACKEND_DIR, "engines", "stockfish", "stockfish.exe"),
+        os.path.join(BACKEND_DIR, "engines", "stockfish"),
+        os.path.join(os.getcwd(), "engines", "stockfish.exe"),
+        shutil.which("stockfish"),
+        shutil.which("stockfish.exe"),
+        "/usr/bin/stockfish",
+        "/usr/local/bin/stockfish",
+        "/usr/games/stockfish",
+        "/opt/homebrew/bin/stockfish",
+        "C:\\Program Files\\Stockfish\\stockfish.exe",
+    ]
+    unique = []
+    for path in candidates:
+        if path and path not in unique and os.path.isfile(path):
+            unique.append(path)
+    return unique
+
+
+def probe_engine(path: str, timeout: float = PROBE_TIMEOUT) -> bool:
+    """True if `path` is a UCI engine that answers `uci` with `uciok` within `timeout`"""
+    try:
+        result = subprocess.run(
+            [path], input="uci\nquit\n", capture_output=True, text=True, timeout=timeout
+        )
+        return "uciok" in result.stdout
+    except (OSError, subprocess.TimeoutExpired, subprocess.SubprocessError):
+        return False
+
+
+def _discover(timeout: float) -> Optional[str]:
+    global _discovered, _stockfish_path
+    candidates = candidate_paths()
+    with ThreadPoolExecutor(max_workers=max(1, len(candidates))) as executor:
+        results = list(executor.map(lambda path: probe_engine(path, timeout), candidates))
+    working = [path for path, ok in zip(candidates, results) if ok]
+    _stockfish_path = working[0] if working else None
+    _discovered = True
+    if _stockfish_path:
+        logger.info(f"Stockfish found: {_stockfish_path}")
+    else:
+        logger.warning(f"Stockfish not found ({len(candidates)} candidates probed). Run setup_stockfish.py to install.")
+    return _stockfish_path
+
+
+async def discover_stockfish(timeout: float = PROBE_TIMEOUT) -> Optional[str]:
+    """Probe every candidate at once (off the event loop); the first working one in preference order wins"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _discover, timeout)
+
+
+def get_stockfish_path() -> Optional[str]:
+    """Discovered Stockfish path; runs discovery on first use if startup didn't"""
+    if not _discovered:
+        _discover(PROBE_TIMEOUT)
+    return _stockfish_path
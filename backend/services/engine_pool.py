@@ -0,0 +1,304 @@
+"""
+Pool of long-lived Stockfish processes shared by the analysis services
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager, aclosing
+from typing import Optional, Dict, Any, List, AsyncIterator, Set
+import chess
+import chess.engine
+from config import ENGINE_POOL_SIZE, ENGINE_RESERVED_INTERACTIVE
+from services.analysis_profiles import AnalysisProfile
+from services.engine_scheduler import EngineScheduler
+from services.uci_engine import UciEngine, open_engine
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cancelled search may take to answer UCI `stop` before its engine is discarded
+STOP_TIMEOUT = 5.0
+
+
+class EnginePool:
+    """
+    Up to `size` Stockfish processes, started on demand and reused across requests.
+
+    Engines are `UciEngine`s driven directly on the event loop; where the loop can't
+    run subprocesses (the Windows selector loop uvicorn may use) they fall back to
+    python-chess `SimpleEngine`s in the default executor (see services.uci_engine).
+    Engine options are only re-sent when the requested profile changes them.
+    Checkouts are granted by an `EngineScheduler`, so board requests ("interactive")
+    are not stuck behind game reviews ("review") or batch jobs ("bulk").
+    """
+
+    def __init__(self, engine_path: Optional[str], size: int = 2, reserved_interactive: int = 0):
+        self.engine_path = engine_path
+        self.size = max(1, size)
+        self._engines: List[UciEngine] = []
+        self._options: Dict[int, Dict[str, Any]] = {}
+        self._killed: Set[int] = set()  # ids of engines killed mid-checkout; discarded on return
+        # One slot per engine; None marks a slot whose process hasn't been started yet
+        self.scheduler = EngineScheduler([None] * self.size, reserved_interactive=reserved_interactive)
+
+    @property
+    def available(self) -> bool:
+        return self.engine_path is not None
+
+    async def _checkout(self, priority: str) -> UciEngine:
+        engine = await self.scheduler.acquire(priority)
+        if engine is None:
+            spawn = asyncio.ensure_future(open_engine(self.engine_path))
+            try:
+                engine = await asyncio.shield(spawn)
+            except BaseException:
+                # A cancelled checkout must not leak the process that is still starting up
+                spawn.add_done_callback(self._close_orphan)
+                self.scheduler.release(None, priority)
+                raise
+            self._engines.append(engine)
+            logger.info(f"Started pooled engine {len(self._engines)}/{self.size}: {self.engine_path}")
+        return engine
+
+    @staticmethod
+    def _close_orphan(spawn: asyncio.Future):
+        if not spawn.cancelled() and spawn.exception() is None:
+            spawn.result().close()
+
+    def _discard(self, engine: UciEngine, priority: str):
+        if engine in self._engines:
+            self._engines.remove(engine)
+        self._options.pop(id(engine), None)
+        self._killed.discard(id(engine))
+        engine.close()
+        # Free the slot; the next checkout starts a replacement process
+        self.scheduler.release(None, priority)
+
+    async def _configure(self, engine: UciEngine, profile: AnalysisProfile):
+        options = profile.engine_options()
+        if self._options.get(id(engine)) != options:
+            await engine.configure(options)
+            self._options[id(engine)] = options
+
+    @asynccontextmanager
+    async def engine(self, profile: AnalysisProfile, priority: str = "review"):
+        """
+        Check out an engine configured for `profile`; it is returned to the pool afterwards.
+        `priority` is the traffic class: "interactive", "review" or "bulk".
+        """
+        if not self.available:
+            raise RuntimeError("Stockfish path not found")
+        self.scheduler.check_priority(priority)
+        engine = await self._checkout(priority)
+        healthy = True
+        try:
+            await self._configure(engine, profile)
+            yield engine
+        except chess.engine.EngineError:
+            # Dead or confused process: drop it, the pool starts a fresh one on demand
+            healthy = False
+            self._discard(engine, priority)
+            raise
+        finally:
+            if healthy and id(engine) in self._killed:
+                self._discard(engine, priority)
+            elif healthy:
+                self.scheduler.release(engine, priority)
+
+    async def analyse_on(self, engine: UciEngine, board: chess.Board,
+                         profile: AnalysisProfile, multi_pv: int = 1,
+                         game: object = None) -> List[chess.engine.InfoDict]:
+        """
+        Search on an engine that is already checked out. Consecutive searches with the
+        same `game` token skip `ucinewgame`, so the engine keeps its transposition table.
+
+        The search is cancellable: if the awaiting task is cancelled (client disconnect,
+        request deadline), UCI `stop` is sent and the engine's `bestmove` is awaited, so
+        the engine goes back to the pool idle instead of finishing an abandoned search.
+        """
+        finished = asyncio.ensure_future(engine.search(board, profile.limit(), multi_pv, game))
+        try:
+            return await asyncio.shield(finished)
+        except asyncio.CancelledError:
+            await self._stop_search(engine, finished)
+            raise
+
+    async def stream_on(self, engine: UciEngine, board: chess.Board,
+                        profile: AnalysisProfile, multi_pv: int = 1,
+                        game: object = None) -> AsyncIterator[chess.engine.InfoDict]:
+        """
+        Like `analyse_on`, but yields every `info` line as the engine emits it
+        (iterative deepening). Closing the iterator early sends UCI `stop`.
+        """
+        lines: asyncio.Queue = asyncio.Queue()
+        finished = asyncio.ensure_future(engine.search(board, profile.limit(), multi_pv, game, lines.put_nowait))
+        finished.add_done_callback(lambda _: lines.put_nowait(None))
+        try:
+            while True:
+                info = await lines.get()
+                if info is None:
+                    break
+                yield info
+            await finished
+        finally:
+            if not finished.done():
+                await self._stop_search(engine, finished)
+
+    async def _stop_search(self, engine: UciEngine, finished: asyncio.Future):
+        """
+        Send `stop` to an abandoned search and wait until the engine is idle again.
+        Never raises an error of its own: the caller's cancellation is what propagates.
+        """
+        engine.stop()
+        try:
+            await asyncio.wait_for(asyncio.shield(finished), STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            # Unresponsive to `stop`: kill it; its checkout discards it instead of returning it
+            logger.warning(f"Engine did not stop within {STOP_TIMEOUT}s of cancellation, killing it")
+            self._killed.add(id(engine))
+            engine.close()
+        except Exception:
+            pass
+
+    def session(self, profile: AnalysisProfile, game: object = None,
+                priority: str = "review") -> "EngineSession":
+        """Sticky engine affinity: consecutive searches of one game on one warm engine"""
+        return EngineSession(self, profile, game, priority)
+
+    async def analyse(self, board: chess.Board, profile: AnalysisProfile,
+                      multi_pv: int = 1, priority: str = "review") -> List[chess.engine.InfoDict]:
+        """Search `board` with the profile limits; returns one InfoDict per principal variation"""
+        async with self.engine(profile, priority) as engine:
+            return await self.analyse_on(engine, board, profile, multi_pv)
+
+    async def prewarm(self, profile: AnalysisProfile) -> int:
+        """
+        Start every pooled engine up front and wait for `readyok`, so the first
+        requests don't pay for process start-up or hash allocation. Returns the
+        number of engines ready.
+
+        Every slot is checked out at once, as interactive traffic (so reserved slots
+        are included), and held until all are: a slot given back early would be
+        handed to the next warm-up instead of an unstarted one.
+        """
+        arrived = 0
+        everyone = asyncio.Event()
+
+        def arrive():
+            nonlocal arrived
+            arrived += 1
+            if arrived == self.size:
+                everyone.set()
+
+        async def warm() -> UciEngine:
+            counted = False
+            try:
+                async with self.engine(profile, "interactive") as engine:
+                    await engine.ping()
+                    counted = True
+                    arrive()
+                    await everyone.wait()
+                    return engine
+            finally:
+                if not counted:
+                    arrive()
+
+        results = await asyncio.gather(*(warm() for _ in range(self.size)), return_exceptions=True)
+        ready = set()
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"Engine prewarm failed: {result}")
+            else:
+                ready.add(id(result))
+        return len(ready)
+
+    async def close(self):
+        for engine in list(self._engines):
+            await engine.quit()
+        self._engines.clear()
+        self._options.clear()
+        self._killed.clear()
+        self.scheduler.reset([None] * self.size)
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool size, engines started and per-class queue metrics"""
+        return {"size": self.size, "started": len(self._engines), **self.scheduler.stats()}
+
+
+class EngineSession:
+    """
+    Keeps one pooled engine for a series of related searches (the plies of one game).
+
+    The engine is checked out on the first search, so sessions that end up fully
+    served from caches never wait for the pool. All searches share the `game` token,
+    so the engine keeps its hash table between them. Use as `async with`.
+    """
+
+    def __init__(self, pool: EnginePool, profile: AnalysisProfile, game: object = None,
+                 priority: str = "review"):
+        self.pool = pool
+        self.profile = profile
+        self.priority = priority
+        self.game = game if game is not None else object()
+        self.engine: Optional[UciEngine] = None
+        self._checkout = None
+
+    async def acquire(self) -> UciEngine:
+        """The session's engine, checked out from the pool if it doesn't hold one yet"""
+        if self.engine is None:
+            self._checkout = self.pool.engine(self.profile, self.priority)
+            self.engine = await self._checkout.__aenter__()
+        return self.engine
+
+    async def _drop(self, error: chess.engine.EngineError):
+        # Let the pool discard the engine; the next search checks out a fresh one
+        checkout, self._checkout, self.engine = self._checkout, None, None
+        try:
+            await checkout.__aexit__(type(error), error, error.__traceback__)
+        except chess.engine.EngineError:
+            pass
+
+    async def analyse(self, board: chess.Board, profile: Optional[AnalysisProfile] = None,
+                      multi_pv: int = 1) -> List[chess.engine.InfoDict]:
+        profile = profile or self.profile
+        engine = await self.acquire()
+        try:
+            return await self.pool.analyse_on(engine, board, profile, multi_pv, self.game)
+        except chess.engine.EngineError as e:
+            await self._drop(e)
+            raise
+
+    async def stream(self, board: chess.Board, profile: Optional[AnalysisProfile] = None,
+                     multi_pv: int = 1) -> AsyncIterator[chess.engine.InfoDict]:
+        """Streaming search on the session's engine (see `EnginePool.stream_on`)"""
+        profile = profile or self.profile
+        engine = await self.acquire()
+        try:
+            async with aclosing(self.pool.stream_on(engine, board, profile, multi_pv, self.game)) as lines:
+                async for info in lines:
+                    yield info
+        except chess.engine.EngineError as e:
+            await self._drop(e)
+            raise
+
+    async def release(self):
+        if self._checkout is not None:
+            checkout, self._checkout, self.engine = self._checkout, None, None
+            await checkout.__aexit__(None, None, None)
+
+    async def __aenter__(self) -> "EngineSession":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+
+# Global instance - lazy initialization
+engine_pool = None
+
+def get_engine_pool(engine_path: Optional[str] = None):
+    """Get or create the shared engine pool (the first caller supplies the engine path)"""
+    global engine_pool
+    if engine_pool is None:
+        engine_pool = EnginePool(engine_path, ENGINE_POOL_SIZE, ENGINE_RESERVED_INTERACTIVE)
+    elif engine_pool.engine_path is None and engine_path:
+        engine_pool.engine_path = engine_path
+    return engine_pool
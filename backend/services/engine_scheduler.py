@@ -0,0 +1,136 @@
+"""
+Priority-aware scheduling of engine slots between interactive, review and bulk traffic
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# Traffic classes, most latency-sensitive first
+PRIORITY_CLASSES = ("interactive", "review", "bulk")
+
+# Relative share of engine grants under contention
+DEFAULT_WEIGHTS: Dict[str, int] = {"interactive": 6, "review": 3, "bulk": 1}
+
+# Wait samples kept per class for percentile metrics
+WAIT_SAMPLES = 500
+
+
+class EngineScheduler:
+    """
+    Hands out engine slots to waiting requests by traffic class.
+
+    Every class has its own FIFO queue. When a slot frees up, the backlogged class
+    with the lowest virtual time is served and its virtual time advances by
+    1/weight (stride scheduling), so under contention classes get engines in
+    proportion to their weights and none of them starves. A class that was idle
+    re-enters at the current virtual time instead of cashing in saved-up credit.
+
+    `reserved_interactive` slots are never handed to review or bulk work, so a
+    board request never queues behind a 100-FEN batch.
+    """
+
+    def __init__(self, slots: List[Any], weights: Optional[Dict[str, int]] = None,
+                 reserved_interactive: int = 0):
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.reserved_interactive = max(0, min(reserved_interactive, len(slots) - 1))
+        self._idle: Deque[Any] = deque(slots)
+        self._waiters: Dict[str, Deque[Tuple[asyncio.Future, float]]] = {c: deque() for c in PRIORITY_CLASSES}
+        self._vtime: Dict[str, float] = {c: 0.0 for c in PRIORITY_CLASSES}
+        self._in_use: Dict[str, int] = {c: 0 for c in PRIORITY_CLASSES}
+        self._stats: Dict[str, Dict[str, Any]] = {
+            c: {"served": 0, "total_wait": 0.0, "max_wait": 0.0, "recent": deque(maxlen=WAIT_SAMPLES)}
+            for c in PRIORITY_CLASSES
+        }
+
+    @staticmethod
+    def check_priority(priority: str) -> str:
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority '{priority}'. Available: {', '.join(PRIORITY_CLASSES)}")
+        return priority
+
+    async def acquire(self, priority: str) -> Any:
+        """Wait for a slot on behalf of `priority` traffic"""
+        self.check_priority(priority)
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (waiter, time.monotonic())
+        if not self._waiters[priority]:
+            backlogged = [self._vtime[c] for c in PRIORITY_CLASSES if self._waiters[c]]
+            if backlogged:
+                self._vtime[priority] = max(self._vtime[priority], min(backlogged))
+        self._waiters[priority].append(entry)
+        self._dispatch()
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as the caller gave up: pass the slot on
+                self.release(waiter.result(), priority)
+            elif entry in self._waiters[priority]:
+                self._waiters[priority].remove(entry)
+            raise
+
+    def release(self, slot: Any, priority: str):
+        """Return a slot granted to `priority` traffic"""
+        self._in_use[priority] = max(0, self._in_use[priority] - 1)
+        self._idle.append(slot)
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._idle:
+            candidates = [
+                c for c in PRIORITY_CLASSES
+                if self._waiters[c] and (c == "interactive" or len(self._idle) > self.reserved_interactive)
+            ]
+            if not candidates:
+                return
+            priority = min(candidates, key=lambda c: self._vtime[c])
+            waiter, queued_at = self._waiters[priority].popleft()
+            if waiter.done():
+                continue
+            waiter.set_result(self._take_slot())
+            self._vtime[priority] += 1.0 / self.weights[priority]
+            self._in_use[priority] += 1
+            self._record_wait(priority, time.monotonic() - queued_at)
+
+    def _take_slot(self) -> Any:
+        # Prefer an engine that is already running over starting a new process
+        for slot in self._idle:
+            if slot is not None:
+                self._idle.remove(slot)
+                return slot
+        return self._idle.popleft()
+
+    def _record_wait(self, priority: str, wait: float):
+        stats = self._stats[priority]
+        stats["served"] += 1
+        stats["total_wait"] += wait
+        stats["max_wait"] = max(stats["max_wait"], wait)
+        stats["recent"].append(wait)
+
+    def reset(self, slots: List[Any]):
+        """Replace the idle slots (used when the pool shuts its engines down)"""
+        self._idle = deque(slots)
+        self._in_use = {c: 0 for c in PRIORITY_CLASSES}
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, engines in use and queue wait per class (milliseconds)"""
+        classes = {}
+        for c in PRIORITY_CLASSES:
+            stats = self._stats[c]
+            recent = sorted(stats["recent"])
+            classes[c] = {
+                "weight": self.weights[c],
+                "waiting": len(self._waiters[c]),
+                "in_use": self._in_use[c],
+                "served": stats["served"],
+                "avg_wait_ms": round(stats["total_wait"] / stats["served"] * 1000, 1) if stats["served"] else 0.0,
+                "p50_wait_ms": round(recent[len(recent) // 2] * 1000, 1) if recent else 0.0,
+                "p95_wait_ms": round(recent[int(len(recent) * 0.95)] * 1000, 1) if recent else 0.0,
+                "max_wait_ms": round(stats["max_wait"] * 1000, 1),
+            }
+        return {
+            "idle": len(self._idle),
+            "reserved_interactive": self.reserved_interactive,
+            "classes": classes,
+        }
@@ -1,83 +1,72 @@
 """
 Enhanced analysis service with Lichess Cloud Eval + Stockfish fallback + caching
+(on-disk evaluation index, then Redis)
 """
 import os
-import json
-import hashlib
 from typing import Optional, Dict, Any, List
 import asyncio
 import chess
 import chess.engine
-import requests
+import time
+import httpx
 from redis import Redis
 import logging
 from pydantic import BaseModel
+from services.analysis_profiles import AnalysisProfile, get_analysis_profile
+from services.tablebase import get_tablebase_service
+from services.engine_pool import get_engine_pool
+from services.engine_discovery import get_stockfish_path
+from services.eval_index import get_eval_index
+from services.admission import get_admission_controller, Overloaded, QUALITY_FULL, QUALITY_DEGRADED, QUALITY_CACHED, QUALITY_REJECTED
+from utils.eval_codec import encode_eval, decode_eval
+from utils.chess_utils import position_key
+from utils.score import Score
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+CACHE_TTL = 86400 * 7  # 7 days cache
+CACHE_KEY_PREFIX = "eval:"
+CLOUD_BACKOFF_SECONDS = 60
+
+async def _gather_or_cancel(tasks: List[asyncio.Future]) -> List[Any]:
+    """`gather`, but the first failure cancels the other tasks so they free their engine slots"""
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
 class AnalysisResult(BaseModel):
-    source: str  # "lichess", "stockfish", or "cache"
+    source: str  # "lichess", "stockfish", "tablebase", or "cache"
     fen: str
     evaluation: Dict[str, Any]
     depth: Optional[int] = None
     time_taken: Optional[float] = None
+    quality: str = "full"  # "full", "degraded" (cheaper profile) or "cached" (partial cached answer under load)
 
 class EnhancedAnalysisService:
     def __init__(self):
         self.lichess_url = "https://lichess.org/api/cloud-eval"
-        self.stockfish_path = self._find_stockfish()
-        self.engine = None
+        self.http_client = httpx.AsyncClient(timeout=5)
+        self.cloud_retry_at = 0.0  # Lichess lookups are skipped until then after a connection error / 429
+        self.stockfish_path = get_stockfish_path()
+        self.engine_pool = get_engine_pool(self.stockfish_path)
         self.redis_client = self._init_redis()
-        self.cache_ttl = 86400 * 7  # 7 days cache
-        
-    def _find_stockfish(self) -> Optional[str]:
-        """Find Stockfish executable in common locations"""
-        # First check environment variable
-        env_path = os.getenv("STOCKFISH_PATH")
-        if env_path and os.path.exists(env_path):
-            logger.info(f"Found Stockfish from environment: {env_path}")
-            return env_path
+        self.eval_index = get_eval_index()
+        self.tablebase = get_tablebase_service()
+        self.admission = get_admission_controller()
+        self.cache_ttl = CACHE_TTL
         
-        # Check local engines directory
-        current_dir = os.path.dirname(os.path.dirname(__file__))  # Go up to backend/
-        local_stockfish = os.path.join(current_dir, "engines", "stockfish.exe")
-        if os.path.exists(local_stockfish):
-            logger.info(f"Found local Stockfish: {local_stockfish}")
-            return local_stockfish
-        
-        # Fallback to common system paths
-        possible_paths = [
-            "/usr/bin/stockfish",
-            "/usr/local/bin/stockfish", 
-            "/opt/homebrew/bin/stockfish",
-            "stockfish",  # if in PATH
-            "C:\\Program Files\\Stockfish\\stockfish.exe",
-            "stockfish.exe"
-        ]
-        
-        for path in possible_paths:
-            try:
-                # Test if the path works
-                import subprocess
-                result = subprocess.run([path, "--help"], 
-                                      capture_output=True, 
-                                      timeout=5)
-                if result.returncode == 0:
-                    logger.info(f"Found Stockfish at: {path}")
-                    return path
-            except (FileNotFoundError, subprocess.TimeoutExpired, Exception):
-                continue
-                
-        logger.warning("Stockfish not found. Run setup_stockfish.py to install.")
-        return None
-    
     def _init_redis(self) -> Optional[Redis]:
         """Initialize Redis connection for caching"""
         try:
             redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
-            client = Redis.from_url(redis_url, decode_responses=True)
+            # Short connect timeout: an unreachable Redis must not stall startup.
+            # Values are raw bytes (see utils/eval_codec.py), so no response decoding.
+            client = Redis.from_url(redis_url, socket_connect_timeout=1)
             client.ping()  # Test connection
             logger.info("Redis connected successfully")
             return client
@@ -85,334 +74,233 @@ class EnhancedAnalysisService:
             logger.warning(f"Redis connection failed: {e}. Continuing without cache.")
             return None
     
-    def _init_stockfish_sync(self):
-        """Initialize Stockfish engine synchronously"""
-        if self.stockfish_path and not self.engine:
-            try:
-                logger.info(f"Initializing Stockfish engine at: {self.stockfish_path}")
-                
-                # On Windows, we need to be more careful with subprocess handling
-                import asyncio
-                import platform
-                
-                if platform.system() == "Windows":
-                    # Set the event loop policy for Windows
-                    asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
-                
-                self.engine = chess.engine.SimpleEngine.popen_uci(self.stockfish_path)
-                logger.info("Stockfish engine initialized successfully")
-                return True
-            except Exception as e:
-                logger.error(f"Failed to initialize Stockfish: {e}")
-                import traceback
-                logger.error(traceback.format_exc())
-                self.engine = None
-                return False
-        return self.engine is not None
-
-    async def _init_stockfish(self):
-        """Initialize Stockfish engine"""
-        if self.stockfish_path and not self.engine:
-            # Run synchronous initialization in executor
-            loop = asyncio.get_event_loop()
-            success = await loop.run_in_executor(None, self._init_stockfish_sync)
-            return success
-        return self.engine is not None
+    @staticmethod
+    def _get_cache_key(key: int) -> str:
+        """
+        Redis key for a canonical position key (utils.chess_utils.position_key), so move
+        counters and transpositions share an entry (one entry serves every multiPV up to the stored one)
+        """
+        return f"{CACHE_KEY_PREFIX}{key:016x}"
     
-    def _get_cache_key(self, fen: str, multi_pv: int = 1) -> str:
-        """Generate cache key for FEN + multiPV"""
-        key_data = f"{fen}:{multi_pv}"
-        return f"analysis:{hashlib.md5(key_data.encode()).hexdigest()}"
+    @property
+    def cache_enabled(self) -> bool:
+        return self.eval_index.enabled or self.redis_client is not None
     
-    def _get_from_cache(self, fen: str, multi_pv: int = 1) -> Optional[Dict[str, Any]]:
-        """Get analysis from Redis cache"""
-        if not self.redis_client:
+    def _get_from_cache(self, fen: str, multi_pv: int = 1, min_depth: int = 0) -> Optional[Dict[str, Any]]:
+        """
+        Get analysis from the on-disk index, then Redis. An entry with N lines answers any
+        request for up to N lines (or for all lines, when the position has fewer legal moves);
+        entries are keyed by position only, so one searched shallower than `min_depth` is a miss.
+        Redis hits are copied into the index, so the next lookup on this host stays local.
+        """
+        if not self.cache_enabled:
             return None
             
         try:
-            cache_key = self._get_cache_key(fen, multi_pv)
-            cached = self.redis_client.get(cache_key)
-            if cached:
-                return json.loads(cached)
+            board = chess.Board(fen)
+            key = position_key(board)
+            record = self.eval_index.get(key)
+            analysis = self._usable(decode_eval(record, fen), board, multi_pv, min_depth) if record else None
+            if analysis is None and self.redis_client:
+                cached = self.redis_client.get(self._get_cache_key(key))
+                if cached:
+                    analysis = self._usable(decode_eval(cached, fen), board, multi_pv, min_depth)
+                    if analysis is not None:
+                        self.eval_index.put(key, cached)
+            return analysis
         except Exception as e:
             logger.error(f"Cache read error: {e}")
         return None
     
-    def _save_to_cache(self, fen: str, analysis: Dict[str, Any], multi_pv: int = 1):
-        """Save analysis to Redis cache"""
-        if not self.redis_client:
-            return
-            
+    @staticmethod
+    def _usable(analysis: Dict[str, Any], board: chess.Board, multi_pv: int,
+                min_depth: int) -> Optional[Dict[str, Any]]:
+        if (analysis.get("depth") or 0) < min_depth:
+            return None
+        pvs = analysis.get("pvs", [])
+        if len(pvs) >= multi_pv or len(pvs) >= board.legal_moves.count():
+            return {**analysis, "pvs": pvs[:multi_pv]}
+        return None
+    
+    def _save_to_cache(self, fen: str, analysis: Dict[str, Any]):
+        """Save analysis to the on-disk index and Redis in the compact binary encoding"""
+        self.save_many_to_cache([{**analysis, "fen": fen}])
+    
+    def cache_contains(self, fens: List[str]) -> List[bool]:
+        """Which of the positions already have a cache entry (one pipelined Redis round trip)"""
+        keys = [position_key(chess.Board(fen)) for fen in fens]
+        found = [key in self.eval_index for key in keys]
+        missing = [i for i, hit in enumerate(found) if not hit]
+        if self.redis_client and missing:
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for i in missing:
+                    pipe.exists(self._get_cache_key(keys[i]))
+                for i, hit in zip(missing, pipe.execute()):
+                    found[i] = bool(hit)
+            except Exception as e:
+                logger.error(f"Cache read error: {e}")
+        return found
+    
+    def save_many_to_cache(self, entries: List[Dict[str, Any]]) -> List[int]:
+        """
+        Bulk-load analyses (Lichess format, keyed by their "fen"): one append to the
+        on-disk index and one pipelined Redis round trip. Returns the position keys
+        stored (none when the cache is disabled or the write failed).
+        """
+        if not self.cache_enabled or not entries:
+            return []
+        
         try:
-            cache_key = self._get_cache_key(fen, multi_pv)
-            self.redis_client.setex(
-                cache_key, 
-                self.cache_ttl,
-                json.dumps(analysis)
-            )
+            records = [(position_key(chess.Board(a["fen"])), encode_eval(a)) for a in entries]
+            self.eval_index.put_many(records)
+            if self.redis_client:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for key, record in records:
+                    pipe.setex(self._get_cache_key(key), self.cache_ttl, record)
+                pipe.execute()
+            return [key for key, _ in records]
         except Exception as e:
             logger.error(f"Cache write error: {e}")
+            return []
+    
+    def _probe_tablebase(self, fen: str) -> Optional[Dict[str, Any]]:
+        """Exact Syzygy result in the Lichess eval format (scores from White's perspective)"""
+        board = chess.Board(fen)
+        probe = self.tablebase.probe(board)
+        if not probe:
+            return None
+        
+        score = Score(cp=self.tablebase.wdl_to_cp(probe["wdl"])).pov(board.turn)
+        
+        return {
+            "fen": fen,
+            "knodes": 0,
+            "depth": 0,
+            "wdl": probe["wdl"],
+            "dtz": probe["dtz"],
+            "pvs": [{
+                "moves": probe["best_move"] or "",
+                **score.to_pv()
+            }]
+        }
     
     async def _query_lichess(self, fen: str, multi_pv: int = 1) -> Optional[Dict[str, Any]]:
-        """Query Lichess Cloud Eval API"""
+        """
+        Query Lichess Cloud Eval API (non-blocking). When Lichess is unreachable or rate
+        limits us, lookups are skipped for CLOUD_BACKOFF_SECONDS so offline analysis
+        doesn't pay a timeout per position.
+        """
+        if time.monotonic() < self.cloud_retry_at:
+            return None
         try:
             params = {"fen": fen, "multiPv": multi_pv}
-            response = requests.get(self.lichess_url, params=params, timeout=5)
+            response = await self.http_client.get(self.lichess_url, params=params)
             
             if response.status_code == 200:
                 data = response.json()
                 if "pvs" in data and data["pvs"]:
                     logger.info(f"Lichess analysis found for FEN: {fen[:20]}...")
                     return data
+            elif response.status_code == 429:
+                logger.warning("Lichess rate limit hit, skipping cloud lookups for a while")
+                self.cloud_retry_at = time.monotonic() + CLOUD_BACKOFF_SECONDS
                     
+        except httpx.TransportError as e:
+            logger.error(f"Lichess API error: {e!r}")
+            self.cloud_retry_at = time.monotonic() + CLOUD_BACKOFF_SECONDS
         except Exception as e:
             logger.error(f"Lichess API error: {e}")
         
         return None
     
-    async def _analyze_with_stockfish(self, fen: str, depth: int = 15, time_limit: float = 5.0) -> Optional[Dict[str, Any]]:
-        """Analyze position with Stockfish using subprocess"""
-        if not self.stockfish_path:
+    @staticmethod
+    def _format_engine_lines(fen: str, infos: List[chess.engine.InfoDict]) -> Optional[Dict[str, Any]]:
+        """Engine `info` lines (one per principal variation) in the Lichess cloud-eval format"""
+        pvs = []
+        for info in infos:
+            if "score" not in info or not info.get("pv"):
+                continue
+            # Scores are reported from White's perspective, like Lichess
+            pvs.append({
+                "moves": " ".join(move.uci() for move in info["pv"]),
+                **Score.from_engine(info["score"]).to_pv()
+            })
+        
+        if not pvs:
+            return None
+        
+        return {
+            "fen": fen,
+            "knodes": infos[0].get("nodes", 0) // 1000,
+            "depth": infos[0].get("depth", 0),
+            "pvs": pvs
+        }
+    
+    async def _analyze_with_stockfish(self, fen: str, profile: AnalysisProfile, multi_pv: int = 1,
+                                      priority: str = "interactive") -> Optional[Dict[str, Any]]:
+        """
+        Analyze position with a pooled Stockfish engine, limited by the analysis profile.
+        Returns `multi_pv` ranked lines in the Lichess cloud-eval format.
+        """
+        if not self.engine_pool.available:
             logger.error("Stockfish path not found")
             return None
-            
+        
         try:
-            # Run Stockfish via subprocess to avoid asyncio issues
-            def run_stockfish_analysis():
-                import subprocess
-                import chess
-                
-                # Validate FEN first
-                try:
-                    board = chess.Board(fen)
-                    if not board.is_valid():
-                        logger.error(f"Invalid FEN: {fen}")
-                        return None
-                except Exception as e:
-                    logger.error(f"FEN validation error: {e}")
-                    return None
-                
-                logger.info(f"Starting Stockfish analysis for FEN: {fen[:30]}... at depth {depth}")
-                
-                try:
-                    # Start Stockfish process
-                    process = subprocess.Popen(
-                        [self.stockfish_path],
-                        stdin=subprocess.PIPE,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        text=True,
-                        bufsize=0
-                    )
-                    
-                    # Send UCI initialization commands and wait for responses
-                    process.stdin.write("uci\n")
-                    process.stdin.flush()
-                    
-                    # Read until we get "uciok"
-                    uci_ready = False
-                    while not uci_ready:
-                        line = process.stdout.readline()
-                        if "uciok" in line:
-                            uci_ready = True
-                    
-                    # Send isready and wait for readyok
-                    process.stdin.write("isready\n")
-                    process.stdin.flush()
-                    
-                    ready = False
-                    while not ready:
-                        line = process.stdout.readline()
-                        if "readyok" in line:
-                            ready = True
-                    
-                    # Configure Stockfish for deterministic results
-                    process.stdin.write("setoption name Hash value 16\n")
-                    process.stdin.flush()
-                    process.stdin.write("setoption name Threads value 1\n") 
-                    process.stdin.flush()
-                    process.stdin.write("isready\n")
-                    process.stdin.flush()
-                    
-                    # Wait for ready after configuration
-                    ready = False
-                    while not ready:
-                        line = process.stdout.readline()
-                        if "readyok" in line:
-                            ready = True
-                    
-                    # Set position
-                    process.stdin.write(f"position fen {fen}\n")
-                    process.stdin.flush()
-                    
-                    # Start analysis with both depth and time limits for consistency
-                    process.stdin.write(f"go depth {depth} movetime 3000\n")
-                    process.stdin.flush()
-                    
-                    # Read analysis output until we get bestmove
-                    analysis_lines = []
-                    best_move = None
-                    
-                    while True:
-                        line = process.stdout.readline()
-                        if not line:
-                            break
-                            
-                        line = line.strip()
-                        analysis_lines.append(line)
-                        
-                        if line.startswith('bestmove'):
-                            parts = line.split()
-                            if len(parts) >= 2:
-                                best_move = parts[1]
-                            break
-                    
-                    # Send quit command
-                    process.stdin.write("quit\n")
-                    process.stdin.flush()
-                    
-                    # Wait for process to finish
-                    process.wait(timeout=5)
-                    
-                    logger.info(f"Stockfish analysis lines: {len(analysis_lines)} lines collected")
-                    logger.info(f"Sample analysis lines: {analysis_lines[:3] if analysis_lines else 'None'}")
-                    
-                    # Parse the analysis output
-                    score = None
-                    pv_moves = []
-                    depth_reached = depth
-                    
-                    # Look for the best info line (last one with highest depth)
-                    best_info_line = None
-                    max_depth = 0
-                    
-                    for line in analysis_lines:
-                        if line.startswith('info') and 'depth' in line and 'score' in line:
-                            # Extract depth from this line
-                            parts = line.split()
-                            current_depth = 0
-                            for i, part in enumerate(parts):
-                                if part == 'depth' and i + 1 < len(parts):
-                                    try:
-                                        current_depth = int(parts[i + 1])
-                                        break
-                                    except ValueError:
-                                        pass
-                            
-                            # Keep the line with the highest depth
-                            if current_depth >= max_depth:
-                                max_depth = current_depth
-                                best_info_line = line
-                                depth_reached = current_depth
-                        elif line.startswith('bestmove'):
-                            parts = line.split()
-                            if len(parts) >= 2:
-                                best_move = parts[1]
-                    
-                    # Parse the best info line for score and PV
-                    if best_info_line:
-                        parts = best_info_line.split()
-                        
-                        # Parse score
-                        for i, part in enumerate(parts):
-                            if part == 'cp' and i + 1 < len(parts):
-                                try:
-                                    raw_score = int(parts[i + 1])
-                                    # Stockfish gives score from current player's perspective
-                                    # If it's Black's turn, we need to flip the score for consistency
-                                    if ' b ' in fen:  # Black to move
-                                        score = -raw_score
-                                        logger.info(f"Black to move: flipping score from {raw_score} to {score}")
-                                    else:  # White to move
-                                        score = raw_score
-                                        logger.info(f"White to move: keeping score {score}")
-                                    break
-                                except ValueError:
-                                    pass
-                            elif part == 'mate' and i + 1 < len(parts):
-                                try:
-                                    mate_value = int(parts[i + 1])
-                                    # Convert mate to centipawns equivalent for consistency
-                                    raw_mate_score = 30000 if mate_value > 0 else -30000
-                                    # Same perspective adjustment for mate
-                                    if ' b ' in fen:  # Black to move
-                                        score = -raw_mate_score
-                                        logger.info(f"Black to move: flipping mate score from {raw_mate_score} to {score}")
-                                    else:  # White to move  
-                                        score = raw_mate_score
-                                        logger.info(f"White to move: keeping mate score {score}")
-                                    break
-                                except ValueError:
-                                    pass
-                        
-                        # Parse PV
-                        pv_start = -1
-                        for i, part in enumerate(parts):
-                            if part == 'pv':
-                                pv_start = i + 1
-                                break
-                        if pv_start > 0:
-                            pv_moves = parts[pv_start:]
-                    
-                    logger.info(f"Parsed Stockfish output: score={score}, best_move={best_move}, depth={depth_reached}, pv_moves={pv_moves[:5]}")
-                    
-                    if best_move and best_move != '(none)' and score is not None:
-                        # Create result structure
-                        moves_str = " ".join(pv_moves) if pv_moves else best_move
-                        
-                        stockfish_result = {
-                            "fen": fen,
-                            "knodes": 100,  # Approximate
-                            "depth": depth_reached,
-                            "pvs": [{
-                                "moves": moves_str,
-                                "cp": score,
-                                "mate": None
-                            }]
-                        }
-                        
-                        logger.info(f"Stockfish analysis complete: cp={score}, moves={moves_str}")
-                        return stockfish_result
-                    else:
-                        logger.error(f"No valid analysis from Stockfish: best_move={best_move}, score={score}")
-                        return None
-                        
-                except subprocess.TimeoutExpired:
-                    process.kill()
-                    logger.error("Stockfish analysis timed out")
-                    return None
-                except Exception as e:
-                    logger.error(f"Stockfish subprocess error: {e}")
-                    import traceback
-                    logger.error(traceback.format_exc())
-                    return None
-            
-            # Run in executor
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(None, run_stockfish_analysis)
-            return result
-            
+            board = chess.Board(fen)
+            if not board.is_valid():
+                logger.error(f"Invalid FEN: {fen}")
+                return None
+        except Exception as e:
+            logger.error(f"FEN validation error: {e}")
+            return None
+        
+        logger.info(f"Starting Stockfish analysis for FEN: {fen[:30]}... with profile {profile.name} (multipv={multi_pv})")
+        
+        try:
+            infos = await self.engine_pool.analyse(board, profile, multi_pv, priority)
         except Exception as e:
             logger.error(f"Stockfish analysis error: {e}")
             return None
+        
+        stockfish_result = self._format_engine_lines(fen, infos)
+        if not stockfish_result:
+            logger.error(f"No valid analysis from Stockfish for FEN: {fen}")
+            return None
+        
+        pvs = stockfish_result["pvs"]
+        logger.info(f"Stockfish analysis complete: depth={stockfish_result['depth']}, lines={len(pvs)}, score={Score.from_pv(pvs[0])}")
+        return stockfish_result
     
-    async def analyze_position(self, fen: str, multi_pv: int = 1, depth: int = 15) -> AnalysisResult:
+    async def analyze_position(self, fen: str, multi_pv: int = 1, depth: Optional[int] = None,
+                               profile: Optional[str] = None, priority: str = "interactive",
+                               quality: Optional[str] = None) -> AnalysisResult:
         """
         Analyze a chess position with fallback strategy:
         1. Check cache
-        2. Try Lichess Cloud Eval
-        3. Fallback to Stockfish
+        2. Probe local Syzygy tablebases (endgames within the piece limit)
+        3. Try Lichess Cloud Eval
+        4. Fallback to Stockfish (limited by the analysis profile; `depth` overrides the profile depth)
+
+        `priority` is the engine traffic class ("interactive" for board requests, "bulk" for batches).
+        Under load the admission controller lowers the Stockfish budget, then answers from
+        cache / cloud only, and raises `Overloaded` when nothing cheaper is available.
+        Pass `quality` when admission was already decided for the whole request.
         """
-        import time
         start_time = time.time()
+        analysis_profile = get_analysis_profile(profile).with_depth(depth)
+        if quality is None:
+            quality = self.admission.quality(priority)
         
         logger.info(f"🔍 Starting analysis for FEN: {fen[:50]}...")
-        logger.info(f"📊 Analysis parameters: multi_pv={multi_pv}, depth={depth}")
+        logger.info(f"📊 Analysis parameters: multi_pv={multi_pv}, profile={analysis_profile.name}, depth={analysis_profile.depth}, quality={quality}")
         logger.info(f"🔑 Full FEN: {fen}")
 
-        # Step 1: Check cache
+        # Step 1: Check cache (entries searched shallower than the profile asks for don't count)
         logger.info("1️⃣ Checking cache...")
-        cached_result = self._get_from_cache(fen, multi_pv)
+        min_depth = analysis_profile.depth or 0
+        cached_result = self._get_from_cache(fen, multi_pv, min_depth)
         if cached_result:
             logger.info("✅ Cache hit!")
             return AnalysisResult(
@@ -423,14 +311,44 @@ class EnhancedAnalysisService:
             )
         else:
             logger.info("❌ Cache miss")
+        
+        if quality != QUALITY_FULL:
+            # Under load, a shallower or shorter cached answer beats another engine search
+            partial_result = self._get_from_cache(fen, multi_pv) or self._get_from_cache(fen, 1)
+            if partial_result:
+                logger.info("✅ Partial cache hit (under load)")
+                return AnalysisResult(
+                    source="cache",
+                    fen=fen,
+                    evaluation=partial_result,
+                    time_taken=time.time() - start_time,
+                    quality=QUALITY_CACHED
+                )
+
+        # Step 2: Tablebase
+        if self.tablebase.enabled:
+            logger.info("2️⃣ Probing Syzygy tablebase...")
+            tablebase_result = self._probe_tablebase(fen)
+            if tablebase_result:
+                logger.info(f"✅ Tablebase hit: wdl={tablebase_result['wdl']}, dtz={tablebase_result['dtz']}")
+                self._save_to_cache(fen, tablebase_result)
+                return AnalysisResult(
+                    source="tablebase",
+                    fen=fen,
+                    evaluation=tablebase_result,
+                    time_taken=time.time() - start_time
+                )
 
-        # Step 2: Try Lichess
-        logger.info("2️⃣ Trying Lichess Cloud Eval...")
+        # Step 3: Try Lichess
+        logger.info("3️⃣ Trying Lichess Cloud Eval...")
         lichess_result = await self._query_lichess(fen, multi_pv)
+        if lichess_result and (lichess_result.get("depth") or 0) < min_depth:
+            logger.info(f"❌ Lichess eval too shallow (depth {lichess_result.get('depth')} < {min_depth})")
+            lichess_result = None
         if lichess_result:
             logger.info(f"✅ Lichess analysis successful! Score from first PV: {lichess_result.get('pvs', [{}])[0].get('cp', 'N/A')}")
             # Cache the result
-            self._save_to_cache(fen, lichess_result, multi_pv)
+            self._save_to_cache(fen, lichess_result)
             return AnalysisResult(
                 source="lichess",
                 fen=fen,
@@ -441,22 +359,30 @@ class EnhancedAnalysisService:
         else:
             logger.info("❌ Lichess analysis failed")
 
-        # Step 3: Fallback to Stockfish
-        logger.info("3️⃣ Falling back to Stockfish...")
+        # Step 4: Fallback to Stockfish
+        if quality not in (QUALITY_FULL, QUALITY_DEGRADED):
+            logger.warning(f"🚦 Engines saturated, no cached answer for FEN: {fen}")
+            raise self.admission.reject(priority)
+        if quality == QUALITY_DEGRADED:
+            analysis_profile = analysis_profile.degraded()
+            logger.info(f"🚦 Engines busy, degrading to profile {analysis_profile.name}")
+        
+        logger.info("4️⃣ Falling back to Stockfish...")
         logger.info(f"🔧 Stockfish path: {self.stockfish_path}")
-        logger.info(f"🔧 Engine initialized: {self.engine is not None}")
         
-        stockfish_result = await self._analyze_with_stockfish(fen, depth)
+        stockfish_result = await self._analyze_with_stockfish(fen, analysis_profile, multi_pv, priority)
         if stockfish_result:
             logger.info("✅ Stockfish analysis successful!")
-            # Cache the result
-            self._save_to_cache(fen, stockfish_result, multi_pv)
+            # Cache the result (degraded searches would shadow full ones later)
+            if quality == QUALITY_FULL:
+                self._save_to_cache(fen, stockfish_result)
             return AnalysisResult(
                 source="stockfish",
                 fen=fen,
                 evaluation=stockfish_result,
-                depth=depth,
-                time_taken=time.time() - start_time
+                depth=stockfish_result.get("depth"),
+                time_taken=time.time() - start_time,
+                quality=quality
             )
         else:
             logger.info("❌ Stockfish analysis failed")
@@ -470,7 +396,8 @@ class EnhancedAnalysisService:
             time_taken=time.time() - start_time
         )
 
-    async def analyze_multiple_positions(self, fens: List[str], depth: int = 12) -> List[AnalysisResult]:
+    async def analyze_multiple_positions(self, fens: List[str], depth: Optional[int] = None,
+                                         profile: Optional[str] = None) -> List[AnalysisResult]:
         """Analyze multiple positions efficiently"""
         logger.info(f"Analyzing {len(fens)} positions")
         
@@ -478,30 +405,52 @@ class EnhancedAnalysisService:
         batch_size = 5
         results = []
         
+        async def analyze(fen: str) -> Optional[AnalysisResult]:
+            try:
+                return await self.analyze_position(fen, depth=depth, profile=profile, priority="bulk")
+            except Overloaded:
+                # Shed mid-batch: let the client retry the whole batch later
+                raise
+            except Exception as e:
+                logger.error(f"Batch analysis error: {e}")
+                return None
+        
         for i in range(0, len(fens), batch_size):
             batch_fens = fens[i:i + batch_size]
-            batch_tasks = [
-                self.analyze_position(fen, depth=depth) 
-                for fen in batch_fens
-            ]
-            batch_results = await asyncio.gather(*batch_tasks, return_exceptions=True)
-            
-            for result in batch_results:
-                if isinstance(result, Exception):
-                    logger.error(f"Batch analysis error: {result}")
-                    continue
-                results.append(result)
+            batch_results = await _gather_or_cancel([asyncio.ensure_future(analyze(fen)) for fen in batch_fens])
+            results.extend(result for result in batch_results if result is not None)
         
         return results
     
+    async def evaluate_positions(self, fens: List[str], profile: Optional[str] = None,
+                                 priority: str = "review") -> List[AnalysisResult]:
+        """
+        Analyze a sequence of positions (e.g. every position of a game), one result per FEN
+        in order. Repeated positions are analysed once.
+        
+        The request is admitted once, up front: checking every position would count the
+        game's own queued positions as load. Positions then run at most one per pooled
+        engine, so a long game neither floods the pool (and the interactive traffic
+        sharing it) nor Lichess with requests at once.
+        """
+        quality = self.admission.quality(priority)
+        if quality == QUALITY_REJECTED:
+            raise self.admission.reject(priority)
+        slots = asyncio.Semaphore(self.engine_pool.size)
+        
+        async def evaluate(fen: str) -> AnalysisResult:
+            async with slots:
+                return await self.analyze_position(fen, profile=profile, priority=priority, quality=quality)
+        
+        unique = list(dict.fromkeys(fens))
+        results = await _gather_or_cancel([asyncio.ensure_future(evaluate(fen)) for fen in unique])
+        by_fen = dict(zip(unique, results))
+        return [by_fen[fen] for fen in fens]
+    
     async def cleanup(self):
         """Clean up resources"""
-        if self.engine:
-            await asyncio.get_event_loop().run_in_executor(
-                None,
-                self.engine.quit
-            )
-            self.engine = None
+        await self.engine_pool.close()
+        await self.http_client.aclose()
         
         if self.redis_client:
             self.redis_client.close()
@@ -0,0 +1,274 @@
+"""
+Optional on-disk evaluation index: memory-mapped, shared by every worker process on a host
+"""
+import os
+import mmap
+import time
+import struct
+import bisect
+import logging
+import threading
+from typing import Optional, Dict, Iterable, Iterator, Tuple
+from config import EVAL_INDEX_PATH, EVAL_INDEX_COMPACT_MB
+
+try:
+    import fcntl
+except ImportError:  # Windows: compaction is not coordinated between processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+INDEX_MAGIC = b"EVALIDX1"
+_INDEX_HEADER = struct.Struct("<8sQ")  # magic, entry count
+_LOG_RECORD = struct.Struct("<QI")     # position key, payload length
+
+# Seconds between checks for a compacted index or log records from other workers
+REFRESH_INTERVAL = 1.0
+
+
+class EvalIndex:
+    """
+    Position key -> compact evaluation record (utils/eval_codec.py) in a directory of two files:
+
+    - index.bin   immutable, sorted: header | keys (uint64) | offsets (uint64, count + 1) | records.
+                  Memory-mapped read-only, so every uvicorn worker shares the same page cache
+                  and a lookup is a binary search over the mapped keys - no copy, no syscall.
+    - append.log  new records (key | length | record), appended with one write each. Every
+                  process reads the tail it hasn't seen into a small dict; newer records win.
+
+    When the log passes EVAL_INDEX_COMPACT_MB a background thread merges it into a new
+    index.bin (renamed into place) under a file lock; the other workers pick the new
+    file up on their next refresh. Disabled when no directory is configured.
+    """
+
+    def __init__(self, path: Optional[str] = None, compact_bytes: int = 64 << 20):
+        self.path = path
+        self.compact_bytes = compact_bytes
+        self._lock = threading.Lock()
+        self._compacting = False
+        # (mapping, keys, offsets, count), swapped as one so lookups never mix two files
+        self._index: Tuple = (None, (), (), 0)
+        self._index_id: Optional[Tuple[int, int]] = None
+        self._log: Dict[int, bytes] = {}
+        self._log_id: Optional[Tuple[int, int]] = None
+        self._log_offset = 0
+        self._checked_at = 0.0
+        if path:
+            try:
+                os.makedirs(path, exist_ok=True)
+                self._refresh(force=True)
+                logger.info(f"Evaluation index opened: {path} ({len(self)} positions)")
+            except Exception as e:
+                logger.warning(f"Could not open evaluation index at {path}: {e}")
+                self.path = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    @property
+    def index_file(self) -> str:
+        return os.path.join(self.path, "index.bin")
+
+    @property
+    def log_file(self) -> str:
+        return os.path.join(self.path, "append.log")
+
+    def __len__(self) -> int:
+        return self._index[3] + len(self._log)
+
+    # Reading
+
+    def get(self, key: int) -> Optional[bytes]:
+        """Encoded record for a position key, or None"""
+        if not self.enabled:
+            return None
+        self._refresh()
+        record = self._log.get(key)
+        if record is not None:
+            return record
+        mapped, keys, offsets, count = self._index
+        i = bisect.bisect_left(keys, key)
+        if i == count or keys[i] != key:
+            return None
+        return mapped[offsets[i]:offsets[i + 1]]
+
+    def __contains__(self, key: int) -> bool:
+        return self.get(key) is not None
+
+    def items(self) -> Iterator[Tuple[int, bytes]]:
+        """Every (key, record), the log's newer records replacing the index's"""
+        self._refresh(force=True)
+        log = dict(self._log)
+        for key, record in self._index_items():
+            if key not in log:
+                yield key, record
+        yield from log.items()
+
+    def _refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < REFRESH_INTERVAL:
+            return
+        with self._lock:
+            self._checked_at = now
+            self._read_log(restart=self._open_index())
+
+    def _open_index(self) -> bool:
+        """Map the current index file; returns whether it changed (a compaction finished)"""
+        try:
+            st = os.stat(self.index_file)
+        except FileNotFoundError:
+            return False
+        if (st.st_ino, st.st_mtime_ns) == self._index_id:
+            return False
+        with open(self.index_file, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = _INDEX_HEADER.unpack_from(mapped, 0)
+        if magic != INDEX_MAGIC:
+            mapped.close()
+            raise ValueError(f"{self.index_file} is not an evaluation index")
+        keys_end = _INDEX_HEADER.size + 8 * count
+        view = memoryview(mapped)
+        # The old mapping is left to the garbage collector: a lookup may still be using it
+        self._index = (
+            mapped,
+            view[_INDEX_HEADER.size:keys_end].cast("Q"),
+            view[keys_end:keys_end + 8 * (count + 1)].cast("Q"),
+            count,
+        )
+        self._index_id = (st.st_ino, st.st_mtime_ns)
+        return True
+
+    def _read_log(self, restart: bool = False):
+        """
+        Read the records appended since the last call. `restart` (the index changed) reads
+        the log from the start: once a compaction deletes the merged log, the next log may
+        reuse its inode, so the inode alone can't tell a new log from the old one.
+        """
+        try:
+            st = os.stat(self.log_file)
+        except FileNotFoundError:
+            self._log, self._log_id, self._log_offset = {}, None, 0
+            return
+        if restart or st.st_ino != (self._log_id or (None,))[0] or st.st_size < self._log_offset:
+            # A compaction moved the old log into the index: start on the new one
+            self._log, self._log_offset = {}, 0
+        self._log_id = (st.st_ino, st.st_size)
+        if st.st_size == self._log_offset:
+            return
+        with open(self.log_file, "rb") as f:
+            f.seek(self._log_offset)
+            records, consumed = parse_log(f.read())
+        self._log.update(records)
+        self._log_offset += consumed
+
+    # Writing
+
+    def put_many(self, records: Iterable[Tuple[int, bytes]]) -> int:
+        """Append records to the log (one write for the whole batch)"""
+        if not self.enabled:
+            return 0
+        records = list(records)
+        if not records:
+            return 0
+        data = b"".join(_LOG_RECORD.pack(key, len(record)) + record for key, record in records)
+        fd = os.open(self.log_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        with self._lock:
+            self._log.update(records)
+        if size >= self.compact_bytes and not self._compacting:
+            self._compacting = True
+            threading.Thread(target=self._compact_in_background, daemon=True).start()
+        return len(records)
+
+    def put(self, key: int, record: bytes):
+        self.put_many([(key, record)])
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception as e:
+            logger.warning(f"Evaluation index compaction failed: {e}")
+        finally:
+            self._compacting = False
+
+    def compact(self, fill: Iterable[Tuple[int, bytes]] = ()) -> int:
+        """
+        Merge the log into a new index file; returns the number of positions indexed.
+        `fill` bulk-loads extra records for positions the index doesn't have yet.
+        """
+        if not self.enabled:
+            return 0
+        with open(os.path.join(self.path, "compact.lock"), "w") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            # New appends go to a fresh log while this one is merged
+            merging = self.log_file + ".merging"
+            if os.path.exists(self.log_file) and not os.path.exists(merging):
+                os.replace(self.log_file, merging)
+            self._refresh(force=True)
+            entries = dict(fill)
+            entries.update(self._index_items())
+            if os.path.exists(merging):
+                with open(merging, "rb") as f:
+                    entries.update(parse_log(f.read())[0])
+            count = write_index(self.index_file, entries)
+            if os.path.exists(merging):
+                os.remove(merging)
+        self._refresh(force=True)
+        logger.info(f"Evaluation index compacted: {count} positions")
+        return count
+
+    def _index_items(self) -> Iterator[Tuple[int, bytes]]:
+        mapped, keys, offsets, count = self._index
+        for i in range(count):
+            yield keys[i], mapped[offsets[i]:offsets[i + 1]]
+
+
+def parse_log(data: bytes) -> Tuple[Dict[int, bytes], int]:
+    """Records of an append log and the bytes they span (a record still being written is left out)"""
+    records: Dict[int, bytes] = {}
+    offset = 0
+    while offset + _LOG_RECORD.size <= len(data):
+        key, length = _LOG_RECORD.unpack_from(data, offset)
+        end = offset + _LOG_RECORD.size + length
+        if end > len(data):
+            break
+        records[key] = data[offset + _LOG_RECORD.size:end]
+        offset = end
+    return records, offset
+
+
+def write_index(path: str, entries: Dict[int, bytes]) -> int:
+    """Write a sorted index file atomically (temp file + rename)"""
+    keys = sorted(entries)
+    offsets = []
+    position = _INDEX_HEADER.size + 8 * len(keys) + 8 * (len(keys) + 1)
+    for key in keys:
+        offsets.append(position)
+        position += len(entries[key])
+    offsets.append(position)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_INDEX_HEADER.pack(INDEX_MAGIC, len(keys)))
+        f.write(struct.pack(f"<{len(keys)}Q", *keys))
+        f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        for key in keys:
+            f.write(entries[key])
+    os.replace(tmp, path)
+    return len(keys)
+
+
+# Global instance - lazy initialization
+eval_index = None
+
+def get_eval_index():
+    """Get or create the evaluation index for the configured directory"""
+    global eval_index
+    if eval_index is None:
+        eval_index = EvalIndex(EVAL_INDEX_PATH, EVAL_INDEX_COMPACT_MB << 20)
+    return eval_index
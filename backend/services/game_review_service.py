@@ -3,120 +3,295 @@ import chess.pgn
 import chess.engine
 import asyncio
 import io
-import math
+import hashlib
+import numpy as np
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional, Tuple
-import os
-from config import STOCKFISH_PATH
+import chess.polyglot
+from services.analysis_profiles import AnalysisProfile, get_analysis_profile
+from services.opening_book import get_opening_book
+from services.tablebase import get_tablebase_service
+from services.review_store import get_review_store
+from services.engine_pool import EngineSession, get_engine_pool
+from services.engine_discovery import get_stockfish_path
+from services.admission import get_admission_controller, Overloaded, QUALITY_FULL, QUALITY_DEGRADED
+from services.review_scoring import score_plies, pack_plies, classify_moves, CLASSIFICATIONS, BOOK, NOT_SCORED
+from utils.chess_utils import moves_hash, pgn_tree, position_key
+from utils.score import Score
 
 class GameReviewService:
+    # Adaptive review scheduling: after the shallow pass, a ply gets a full-budget
+    # re-search when its centipawn loss is within `margin` of a classification
+    # boundary, or when the eval swings by more than REFINE_SWING_CP
+    REFINE_MARGINS = [(50, 15), (100, 30), (200, 50)]  # (threshold cp, margin cp)
+    REFINE_SWING_CP = 250
+    DECIDED_EVAL = 6.0  # pawns; plies where both evals are beyond this are not refined
+    POSITION_CACHE_SIZE = 50_000  # engine results kept in memory for incremental re-reviews
+
     def __init__(self):
-        # Use environment variable or local stockfish executable
-        if STOCKFISH_PATH and os.path.exists(STOCKFISH_PATH):
-            self.stockfish_path = STOCKFISH_PATH
-            print(f"🔧 [GAME REVIEW SERVICE] Using STOCKFISH_PATH from environment: {STOCKFISH_PATH}")
-        else:
-            # Try multiple possible paths to find Stockfish
-            possible_paths = [
-                # Path relative to current service file
-                os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "engines", "stockfish.exe"),
-                # Path relative to current working directory
-                os.path.join(os.getcwd(), "engines", "stockfish.exe"),
-                # Path in the same directory as main.py
-                os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "engines", "stockfish", "stockfish.exe"),
-                # System PATH
-                "stockfish.exe",
-                "stockfish"
-            ]
-            
-            print(f"🔍 [GAME REVIEW SERVICE] Searching for Stockfish...")
-            self.stockfish_path = None
-            
-            for path in possible_paths:
-                print(f"   🔎 Checking: {path}")
-                if os.path.exists(path):
-                    self.stockfish_path = path
-                    print(f"   ✅ Found Stockfish at: {path}")
-                    break
-                else:
-                    print(f"   ❌ Not found at: {path}")
-            
-            if not self.stockfish_path:
-                print(f"💥 [GAME REVIEW SERVICE] No valid Stockfish found in any of the paths!")
-                print(f"🔍 [GAME REVIEW SERVICE] Current working directory: {os.getcwd()}")
-                print(f"� [GAME REVIEW SERVICE] Script directory: {os.path.dirname(os.path.abspath(__file__))}")
-                raise FileNotFoundError("Stockfish executable not found")
+        # Discovered once per process (normally during app startup)
+        self.stockfish_path = get_stockfish_path()
+        if not self.stockfish_path:
+            print(f"💥 [GAME REVIEW SERVICE] No working Stockfish found (set STOCKFISH_PATH or add engines/stockfish)")
+            raise FileNotFoundError("Stockfish executable not found")
         
         print(f"✅ [GAME REVIEW SERVICE] Using Stockfish at: {self.stockfish_path}")
         
-        self.analysis_depth = 15
-        self.analysis_time = 0.5  # seconds per position
+        # Default search budget; callers can pick another profile per request
+        self.profile = get_analysis_profile()
+        self.opening_book = get_opening_book()
+        self.tablebase = get_tablebase_service()
+        self.review_store = get_review_store()
+        self.engine_pool = get_engine_pool(self.stockfish_path)
+        self.admission = get_admission_controller()
+        # (zobrist hash, profile name) -> (eval, best move, searched with the full profile)
+        self.position_cache: "OrderedDict[Tuple[int, str], Tuple[float, Optional[str], bool]]" = OrderedDict()
+        # (zobrist hash, profile name) -> search running for another review, shared instead of repeated
+        self.in_flight: Dict[Tuple[int, str], asyncio.Future] = {}
         
         print(f"🤖 [GAME REVIEW SERVICE] Stockfish path: {self.stockfish_path}")
-        print(f"📊 [GAME REVIEW SERVICE] Analysis depth: {self.analysis_depth}")
-        print(f"⏱️  [GAME REVIEW SERVICE] Analysis time per position: {self.analysis_time}s")
+        print(f"📊 [GAME REVIEW SERVICE] Default analysis profile: {self.profile.name} "
+              f"(depth={self.profile.depth}, nodes={self.profile.nodes}, time={self.profile.time}s)")
         
     def classify_move(self, eval_before: float, eval_after: float, best_eval: float, is_book_move: bool = False) -> str:
         """
-        Chess.com-exact move classification with precise thresholds
+        Chess.com-exact move classification with precise thresholds (see services/review_scoring.py)
         """
-        if is_book_move:
-            return "book"
-            
-        # Calculate centipawn loss (Chess.com method)
-        eval_loss = abs(best_eval - eval_after) * 100  # Convert to centipawns
+        code = classify_moves(np.array([eval_before]), np.array([eval_after]), np.array([best_eval]),
+                              np.array([is_book_move]))[0]
+        return CLASSIFICATIONS[code]
+    
+    def _needs_refinement(self, board_before: chess.Board, eval_before: Optional[float],
+                          eval_next: Optional[float], is_book_move: bool) -> bool:
+        """
+        Decide whether a ply screened with the shallow profile needs a full-budget search.
+        `eval_next` is the eval of the position after the move (opponent's perspective).
+        """
+        if is_book_move or eval_before is None or eval_next is None:
+            return False
+        
+        # Forced moves can't lose anything
+        if board_before.legal_moves.count() == 1:
+            return False
         
-        # Special case for brilliant moves (Chess.com logic)
-        # A brilliant move is a sacrifice that leads to a better position
-        eval_gain = (eval_after - eval_before) * 100
-        if eval_gain < -100 and eval_loss <= 15:  # Sacrifice but still best/near-best
-            return "brilliant"
+        eval_after = -eval_next
         
-        # Chess.com exact thresholds (community verified)
-        if eval_loss <= 15:      # 0-15 centipawns
-            return "best"
-        elif eval_loss <= 25:    # 16-25 centipawns
-            return "excellent"
-        elif eval_loss <= 50:    # 26-50 centipawns
-            return "good"
-        elif eval_loss <= 100:   # 51-100 centipawns
-            return "inaccuracy"
-        elif eval_loss <= 200:   # 101-200 centipawns
-            return "mistake"
-        else:                    # 201+ centipawns
-            return "blunder"
+        # Result already decided on both sides of the move
+        if min(eval_before, eval_after) >= self.DECIDED_EVAL or max(eval_before, eval_after) <= -self.DECIDED_EVAL:
+            return False
+        
+        eval_loss = abs(eval_before - eval_after) * 100
+        if eval_loss >= self.REFINE_SWING_CP:
+            return True
+        return any(abs(eval_loss - threshold) <= margin for threshold, margin in self.REFINE_MARGINS)
+    
+    def _cached_position(self, board: chess.Board, profile: AnalysisProfile) -> Optional[Tuple[float, Optional[str], bool]]:
+        """Cached result good enough for `profile` (a full search also answers its screening profile)"""
+        key = (chess.polyglot.zobrist_hash(board), profile.parent or profile.name)
+        entry = self.position_cache.get(key)
+        if entry is None or (profile.parent is None and not entry[2]):
+            return None
+        self.position_cache.move_to_end(key)
+        return entry
     
-    async def analyze_position(self, board: chess.Board) -> Tuple[Optional[float], Optional[str]]:
+    def _remember_position(self, zobrist: int, profile_name: str, eval_result: float,
+                           best_move: Optional[str], full: bool):
+        key = (zobrist, profile_name)
+        current = self.position_cache.get(key)
+        if current and current[2] and not full:
+            return  # never replace a full search with a screening one
+        self.position_cache[key] = (eval_result, best_move, full)
+        self.position_cache.move_to_end(key)
+        while len(self.position_cache) > self.POSITION_CACHE_SIZE:
+            self.position_cache.popitem(last=False)
+    
+    async def _evaluate_positions(self, boards: List[chess.Board], profile: AnalysisProfile,
+                                  stats: Optional[Dict[str, int]] = None,
+                                  session: Optional[EngineSession] = None) -> Tuple[List[Optional[float]], List[Optional[str]]]:
         """
-        Analyze a single position and return evaluation and best move
+        Evaluate a list of positions (in game order) with one profile, in pawns for the side
+        to move on the utils.score review scale. Finished games are scored without the engine
+        (checkmate = mated, draws = 0), and so are endgames covered by the Syzygy tablebase
+        (wins and losses at the centipawn ceiling, below any mate; draws = 0).
+        Positions already in the position cache are reused; `stats` counts what ran where.
+        
+        Positions are searched from the last to the first: the transposition table
+        filled by later positions then already holds most of the earlier positions' lines
+        (benchmarks/engine_affinity.py measures the nodes saved against cold engines).
         """
+        stats = stats if stats is not None else {}
+        tier = "shallow" if profile.parent else "full"
+        evals = [None] * len(boards)
+        best_moves = [None] * len(boards)
+        for idx in reversed(range(len(boards))):
+            board = boards[idx]
+            if board.is_game_over():
+                evals[idx] = Score(mate=0).pawns() if board.is_checkmate() else 0.0
+                continue
+            probe = self.tablebase.probe(board)
+            if probe:
+                print(f"   📖 [TABLEBASE] wdl={probe['wdl']}, dtz={probe['dtz']}, best={probe['best_move']}")
+                evals[idx] = Score(cp=self.tablebase.wdl_to_cp(probe["wdl"])).pawns()
+                best_moves[idx] = probe["best_move"]
+                stats["tablebase"] = stats.get("tablebase", 0) + 1
+                continue
+            cached = self._cached_position(board, profile)
+            if cached:
+                evals[idx], best_moves[idx] = cached[0], cached[1]
+                stats["reused"] = stats.get("reused", 0) + 1
+                continue
+            (eval_result, best_move), shared = await self._search_shared(board, profile, session)
+            if shared:
+                stats["reused"] = stats.get("reused", 0) + 1
+                evals[idx], best_moves[idx] = eval_result, best_move
+                continue
+            stats[tier] = stats.get(tier, 0) + 1
+            if eval_result is not None:
+                self._remember_position(chess.polyglot.zobrist_hash(board), profile.parent or profile.name,
+                                        eval_result, best_move, profile.parent is None)
+            evals[idx], best_moves[idx] = eval_result, best_move
+        return evals, best_moves
+    
+    async def _search_shared(self, board: chess.Board, profile: AnalysisProfile,
+                             session: Optional[EngineSession]) -> Tuple[Tuple[Optional[float], Optional[str]], bool]:
+        """
+        analyze_position, joining an identical search already running for a concurrent
+        review (games reviewed together share their openings). Returns (result, shared).
+        
+        Only a search that already holds its engine is shared: an owner still waiting for
+        the pool could be waiting on engines held by the very reviews waiting on it.
+        """
+        if session is not None:
+            try:
+                await session.acquire()
+            except Exception:
+                session = None  # no engine to own a shared search with: search unshared (and report why)
+        key = (chess.polyglot.zobrist_hash(board), profile.name)
+        running = self.in_flight.get(key)
+        if running is not None:
+            try:
+                return await asyncio.shield(running), True
+            except asyncio.CancelledError:
+                if not running.cancelled():
+                    raise
+                # The other review was cancelled mid-search: search it here
+        if session is None:
+            return await self.analyze_position(board, profile), False
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
         try:
-            print(f"   🔧 [ENGINE] Opening Stockfish at: {self.stockfish_path}")
-            with chess.engine.SimpleEngine.popen_uci(self.stockfish_path) as engine:
-                # Set engine options for faster analysis
-                engine.configure({"Threads": 1, "Hash": 128})
-                print(f"   🔧 [ENGINE] Analyzing position: {board.fen()}")
-                
-                info = engine.analyse(
-                    board, 
-                    chess.engine.Limit(depth=self.analysis_depth, time=self.analysis_time)
+            result = await self.analyze_position(board, profile, session)
+            future.set_result(result)
+            return result, False
+        finally:
+            if not future.done():
+                future.cancel()
+            if self.in_flight.get(key) is future:
+                del self.in_flight[key]
+    
+    async def _search_game(self, moves_data: List[Dict[str, Any]], positions: List[chess.Board],
+                           needed: List[int], book_flags: List[bool], analysis_profile: AnalysisProfile,
+                           game_key: str, search_stats: Dict[str, int]):
+        """
+        All engine work of one review, pinned to a single warm engine session. The game key
+        is the UCI game token, so no `ucinewgame` (hash clear) is sent between plies.
+        
+        Returns (evals, best_moves, refined_plies, deep_positions, best_evals), where
+        best_evals maps refined plies to the verified eval after the engine's best move.
+        """
+        evals = [None] * len(positions)
+        best_moves = [None] * len(positions)
+        refined_plies = set()
+        deep_positions = set()
+        best_evals = {}
+        
+        async with self.engine_pool.session(analysis_profile, game=game_key, priority="review") as session:
+            # Pass 1: one cheap search per position (evals are relative to the side to move)
+            shallow_profile = analysis_profile.shallow()
+            print(f"⚡ [SCHEDULER] Pass 1: screening {len(needed)}/{len(positions)} positions ({shallow_profile.go_command()})")
+            shallow_evals, shallow_best_moves = await self._evaluate_positions(
+                [positions[j] for j in needed], shallow_profile, search_stats, session
+            )
+            for j, shallow_eval, shallow_best in zip(needed, shallow_evals, shallow_best_moves):
+                evals[j], best_moves[j] = shallow_eval, shallow_best
+            
+            # Pass 2: full-budget re-search only where the screened verdict is uncertain.
+            # Re-searching a position can move a neighbouring ply near a threshold, so repeat
+            # until no unrefined ply qualifies.
+            while True:
+                pending = [
+                    k for k in range(len(moves_data))
+                    if k not in refined_plies and self._needs_refinement(
+                        moves_data[k]['board_before'], evals[k], evals[k + 1], book_flags[k]
+                    )
+                ]
+                if not pending:
+                    break
+                refined_plies.update(pending)
+                todo = sorted({j for k in pending for j in (k, k + 1)} - deep_positions)
+                print(f"🎯 [SCHEDULER] Pass 2: re-searching {len(pending)} plies ({len(todo)} positions) with '{analysis_profile.name}'")
+                deep_evals, deep_best_moves = await self._evaluate_positions(
+                    [positions[j] for j in todo], analysis_profile, search_stats, session
                 )
-                
-                print(f"   🔧 [ENGINE] Analysis info: {info}")
-                
-                score = info["score"].relative
-                if score.is_mate():
-                    # Convert mate score to large centipawn value
-                    eval_cp = 2000 if score.mate() > 0 else -2000
-                    print(f"   🔧 [ENGINE] Mate score: {eval_cp}")
-                else:
-                    eval_cp = score.score()
-                    print(f"   🔧 [ENGINE] Centipawn score: {eval_cp}")
-                
-                best_move = str(info["pv"][0]) if "pv" in info and info["pv"] else None
-                print(f"   🔧 [ENGINE] Best move: {best_move}")
-                
-                return eval_cp / 100.0, best_move  # Convert to pawns
-                
+                for j, deep_eval, deep_best in zip(todo, deep_evals, deep_best_moves):
+                    if deep_eval is not None:
+                        evals[j], best_moves[j] = deep_eval, deep_best
+                deep_positions.update(todo)
+            
+            # Refined plies where the engine preferred another move: search the position
+            # after the best move, like the played move
+            children = {}
+            for k in sorted(refined_plies):
+                best_move_str = best_moves[k]
+                if not best_move_str or best_move_str == moves_data[k]['move'].uci():
+                    continue
+                try:
+                    best_move = chess.Move.from_uci(best_move_str)
+                except ValueError:
+                    continue
+                board_before = moves_data[k]['board_before']
+                if best_move in board_before.legal_moves:
+                    temp_board = board_before.copy()
+                    temp_board.push(best_move)
+                    children[k] = temp_board
+            if children:
+                child_evals, _ = await self._evaluate_positions(
+                    list(children.values()), analysis_profile, search_stats, session
+                )
+                for k, child_eval in zip(children, child_evals):
+                    if child_eval is not None:
+                        best_evals[k] = -child_eval
+        
+        return evals, best_moves, refined_plies, deep_positions, best_evals
+    
+    async def analyze_position(self, board: chess.Board,
+                               profile: Optional[AnalysisProfile] = None,
+                               session: Optional[EngineSession] = None) -> Tuple[Optional[float], Optional[str]]:
+        """
+        Analyze a single position and return evaluation and best move.
+        Pass an engine `session` to keep searching on the same warm engine;
+        otherwise any pooled engine is used.
+        """
+        profile = profile or self.profile
+        try:
+            print(f"   🔧 [ENGINE] Analyzing position: {board.fen()}")
+            if session is not None:
+                infos = await session.analyse(board, profile)
+            else:
+                infos = await self.engine_pool.analyse(board, profile)
+            info = infos[0]
+            
+            print(f"   🔧 [ENGINE] Analysis info: depth={info.get('depth')}, nodes={info.get('nodes')}")
+            
+            # Side to move's score; mates rank above every centipawn score, shorter mates higher
+            score = Score.from_engine(info["score"], board.turn)
+            print(f"   🔧 [ENGINE] Score: {score}")
+            
+            best_move = str(info["pv"][0]) if "pv" in info and info["pv"] else None
+            print(f"   🔧 [ENGINE] Best move: {best_move}")
+            
+            return score.pawns(), best_move
+            
         except Exception as e:
             print(f"   ❌ [ENGINE] Analysis error: {e}")
             print(f"   🔍 [ENGINE] Error type: {type(e).__name__}")
@@ -196,120 +371,115 @@ class GameReviewService:
             print(f"❌ [PGN CLEANER] Error during cleaning: {e}")
             return pgn_string  # Return original on error
     
-    def is_opening_move(self, board: chess.Board, move_number: int) -> bool:
+    def is_opening_move(self, board: chess.Board, move: chess.Move, move_number: int) -> bool:
         """
         Chess.com-style opening book detection.
-        Uses comprehensive opening database and move popularity.
+        Uses the opening book index (Polyglot book / ECO table) loaded once at startup;
+        book moves skip the engine, so only moves found in the index count.
         """
         # Chess.com typically considers first 10-15 moves as potential book moves
         if move_number > 15:
             return False
-            
-        # Get position without move counters for comparison
-        fen_base = ' '.join(board.fen().split()[:4])
-        
-        # Comprehensive Chess.com-style opening database
-        # These are the most common positions from master games
-        opening_book = {
-            # Starting position
-            "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq": True,
-            
-            # After 1.e4
-            "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq": True,
-            # After 1...e5
-            "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq": True,
-            # After 1...c5 (Sicilian)
-            "rnbqkbnr/pp1ppppp/8/2p5/4P3/8/PPPP1PPP/RNBQKBNR w KQkq": True,
-            # After 1...e6 (French)
-            "rnbqkbnr/pppp1ppp/4p3/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq": True,
-            # After 1...c6 (Caro-Kann)
-            "rnbqkbnr/pp1ppppp/2p5/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq": True,
-            
-            # After 1.d4
-            "rnbqkbnr/pppppppp/8/8/3P4/8/PPP1PPPP/RNBQKBNR b KQkq": True,
-            # After 1...d5
-            "rnbqkbnr/ppp1pppp/8/3p4/3P4/8/PPP1PPPP/RNBQKBNR w KQkq": True,
-            # After 1...Nf6
-            "rnbqkb1r/pppppppp/5n2/8/3P4/8/PPP1PPPP/RNBQKBNR w KQkq": True,
-            # After 1...f5 (Dutch)
-            "rnbqkbnr/ppppp1pp/8/5p2/3P4/8/PPP1PPPP/RNBQKBNR w KQkq": True,
-            
-            # After 1.Nf3
-            "rnbqkbnr/pppppppp/8/8/8/5N2/PPPPPPPP/RNBQKB1R b KQkq": True,
-            # After 1...d5
-            "rnbqkbnr/ppp1pppp/8/3p4/8/5N2/PPPPPPPP/RNBQKB1R w KQkq": True,
-            # After 1...Nf6
-            "rnbqkb1r/pppppppp/5n2/8/8/5N2/PPPPPPPP/RNBQKB1R w KQkq": True,
-            
-            # After 1.c4 (English)
-            "rnbqkbnr/pppppppp/8/8/2P5/8/PP1PPPPP/RNBQKBNR b KQkq": True,
-            # After 1...e5
-            "rnbqkbnr/pppp1ppp/8/4p3/2P5/8/PP1PPPPP/RNBQKBNR w KQkq": True,
-            # After 1...c5
-            "rnbqkbnr/pp1ppppp/8/2p5/2P5/8/PP1PPPPP/RNBQKBNR w KQkq": True,
-            
-            # King's Indian Attack setup
-            "rnbqkb1r/pppppppp/5n2/8/8/5NP1/PPPPPP1P/RNBQKB1R b KQkq": True,
-            
-            # Italian Game
-            "r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R b KQkq": True,
-            
-            # Spanish/Ruy Lopez
-            "r1bqkbnr/pppp1ppp/2n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R b KQkq": True,
-            
-            # Queen's Gambit
-            "rnbqkbnr/ppp1pppp/8/3p4/2PP4/8/PP2PPPP/RNBQKBNR b KQkq": True,
-            
-            # Sicilian Dragon setup
-            "rnbqkb1r/pp2pppp/3p1n2/2p5/3PP3/2N2N2/PPP2PPP/R1BQKB1R b KQkq": True,
-        }
-        
-        # Check if position is in opening book
-        if fen_base in opening_book:
-            return True
-            
-        # For very early moves (first 6 moves), be more permissive
-        # but still check basic principles
-        if move_number <= 6:
-            return self._is_reasonable_opening_move(board)
-            
-        return False
         
-    def _is_reasonable_opening_move(self, board: chess.Board) -> bool:
+        return self.opening_book.is_book_move(board, move)
+    
+    async def _review_variations(self, game: chess.pgn.Game, nodes: List[Dict[str, Any]],
+                                 positions: List[chess.Board], evals: List[Optional[float]],
+                                 best_moves: List[Optional[str]], analysis_profile: AnalysisProfile,
+                                 game_key: str, search_stats: Dict[str, int]) -> Tuple[List[Dict[str, Any]], Dict[str, int], Dict[str, Any]]:
         """
-        Check if the current position follows basic opening principles
-        (development, center control, king safety)
+        Classify every move off the mainline (see utils.chess_utils.pgn_tree). Returns the
+        moves, their stats and their packed scoring inputs (pack_plies, keyed by move id).
+        
+        Positions are deduplicated by Zobrist key before any engine work: positions the
+        mainline review already searched are reused, and a position reached in several
+        variations or by transposition is searched once. Variation moves are scored like
+        unrefined mainline plies (one full-profile search per position).
         """
-        # Count center pawns and developed pieces
-        center_control = 0
-        developed_pieces = 0
+        start = game.board()
+        by_id = {node["id"]: node for node in nodes}
+        side_nodes = [node for node in nodes if not node["mainline"]]
+        
+        def board_before(node):
+            return start if node["parent"] is None else by_id[node["parent"]]["board"]
         
-        piece_map = board.piece_map()
-        for square, piece in piece_map.items():
-            # Count center pawns (e4, d4, e5, d5)
-            if piece.piece_type == chess.PAWN:
-                if square in [chess.E4, chess.D4, chess.E5, chess.D5]:
-                    center_control += 1
-            
-            # Count developed minor pieces
-            elif piece.piece_type in [chess.KNIGHT, chess.BISHOP]:
-                starting_squares = {
-                    chess.WHITE: [chess.B1, chess.C1, chess.F1, chess.G1],
-                    chess.BLACK: [chess.B8, chess.C8, chess.F8, chess.G8]
-                }
-                if square not in starting_squares[piece.color]:
-                    developed_pieces += 1
+        book_flags = [self.is_opening_move(board_before(node), node["move"], board_before(node).fullmove_number)
+                      for node in side_nodes]
+        known = {position_key(board): (e, m) for board, e, m in zip(positions, evals, best_moves) if e is not None}
+        # Only positions next to a non-book move need an engine eval
+        needed = {}
+        for node, is_book in zip(side_nodes, book_flags):
+            if not is_book:
+                for board in (board_before(node), node["board"]):
+                    needed.setdefault(position_key(board), board)
+        todo = {key: board for key, board in needed.items() if key not in known}
+        print(f"🌳 [VARIATIONS] {len(side_nodes)} variation moves, {len(needed)} unique positions, "
+              f"{len(todo)} not searched by the mainline review")
+        if todo:
+            async with self.engine_pool.session(analysis_profile, game=game_key, priority="review") as session:
+                found_evals, found_best = await self._evaluate_positions(
+                    list(todo.values()), analysis_profile, search_stats, session
+                )
+            for key, found_eval, found_move in zip(todo, found_evals, found_best):
+                if found_eval is not None:
+                    known[key] = (found_eval, found_move)
+        
+        eval_before = np.full(len(side_nodes), np.nan)
+        eval_after = np.full(len(side_nodes), np.nan)
+        best_eval = np.full(len(side_nodes), np.nan)
+        sides, best_of = [], []
+        for k, node in enumerate(side_nodes):
+            before = board_before(node)
+            sides.append(0 if before.turn == chess.WHITE else 1)
+            before_eval, best_move = known.get(position_key(before), (None, None))
+            after_eval, _ = known.get(node["key"], (None, None))
+            best_of.append(best_move)
+            if book_flags[k] or before_eval is None or after_eval is None:
+                continue
+            eval_before[k] = before_eval
+            eval_after[k] = -after_eval
+            best_eval[k] = eval_after[k] if best_move == node["move"].uci() else before_eval
+        scores = score_plies(eval_before, eval_after, best_eval, book_flags, sides, n_games=1)
         
-        # Reasonable opening if there's some center control or development
-        return center_control > 0 or developed_pieces > 0
+        moves = []
+        for k, node in enumerate(side_nodes):
+            code = scores["codes"][k]
+            if code == NOT_SCORED:
+                continue
+            parent = by_id.get(node["parent"])
+            is_book = code == BOOK
+            moves.append({
+                "id": node["id"],
+                # Variation move this one follows; None where the variation leaves the mainline
+                "parent": parent["id"] if parent and not parent["mainline"] else None,
+                # Mainline move (moveIndex) a variation replaces, on its first move only
+                "alternativeTo": node["ply"] - start.ply() - 1 if not parent or parent["mainline"] else None,
+                "ply": node["ply"],
+                "move": node["move"].uci(),
+                "san": node["san"],
+                "classification": CLASSIFICATIONS[code],
+                "evalBefore": None if is_book else round(float(eval_before[k]), 2),
+                "evalAfter": None if is_book else round(float(eval_after[k]), 2),
+                "evalDrop": 0.0 if is_book else round(float(scores["loss"][k]), 1),
+                "bestMove": None if is_book else best_of[k],
+                "color": "white" if sides[k] == 0 else "black",
+            })
+        stats = {"moves": len(side_nodes), "positions": len(needed), "searched": len(todo)}
+        plies = pack_plies([node["id"] for node in side_nodes], sides, book_flags, eval_before, eval_after,
+                           best_eval, best_of)
+        return moves, stats, plies
     
-    async def analyze_game(self, pgn_string: str) -> Dict[str, Any]:
+    async def analyze_game(self, pgn_string: str, profile: Optional[str] = None,
+                           variations: bool = False) -> Dict[str, Any]:
         """
-        Analyze an entire game and return comprehensive statistics
+        Analyze an entire game and return comprehensive statistics.
+        With `variations`, moves in the PGN's sidelines are classified as well.
         """
         try:
+            analysis_profile = get_analysis_profile(profile) if profile else self.profile
             print("🎯 Starting Game Review Analysis...")
             print(f"📊 PGN Length: {len(pgn_string)} characters")
+            print(f"⚙️  Analysis profile: {analysis_profile.name}")
             
             print("🔍 [PGN PARSER] Attempting to parse PGN...")
             print(f"📝 [PGN PARSER] First 500 chars: {pgn_string[:500]}...")
@@ -423,178 +593,149 @@ class GameReviewService:
                     print(f"🔍 [PGN PARSER] First variation: {game.variation(0)}")
                 raise ValueError("No moves found in PGN")
             
+            # Repeat reviews of the same moves are served from the review store
+            game_key = moves_hash(game.board(), [m['move'] for m in moves_data])
+            store_key = game_key
+            tree_nodes = pgn_tree(game) if variations else []
+            if any(not node["mainline"] for node in tree_nodes):
+                # Reviews with variations are stored per move tree, not per mainline
+                tree = " ".join(f"{node['parent']}:{node['move'].uci()}" for node in tree_nodes)
+                store_key = hashlib.sha256(f"{game_key}|{tree}".encode()).hexdigest()
+            stored_review = await self.review_store.get(store_key, analysis_profile.name)
+            if stored_review:
+                print(f"💾 [REVIEW STORE] Serving stored review {game_key[:12]} ({analysis_profile.name})")
+                return stored_review
+            
+            # Admission control: under load the review runs with a cheaper profile, or is shed
+            quality = self.admission.admit("review")
+            if quality != QUALITY_FULL:
+                quality = QUALITY_DEGRADED
+                analysis_profile = analysis_profile.degraded()
+                print(f"🚦 [ADMISSION] Engines busy, reviewing with '{analysis_profile.name}' instead")
+            
             print(f"🔢 Total moves to analyze: {len(moves_data)}")
-            print(f"🏁 Expected completion time: ~{len(moves_data) * 0.7:.1f} seconds")
             
-            # Initialize statistics
-            move_classifications = []
-            white_stats = {"best": 0, "excellent": 0, "good": 0, "book": 0, "brilliant": 0, 
-                          "inaccuracy": 0, "mistake": 0, "blunder": 0}
-            black_stats = {"best": 0, "excellent": 0, "good": 0, "book": 0, "brilliant": 0, 
-                          "inaccuracy": 0, "mistake": 0, "blunder": 0}
+            # Every position of the game: before each ply, plus the final position
+            final_board = moves_data[-1]['board_before'].copy()
+            final_board.push(moves_data[-1]['move'])
+            positions = [m['board_before'] for m in moves_data] + [final_board]
+            
+            # Seed the position cache with every position stored reviews already analysed
+            # (shared openings, an extended game), so only new positions reach the engine
+            stored_positions = await self.review_store.get_positions(
+                list({format(position_key(board), "x") for board in positions}), analysis_profile.name
+            )
+            if stored_positions:
+                for entry in stored_positions:
+                    self._remember_position(int(entry["key"], 16), analysis_profile.name,
+                                            entry["eval"], entry["best"], entry["full"])
+                print(f"♻️  [REVIEW STORE] Reusing {len(stored_positions)} analysed positions from stored reviews")
+            
+            # Book detection runs before any engine call. Once a side leaves the book,
+            # later moves are never book again.
+            book_flags = []
+            opening_names = []
+            in_book = True
+            for m, board_after in zip(moves_data, positions[1:]):
+                in_book = in_book and self.is_opening_move(m['board_before'], m['move'], m['index'] // 2 + 1)
+                book_flags.append(in_book)
+                opening_names.append(self.opening_book.opening_name(board_after))
+            named_openings = [name for name in opening_names if name]
+            opening = named_openings[-1] if named_openings else None
+            print(f"📚 [OPENING BOOK] {sum(book_flags)} book plies, opening: {opening['name'] if opening else 'Unknown'}")
+            
+            # Only positions next to a non-book ply need an engine eval
+            needed = sorted({j for k, is_book in enumerate(book_flags) if not is_book for j in (k, k + 1)})
+            
+            search_stats = {"shallow": 0, "full": 0, "reused": 0, "tablebase": 0}
+            evals, best_moves, refined_plies, deep_positions, best_evals = await self._search_game(
+                moves_data, positions, needed, book_flags, analysis_profile, game_key, search_stats
+            )
+            
+            print(f"📐 [SCHEDULER] {len(refined_plies)}/{len(moves_data)} plies needed a full-budget search")
+            
+            variation_moves, variation_stats, variation_plies = None, None, None
+            if store_key != game_key:
+                variation_moves, variation_stats, variation_plies = await self._review_variations(
+                    game, tree_nodes, positions, evals, best_moves, analysis_profile, game_key, search_stats
+                )
             
-            white_eval_losses = []
-            black_eval_losses = []
+            # Per-ply inputs for the vectorised scoring: evals from the mover's side, NaN when missing
+            eval_before = np.full(len(moves_data), np.nan)
+            eval_after = np.full(len(moves_data), np.nan)
+            best_eval = np.full(len(moves_data), np.nan)
+            for k, move_data in enumerate(moves_data):
+                if book_flags[k] or evals[k] is None or evals[k + 1] is None:
+                    continue
+                eval_before[k] = evals[k]
+                # Evaluation after the move (from opponent's perspective, so negate)
+                eval_after[k] = -evals[k + 1]
+                # The position eval is the value of the best move; refined plies verify
+                # it by searching the position after the best move, like the played move
+                if best_moves[k] == move_data['move'].uci():
+                    best_eval[k] = eval_after[k]
+                elif best_evals.get(k) is not None:
+                    best_eval[k] = best_evals[k]
+                else:
+                    best_eval[k] = eval_before[k]
+            sides = np.array([m['index'] % 2 for m in moves_data], dtype=np.int64)
+            scores = score_plies(eval_before, eval_after, best_eval, book_flags, sides, n_games=1)
             
             print("\n" + "="*60)
-            print("🚀 STARTING MOVE-BY-MOVE ANALYSIS")
+            print("🚀 MOVE-BY-MOVE CLASSIFICATION")
             print("="*60)
             
-            for move_data in moves_data:
-                try:
-                    i = move_data['index']
-                    move = move_data['move']
-                    san_move = move_data['san']
-                    board_before = move_data['board_before']
-                    
-                    move_number = (i // 2) + 1
-                    color = "White" if i % 2 == 0 else "Black"
-                    
-                    print(f"\n📍 Move {i+1}/{len(moves_data)}: {move_number}.{'.' if i % 2 == 0 else '...'} {san_move} ({color})")
-                    print(f"   🔍 Analyzing position before move...")
-                    
-                    # Get evaluation before the move
-                    eval_before, _ = await self.analyze_position(board_before)
-                    
-                    if eval_before is None:
-                        print(f"   ⚠️  Skipping move - couldn't analyze position")
-                        continue
-                    
-                    print(f"   📈 Position evaluation: {eval_before:+.2f}")
-                    print(f"   🤖 Finding best move...")
-                    
-                    # Get the best move in this position
-                    _, best_move_str = await self.analyze_position(board_before)
-                    
-                    # Create position after the move
-                    board_after = board_before.copy()
-                    board_after.push(move)
-                    
-                    print(f"   🔄 Evaluating after {san_move}...")
-                    
-                    # Get evaluation after the move (from opponent's perspective, so negate)
-                    eval_after_raw, _ = await self.analyze_position(board_after)
-                    eval_after = -eval_after_raw if eval_after_raw is not None else None
-                    
-                    if eval_after is None:
-                        print(f"   ⚠️  Couldn't evaluate position after move")
-                        continue
-                    
-                    best_eval = eval_before
-                    if best_move_str:
-                        try:
-                            best_move = chess.Move.from_uci(best_move_str)
-                            if best_move in board_before.legal_moves:
-                                temp_board = board_before.copy()
-                                temp_board.push(best_move)
-                                best_eval_raw, _ = await self.analyze_position(temp_board)
-                                best_eval = -best_eval_raw if best_eval_raw is not None else eval_before
-                        except:
-                            best_eval = eval_before
-                    
-                    # Check if it's an opening move
-                    is_book = self.is_opening_move(board_before, i // 2 + 1)
-                    
-                    # Classify the move
-                    classification = self.classify_move(eval_before, eval_after, best_eval, is_book)
-                    
-                    # Calculate evaluation loss
-                    eval_loss = abs(best_eval - eval_after) * 100  # In centipawns
-                    
-                    # Determine classification icon and color for logging
-                    classification_icons = {
-                        "best": "✅", "excellent": "💡", "good": "👍", "book": "📚",
-                        "brilliant": "❗", "inaccuracy": "🤔", "mistake": "❌", "blunder": "🫣"
-                    }
-                    
-                    icon = classification_icons.get(classification, "❓")
-                    
-                    print(f"   {icon} Classification: {classification.upper()}")
-                    print(f"   📊 Eval change: {eval_before:+.2f} → {eval_after:+.2f} (Loss: {eval_loss:.1f}cp)")
-                    if best_move_str and best_move_str != move.uci():
-                        print(f"   💡 Best move was: {best_move_str}")
-                    
-                    move_info = {
-                        "moveIndex": i,
-                        "move": move.uci(),
-                        "san": san_move,
-                        "classification": classification,
-                        "evalBefore": round(eval_before, 2),
-                        "evalAfter": round(eval_after, 2),
-                        "evalDrop": round(eval_loss, 1),
-                        "bestMove": best_move_str,
-                        "color": "white" if i % 2 == 0 else "black"
-                    }
-                    
-                    move_classifications.append(move_info)
-                    
-                    # Update statistics
-                    if i % 2 == 0:  # White move
-                        white_stats[classification] += 1
-                        # Only add to eval_losses if NOT a book move (Chess.com method)
-                        if classification != "book" and eval_loss > 0:
-                            white_eval_losses.append(eval_loss)
-                    else:  # Black move
-                        black_stats[classification] += 1
-                        # Only add to eval_losses if NOT a book move (Chess.com method)
-                        if classification != "book" and eval_loss > 0:
-                            black_eval_losses.append(eval_loss)
-                    
-                    # Progress update every 10 moves
-                    if (i + 1) % 10 == 0:
-                        progress = ((i + 1) / len(moves_data)) * 100
-                        print(f"\n📊 PROGRESS UPDATE: {i + 1}/{len(moves_data)} moves analyzed ({progress:.1f}%)")
-                        print(f"   ⚡ White accuracy so far: {white_stats}")
-                        print(f"   ⚫ Black accuracy so far: {black_stats}")
-                        
-                except Exception as e:
-                    print(f"❌ ERROR analyzing move {i+1}: {e}")
-                    continue
-            
-            # Calculate accuracy scores using Chess.com-exact formula
-            def calculate_accuracy(eval_losses: List[float], non_book_moves: int) -> float:
-                if non_book_moves == 0 or not eval_losses:
-                    # Chess.com shows 100% if all moves were book moves
-                    return 100.0
-                
-                # Calculate Average Centipawn Loss (AvgCPL) - Chess.com method
-                # Only count non-book moves in the average
-                avg_cpl = sum(eval_losses) / len(eval_losses)
+            classification_icons = {
+                "best": "✅", "excellent": "💡", "good": "👍", "book": "📚",
+                "brilliant": "❗", "inaccuracy": "🤔", "mistake": "❌", "blunder": "🫣"
+            }
+            move_classifications = []
+            for k, move_data in enumerate(moves_data):
+                i = move_data['index']
+                move = move_data['move']
+                code = scores["codes"][k]
+                color = "white" if i % 2 == 0 else "black"
                 
-                # Chess.com's exact accuracy formula (reverse-engineered)
-                accuracy = 103.0 - 7.0 * math.log(avg_cpl + 1.0)
+                if code == NOT_SCORED:
+                    print(f"   ⚠️  Move {i+1}: {move_data['san']} skipped - couldn't analyze position")
+                    continue
                 
-                # Chess.com clamps to [0, 100] range
-                accuracy = max(0.0, min(100.0, accuracy))
+                classification = CLASSIFICATIONS[code]
+                is_book = code == BOOK
+                eval_loss = 0.0 if is_book else float(scores["loss"][k])
+                print(f"   {classification_icons.get(classification, '❓')} Move {i+1}: {move_data['san']} ({color}) "
+                      f"{classification.upper()}" + ("" if is_book else
+                      f" {eval_before[k]:+.2f} → {eval_after[k]:+.2f} (Loss: {eval_loss:.1f}cp)"))
                 
-                print(f"   📊 Non-book moves: {len(eval_losses)}, Average CPL: {avg_cpl:.1f}, Accuracy: {accuracy:.1f}%")
-                return round(accuracy, 1)
-            
-            # Count non-book moves for each side
-            white_non_book_moves = sum(1 for move in move_classifications if move['color'] == 'white' and move['classification'] != 'book')
-            black_non_book_moves = sum(1 for move in move_classifications if move['color'] == 'black' and move['classification'] != 'book')
-            
-            white_accuracy = calculate_accuracy(white_eval_losses, white_non_book_moves)
-            black_accuracy = calculate_accuracy(black_eval_losses, black_non_book_moves)
+                move_classifications.append({
+                    "moveIndex": i,
+                    "move": move.uci(),
+                    "san": move_data['san'],
+                    "classification": classification,
+                    "evalBefore": None if is_book else round(float(eval_before[k]), 2),
+                    "evalAfter": None if is_book else round(float(eval_after[k]), 2),
+                    "evalDrop": round(eval_loss, 1),
+                    "bestMove": None if is_book else best_moves[k],
+                    "color": color,
+                    "refined": k in refined_plies,
+                    "opening": opening_names[k]
+                })
+            
+            white_stats = {name: int(n) for name, n in zip(CLASSIFICATIONS, scores["counts"][0, 0])}
+            black_stats = {name: int(n) for name, n in zip(CLASSIFICATIONS, scores["counts"][0, 1])}
+            white_accuracy, black_accuracy = (float(a) for a in scores["accuracy"][0])
+            lichess_white, lichess_black = (None if np.isnan(a) else float(a) for a in scores["lichess_accuracy"][0])
             
             print("\n" + "="*60)
             print("🏆 ANALYSIS COMPLETE!")
             print("="*60)
-            print(f"📈 White Accuracy: {white_accuracy}% ({white_non_book_moves} non-book moves)")
-            print(f"📉 Black Accuracy: {black_accuracy}% ({black_non_book_moves} non-book moves)")
-            print("\n📊 WHITE MOVE BREAKDOWN:")
-            for move_type, count in white_stats.items():
-                if count > 0:
-                    icon = {"best": "✅", "excellent": "💡", "good": "👍", "book": "📚", 
-                           "brilliant": "❗", "inaccuracy": "🤔", "mistake": "❌", "blunder": "🫣"}.get(move_type, "❓")
-                    print(f"   {icon} {move_type.capitalize()}: {count}")
-            
-            print("\n📊 BLACK MOVE BREAKDOWN:")
-            for move_type, count in black_stats.items():
-                if count > 0:
-                    icon = {"best": "✅", "excellent": "💡", "good": "👍", "book": "📚", 
-                           "brilliant": "❗", "inaccuracy": "🤔", "mistake": "❌", "blunder": "🫣"}.get(move_type, "❓")
-                    print(f"   {icon} {move_type.capitalize()}: {count}")
+            print(f"📈 White Accuracy: {white_accuracy}% (Lichess-style: {lichess_white}%)")
+            print(f"📉 Black Accuracy: {black_accuracy}% (Lichess-style: {lichess_black}%)")
+            for side_name, stats in (("WHITE", white_stats), ("BLACK", black_stats)):
+                print(f"\n📊 {side_name} MOVE BREAKDOWN:")
+                for move_type, count in stats.items():
+                    if count > 0:
+                        print(f"   {classification_icons.get(move_type, '❓')} {move_type.capitalize()}: {count}")
             
             print(f"\n🎯 Total moves analyzed: {len(move_classifications)}/{len(moves_data)}")
             print(f"✅ Analysis success rate: {(len(move_classifications)/len(moves_data))*100:.1f}%")
@@ -604,17 +745,45 @@ class GameReviewService:
                     "white": white_accuracy,
                     "black": black_accuracy
                 },
+                "lichessAccuracy": {
+                    "white": lichess_white,
+                    "black": lichess_black
+                },
                 "classifications": {
                     "white": white_stats,
                     "black": black_stats
                 },
                 "moves": move_classifications,
-                "totalMoves": len(moves_data)
+                "totalMoves": len(moves_data),
+                "profile": analysis_profile.name,
+                "quality": quality,
+                "searches": search_stats,
+                "opening": opening
             }
+            if variation_moves is not None:
+                result["variations"] = variation_moves
+                result["variationStats"] = variation_stats
+            
+            # Raw per-position results let any later review reaching these positions skip them
+            stored_positions = [
+                {"key": format(position_key(board), "x"), "eval": evals[j],
+                 "best": best_moves[j], "full": j in deep_positions}
+                for j, board in enumerate(positions) if evals[j] is not None
+            ]
+            # Raw per-ply scoring inputs let the review be rescored without the engine
+            plies = pack_plies([m['index'] for m in moves_data], sides, book_flags, eval_before, eval_after,
+                               best_eval, best_moves[:len(moves_data)])
+            if variation_plies is not None:
+                plies["variations"] = variation_plies
+            # Degraded reviews are not stored: a later request with the engines free would be served one
+            if quality == QUALITY_FULL:
+                await self.review_store.save(store_key, analysis_profile.name, pgn_string, result, stored_positions, plies)
             
             print(f"🚀 Returning analysis results to frontend...")
             return result
             
+        except Overloaded:
+            raise
         except Exception as e:
             print(f"💥 CRITICAL ERROR during game analysis: {e}")
             print(f"🔍 Error type: {type(e).__name__}")
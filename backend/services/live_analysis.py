@@ -0,0 +1,160 @@
+"""
+Live analysis over a WebSocket: streams engine updates for the position a board is showing
+"""
+import asyncio
+import logging
+from contextlib import aclosing
+from typing import Optional, Dict, Any
+import chess
+import chess.engine
+from fastapi import WebSocket, WebSocketDisconnect
+from services.analysis_profiles import AnalysisProfile, get_analysis_profile
+from services.engine_pool import EngineSession
+from services.enhanced_analysis_service import get_analysis_service
+from services.admission import QUALITY_FULL, QUALITY_DEGRADED
+
+logger = logging.getLogger(__name__)
+
+MAX_LIVE_MULTIPV = 5
+
+
+class LiveAnalysisSession:
+    """
+    One connected board. Every position the client sends replaces the previous one:
+    the running search is stopped (UCI `stop`) and the new one starts on the same
+    engine session, so the client only ever waits for the position it is looking at.
+
+    Client messages:
+        {"fen": "...", "multi_pv": 3, "profile": "deep", "depth": 20}   analyse a position
+        {"type": "stop"}                                                stop and free the engine
+
+    Server messages (evaluations use the Lichess cloud-eval format, White's perspective):
+        {"type": "eval", "source": "cache" | "tablebase", "fen", "evaluation"}      answered without a search
+        {"type": "info", "fen", "depth", "nodes", "nps", "quality", "evaluation"}  iterative-deepening update
+        {"type": "done", "source": "stockfish", "fen", "quality", "evaluation"}    search finished
+        {"type": "error", "fen", "detail", "retry_after"}                          ("retry_after" when shed under load)
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.service = get_analysis_service()
+        self.session: Optional[EngineSession] = None
+        self.search: Optional[asyncio.Task] = None
+        self.game = object()  # the client's positions share one hash-table lineage
+
+    async def run(self):
+        """Serve the connection until the client disconnects"""
+        try:
+            while True:
+                try:
+                    message = await self.websocket.receive_json()
+                except ValueError:
+                    await self.send({"type": "error", "detail": "Messages must be JSON objects"})
+                    continue
+                if not isinstance(message, dict):
+                    await self.send({"type": "error", "detail": "Messages must be JSON objects"})
+                elif message.get("type") == "stop":
+                    await self.stop()
+                    await self.release()
+                else:
+                    await self.start(message)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            await self.stop()
+            await self.release()
+
+    async def start(self, message: Dict[str, Any]):
+        """Switch to a new position: stop the current search, answer from cache if possible, search otherwise"""
+        await self.stop()
+        fen = message.get("fen")
+        try:
+            board = chess.Board(fen)
+            if not board.is_valid():
+                raise ValueError("Invalid FEN string")
+            profile = get_analysis_profile(message.get("profile")).with_depth(message.get("depth"))
+            multi_pv = max(1, min(int(message.get("multi_pv", 1)), MAX_LIVE_MULTIPV))
+        except (TypeError, ValueError) as e:
+            await self.send({"type": "error", "fen": fen, "detail": str(e)})
+            return
+
+        cached = self.service._get_from_cache(fen, multi_pv)
+        if cached:
+            await self.send({"type": "eval", "source": "cache", "fen": fen, "evaluation": cached})
+            if (cached.get("depth") or 0) >= (profile.depth or 0):
+                return
+
+        if self.service.tablebase.enabled:
+            tablebase_result = self.service._probe_tablebase(fen)
+            if tablebase_result:
+                await self.send({"type": "eval", "source": "tablebase", "fen": fen, "evaluation": tablebase_result})
+                return
+
+        quality = self.service.admission.quality("interactive")
+        if quality not in (QUALITY_FULL, QUALITY_DEGRADED):
+            shed = self.service.admission.reject("interactive")
+            await self.send({"type": "error", "fen": fen, "detail": shed.detail, "retry_after": shed.retry_after})
+            return
+        if quality == QUALITY_DEGRADED:
+            profile = profile.degraded()
+
+        if board.is_game_over():
+            await self.send({"type": "done", "source": "none", "fen": fen, "evaluation": {"fen": fen, "pvs": []}})
+            return
+
+        self.search = asyncio.create_task(self._search(board, fen, profile, multi_pv, quality))
+
+    async def _search(self, board: chess.Board, fen: str, profile: AnalysisProfile, multi_pv: int, quality: str):
+        if self.session is not None and self.session.profile != profile:
+            await self.release()
+        if self.session is None:
+            self.session = self.service.engine_pool.session(profile, game=self.game, priority="interactive")
+
+        latest: Dict[int, chess.engine.InfoDict] = {}
+        evaluation = None
+        try:
+            async with aclosing(self.session.stream(board, profile, multi_pv)) as lines:
+                async for info in lines:
+                    # Aspiration-window fail highs/lows are not real scores
+                    if "score" not in info or not info.get("pv") or info.get("lowerbound") or info.get("upperbound"):
+                        continue
+                    latest[info.get("multipv", 1)] = info
+                    evaluation = self.service._format_engine_lines(fen, [latest[k] for k in sorted(latest)])
+                    await self.send({
+                        "type": "info",
+                        "fen": fen,
+                        "depth": info.get("depth"),
+                        "nodes": info.get("nodes"),
+                        "nps": info.get("nps"),
+                        "quality": quality,
+                        "evaluation": evaluation,
+                    })
+        except (RuntimeError, chess.engine.EngineError) as e:
+            logger.error(f"Live analysis failed for {fen}: {e}")
+            await self.send({"type": "error", "fen": fen, "detail": f"Analysis failed: {e}"})
+            return
+
+        if evaluation and quality == QUALITY_FULL:
+            self.service._save_to_cache(fen, evaluation)
+        await self.send({"type": "done", "source": "stockfish", "fen": fen, "quality": quality, "evaluation": evaluation})
+        # Idle boards don't hold an engine; the next position checks one out again
+        await self.release()
+
+    async def stop(self):
+        """Stop the running search (the engine stays checked out for the next position)"""
+        if self.search is not None and not self.search.done():
+            self.search.cancel()
+            await asyncio.gather(self.search, return_exceptions=True)
+        self.search = None
+
+    async def release(self):
+        if self.session is not None:
+            session, self.session = self.session, None
+            await session.release()
+
+    async def send(self, message: Dict[str, Any]):
+        try:
+            await self.websocket.send_json(message)
+        except (WebSocketDisconnect, RuntimeError):
+            # Client already gone; `run` notices on its next receive
+            pass
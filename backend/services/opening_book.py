@@ -0,0 +1,158 @@
+"""
+Opening book index: Polyglot book (memory-mapped) + ECO opening names, loaded once per process
+"""
+import os
+import csv
+import logging
+from typing import Optional, Dict, Tuple, List, Set
+import chess
+import chess.polyglot
+from config import OPENING_BOOK_PATH, OPENING_NAMES_PATH
+
+logger = logging.getLogger(__name__)
+
+# Built-in main lines, used when no ECO table is configured (ECO, name, SAN moves)
+BUILTIN_OPENINGS: List[Tuple[str, str, str]] = [
+    ("C20", "King's Pawn Game", "e4"),
+    ("C20", "King's Pawn Game", "e4 e5"),
+    ("C40", "King's Knight Opening", "e4 e5 Nf3"),
+    ("C44", "King's Knight Opening: Normal Variation", "e4 e5 Nf3 Nc6"),
+    ("C50", "Italian Game", "e4 e5 Nf3 Nc6 Bc4"),
+    ("C60", "Ruy Lopez", "e4 e5 Nf3 Nc6 Bb5"),
+    ("B20", "Sicilian Defense", "e4 c5"),
+    ("B27", "Sicilian Defense", "e4 c5 Nf3"),
+    ("B50", "Sicilian Defense", "e4 c5 Nf3 d6"),
+    ("B50", "Sicilian Defense", "e4 c5 Nf3 d6 Nc3"),
+    ("B50", "Sicilian Defense", "e4 c5 Nf3 d6 Nc3 Nf6"),
+    ("B50", "Sicilian Defense", "e4 c5 Nf3 d6 Nc3 Nf6 d4"),
+    ("C00", "French Defense", "e4 e6"),
+    ("B10", "Caro-Kann Defense", "e4 c6"),
+    ("A40", "Queen's Pawn Game", "d4"),
+    ("D00", "Queen's Pawn Game", "d4 d5"),
+    ("D06", "Queen's Gambit", "d4 d5 c4"),
+    ("A45", "Indian Defense", "d4 Nf6"),
+    ("A80", "Dutch Defense", "d4 f5"),
+    ("A04", "Zukertort Opening", "Nf3"),
+    ("A06", "Zukertort Opening", "Nf3 d5"),
+    ("A05", "Zukertort Opening", "Nf3 Nf6"),
+    ("A05", "King's Indian Attack", "Nf3 Nf6 g3"),
+    ("A10", "English Opening", "c4"),
+    ("A20", "English Opening: King's English Variation", "c4 e5"),
+    ("A30", "English Opening: Symmetrical Variation", "c4 c5"),
+]
+
+
+class OpeningBook:
+    """
+    Position index for opening detection.
+
+    - `book_path`: Polyglot `.bin` book. python-chess memory-maps the file, so
+      lookups are a binary search over the mapped entries, not a load.
+    - `names_path`: ECO table(s) in the lichess chess-openings TSV format
+      (`eco<TAB>name<TAB>pgn`), a single file or a directory of `*.tsv` files.
+
+    Positions are keyed by Zobrist hash, so transpositions map to the same entry.
+    """
+
+    def __init__(self, book_path: Optional[str] = None, names_path: Optional[str] = None):
+        self.reader = self._open_polyglot(book_path)
+        self.names: Dict[int, Tuple[str, str]] = {}
+        self.positions: Set[int] = set()  # every position along a named line counts as book
+        self._load_lines(BUILTIN_OPENINGS)
+        self.names_loaded = self._load_names(names_path)
+
+    @property
+    def has_index(self) -> bool:
+        """True when a real book or ECO table is configured (not just the built-in lines)"""
+        return self.reader is not None or self.names_loaded
+
+    def _open_polyglot(self, path: Optional[str]):
+        if not path:
+            return None
+        try:
+            reader = chess.polyglot.open_reader(path)
+            logger.info(f"Opening book loaded: {path}")
+            return reader
+        except Exception as e:
+            logger.warning(f"Could not open Polyglot book {path}: {e}")
+            return None
+
+    def _load_lines(self, lines) -> int:
+        """Index every line's positions and name its final one; returns the number of lines indexed"""
+        count = 0
+        for eco, name, moves in lines:
+            board = chess.Board()
+            line_positions = []
+            try:
+                for token in moves.split():
+                    # Skip move numbers ("1." / "1...") and results
+                    if token[0].isdigit() or token in ("*", "1-0", "0-1", "1/2-1/2"):
+                        continue
+                    board.push_san(token)
+                    line_positions.append(chess.polyglot.zobrist_hash(board))
+            except ValueError as e:
+                logger.debug(f"Skipping opening line {eco} {name}: {e}")
+                continue
+            if not line_positions:
+                continue
+            self.positions.update(line_positions)
+            self.names[line_positions[-1]] = (eco, name)
+            count += 1
+        return count
+
+    def _load_names(self, path: Optional[str]) -> bool:
+        if not path:
+            return False
+        files = [path]
+        if os.path.isdir(path):
+            files = sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(".tsv"))
+        count = 0
+        for file_path in files:
+            try:
+                with open(file_path, newline="", encoding="utf-8") as f:
+                    rows = csv.DictReader(f, delimiter="\t")
+                    count += self._load_lines((row["eco"], row["name"], row["pgn"]) for row in rows)
+            except Exception as e:
+                logger.warning(f"Could not load opening names from {file_path}: {e}")
+        logger.info(f"Indexed {count} named opening positions from {path}")
+        return count > 0
+
+    def opening_name(self, board: chess.Board) -> Optional[Dict[str, str]]:
+        """ECO code and name of the position, if it is a named opening position"""
+        entry = self.names.get(chess.polyglot.zobrist_hash(board))
+        if entry:
+            return {"eco": entry[0], "name": entry[1]}
+        return None
+
+    def is_book_move(self, board: chess.Board, move: chess.Move) -> bool:
+        """
+        A move is book if the Polyglot book lists it for this position, or if it
+        reaches a position on one of the indexed opening lines.
+        """
+        if self.reader is not None:
+            try:
+                if any(entry.move == move for entry in self.reader.find_all(board)):
+                    return True
+            except Exception as e:
+                logger.debug(f"Polyglot lookup failed: {e}")
+        board.push(move)
+        try:
+            return chess.polyglot.zobrist_hash(board) in self.positions
+        finally:
+            board.pop()
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+
+# Global instance - lazy initialization
+opening_book = None
+
+def get_opening_book():
+    """Get or create the opening book instance"""
+    global opening_book
+    if opening_book is None:
+        opening_book = OpeningBook(OPENING_BOOK_PATH, OPENING_NAMES_PATH)
+    return opening_book
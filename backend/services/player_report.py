@@ -0,0 +1,258 @@
+"""
+Player reports: a batch of one player's games reviewed together, with aggregate statistics
+"""
+import io
+import os
+import asyncio
+import logging
+import statistics
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import chess.pgn
+from config import PLAYER_ARCHIVE_DIR, PLAYER_REPORT_MAX_GAMES
+from services.game_review_service import get_game_review_service
+from services.engine_pool import get_engine_pool
+from services.review_scoring import CLASSIFICATIONS
+from services.archive_ingestion import iter_archive_games
+from utils.chess_utils import moves_hash
+
+logger = logging.getLogger(__name__)
+
+# Moves listed under "worstMoments"
+WORST_MOMENTS = 10
+SCORES = {"1-0": (1.0, 0.0), "0-1": (0.0, 1.0), "1/2-1/2": (0.5, 0.5)}
+
+
+@dataclass
+class ReportGame:
+    """One game of the report, parsed once up front"""
+    id: int
+    pgn: str
+    key: str  # moves_hash: the same game imported twice is reviewed once
+    color: str
+    headers: Dict[str, str]
+
+    @property
+    def score(self) -> Optional[float]:
+        """Points the player scored (1, 0.5, 0), None for unfinished games"""
+        scores = SCORES.get(self.headers.get("Result", "*"))
+        return None if scores is None else scores[0 if self.color == "white" else 1]
+
+    def summary(self) -> Dict[str, Any]:
+        opponent = self.headers.get("Black" if self.color == "white" else "White", "?")
+        return {
+            "id": self.id,
+            "color": self.color,
+            "opponent": opponent,
+            "result": self.headers.get("Result", "*"),
+            "date": self.headers.get("Date") or self.headers.get("UTCDate"),
+            "url": self.headers.get("Link") or self.headers.get("Site"),
+        }
+
+
+def read_archive(name: str) -> Iterator[str]:
+    """
+    PGNs of a local archive in PLAYER_ARCHIVE_DIR, read one game at a time: a PGN file or a
+    Chess.com monthly archive as returned by the public API ({"games": [{"pgn": ...}]}),
+    such as the ones the archive ingestion service keeps under chesscom/<user>/.
+    """
+    root = os.path.realpath(PLAYER_ARCHIVE_DIR)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"Archive must be inside {PLAYER_ARCHIVE_DIR}")
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Archive not found: {name}")
+    if path.endswith(".json"):
+        for game in iter_archive_games(path):
+            if game.get("pgn"):
+                yield game["pgn"]
+        return
+    with open(path, encoding="utf-8", errors="replace") as f:
+        while True:
+            game = chess.pgn.read_game(f)
+            if game is None:
+                return
+            yield str(game)
+
+
+def _played_at(game: ReportGame) -> Tuple[str, str]:
+    """Sort key by date and time played; unknown parts ("????.??.??") sort first"""
+    date = game.headers.get("UTCDate") or game.headers.get("Date") or ""
+    time = game.headers.get("UTCTime") or game.headers.get("Time") or ""
+    return ("" if "?" in date else date), ("" if "?" in time else time)
+
+
+def prepare_games(player: str, pgns: List[str],
+                  limit: Optional[int] = None) -> Tuple[List[ReportGame], Dict[str, int]]:
+    """
+    Parse the player's games, dropping duplicates (same moves), games the player
+    didn't play and unreadable PGNs. Beyond `limit` games only the most recent are
+    kept (by date played; games without one count as older, input order breaks ties).
+    Returns the games, in input order, and the counts dropped.
+    """
+    name = player.strip().lower()
+    games: List[ReportGame] = []
+    seen = set()
+    dropped = {"duplicates": 0, "notPlayed": 0, "invalid": 0, "overLimit": 0}
+    for i, pgn in enumerate(pgns):
+        game = chess.pgn.read_game(io.StringIO(pgn))
+        moves = list(game.mainline_moves()) if game else []
+        if not moves or game.errors:
+            dropped["invalid"] += 1
+            continue
+        headers = dict(game.headers)
+        if headers.get("White", "").lower() == name:
+            color = "white"
+        elif headers.get("Black", "").lower() == name:
+            color = "black"
+        else:
+            dropped["notPlayed"] += 1
+            continue
+        key = moves_hash(game.board(), moves)
+        if key in seen:
+            dropped["duplicates"] += 1
+            continue
+        seen.add(key)
+        games.append(ReportGame(i, pgn, key, color, headers))
+    if limit is not None and len(games) > limit:
+        dropped["overLimit"] = len(games) - limit
+        recent = sorted(games, key=_played_at)[-limit:]
+        games = sorted(recent, key=lambda game: game.id)
+    return games, dropped
+
+
+def _mean(values: List[float]) -> Optional[float]:
+    return round(statistics.fmean(values), 1) if values else None
+
+
+def aggregate(player: str, reviewed: List[Tuple[ReportGame, Dict[str, Any]]]) -> Dict[str, Any]:
+    """Report over the reviewed games, from the player's side only"""
+    accuracy = {"white": [], "black": []}
+    lichess_accuracy = []
+    counts = dict.fromkeys(CLASSIFICATIONS, 0)
+    results = {"wins": 0, "draws": 0, "losses": 0}
+    openings: Dict[str, Dict[str, Any]] = defaultdict(lambda: {"games": 0, "points": 0.0, "scored": 0, "accuracy": []})
+    moments = []
+
+    for game, review in reviewed:
+        side = game.color
+        game_accuracy = review["accuracy"][side]
+        accuracy[side].append(game_accuracy)
+        if review.get("lichessAccuracy", {}).get(side) is not None:
+            lichess_accuracy.append(review["lichessAccuracy"][side])
+        for name, n in review["classifications"][side].items():
+            counts[name] = counts.get(name, 0) + n
+
+        score = game.score
+        if score is not None:
+            results["wins" if score == 1 else "draws" if score == 0.5 else "losses"] += 1
+
+        opening = review.get("opening") or {}
+        entry = openings[opening.get("name", "Unknown")]
+        entry["eco"] = opening.get("eco")
+        entry["games"] += 1
+        entry["accuracy"].append(game_accuracy)
+        if score is not None:
+            entry["points"] += score
+            entry["scored"] += 1
+
+        for move in review["moves"]:
+            if move["color"] == side and move["classification"] in ("mistake", "blunder"):
+                moments.append({
+                    **game.summary(),
+                    "moveNumber": move["moveIndex"] // 2 + 1,
+                    "san": move["san"],
+                    "classification": move["classification"],
+                    "evalBefore": move["evalBefore"],
+                    "evalAfter": move["evalAfter"],
+                    "evalDrop": move["evalDrop"],
+                    "bestMove": move["bestMove"],
+                })
+
+    scored_moves = sum(counts.values())
+    all_accuracy = accuracy["white"] + accuracy["black"]
+    return {
+        "player": player,
+        "games": len(reviewed),
+        "results": results,
+        "accuracy": {
+            "average": _mean(all_accuracy),
+            "median": round(statistics.median(all_accuracy), 1) if all_accuracy else None,
+            "white": _mean(accuracy["white"]),
+            "black": _mean(accuracy["black"]),
+            "lichess": _mean(lichess_accuracy),
+        },
+        "classifications": {
+            name: {"count": n, "percent": round(100 * n / scored_moves, 1) if scored_moves else 0.0}
+            for name, n in counts.items()
+        },
+        "openings": sorted(
+            (
+                {
+                    "name": name,
+                    "eco": entry["eco"],
+                    "games": entry["games"],
+                    "score": round(100 * entry["points"] / entry["scored"], 1) if entry["scored"] else None,
+                    "accuracy": _mean(entry["accuracy"]),
+                }
+                for name, entry in openings.items()
+            ),
+            key=lambda o: -o["games"],
+        ),
+        "worstMoments": sorted(moments, key=lambda m: -m["evalDrop"])[:WORST_MOMENTS],
+    }
+
+
+async def player_report_events(player: str, pgns: List[str],
+                               profile: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Review a player's games and yield progress events, then the report:
+
+    - {"type": "start", "games": n, "dropped": {...}}; at most PLAYER_REPORT_MAX_GAMES games,
+      the most recent ones (the rest are counted as "overLimit")
+    - {"type": "progress", "done": i, "total": n, "game": {...}} after each game (in completion order)
+    - {"type": "report", ...} with the aggregate statistics (see aggregate)
+
+    Games are reviewed concurrently, one per pooled engine. They share the review
+    service's position cache and running searches, so positions common to several
+    games (the openings, mostly) are searched once; stored reviews are reused.
+    """
+    # Parsing a few hundred PGNs takes a while: keep it off the event loop
+    games, dropped = await asyncio.get_running_loop().run_in_executor(
+        None, prepare_games, player, pgns, PLAYER_REPORT_MAX_GAMES
+    )
+    yield {"type": "start", "player": player, "games": len(games), "dropped": dropped}
+
+    service = get_game_review_service()
+    slots = asyncio.Semaphore(get_engine_pool().size)
+
+    async def review(game: ReportGame):
+        async with slots:
+            try:
+                return game, await service.analyze_game(game.pgn, profile), None
+            except Exception as e:  # Overloaded included: the report goes on without this game
+                return game, None, str(getattr(e, "detail", e))
+
+    tasks = [asyncio.ensure_future(review(game)) for game in games]
+    reviewed: List[Tuple[ReportGame, Dict[str, Any]]] = []
+    failed = []
+    try:
+        for done, task in enumerate(asyncio.as_completed(tasks), 1):
+            game, result, error = await task
+            summary = game.summary()
+            if error is None:
+                reviewed.append((game, result))
+                summary["accuracy"] = result["accuracy"][game.color]
+            else:
+                logger.warning(f"Player report: game {game.id} failed: {error}")
+                failed.append({**summary, "error": error})
+                summary["error"] = error
+            yield {"type": "progress", "done": done, "total": len(games), "game": summary}
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    reviewed.sort(key=lambda r: r[0].id)
+    yield {"type": "report", **aggregate(player, reviewed), "failed": failed}
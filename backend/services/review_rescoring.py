@@ -0,0 +1,123 @@
+"""
+Rescoring of stored reviews from their raw per-ply inputs, without the engine.
+
+A review stores the evals and best moves it was scored from (review_scoring.pack_plies),
+so after a change to the classification thresholds or accuracy formulas every stored
+review can be brought up to date with a pure CPU pass: batches of reviews are read
+from the review store, scored in chunks on a process pool (all cores by default) and
+written back with one bulk update per batch.
+"""
+import os
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from services.review_scoring import score_packed, CLASSIFICATIONS
+from services.review_store import get_review_store
+
+logger = logging.getLogger(__name__)
+
+# Reviews per database round trip, and per task sent to a worker process
+BATCH_SIZE = 1000
+CHUNK_SIZE = 200
+
+
+def _classify(moves: List[Dict[str, Any]], id_field: str, plies: Dict[str, Any],
+              scores: Dict[str, Any], g: int) -> bool:
+    lo = scores["bounds"][g]
+    ply_of = {move_id: lo + k for k, move_id in enumerate(plies["moveIndex"])}
+    changed = False
+    for move in moves:
+        k = ply_of.get(move[id_field])
+        if k is None or scores["codes"][k] < 0:
+            continue
+        classification = CLASSIFICATIONS[scores["codes"][k]]
+        changed = changed or classification != move["classification"]
+        move["classification"] = classification
+        move["evalDrop"] = 0.0 if classification == "book" else round(float(scores["loss"][k]), 1)
+    return changed
+
+
+def apply_scores(review: Dict[str, Any], plies: Dict[str, Any], scores: Dict[str, Any], g: int,
+                 variations: Optional[int] = None) -> bool:
+    """
+    Update review g of a score_packed result in place: move classifications and losses,
+    accuracies and classification counts. `variations` is the index in the same result
+    of the review's variation plies (plies["variations"]), whose moves are reclassified
+    too. Returns whether any move changed classification.
+    """
+    changed = _classify(review.get("moves", []), "moveIndex", plies, scores, g)
+    if variations is not None:
+        changed = _classify(review.get("variations", []), "id", plies["variations"], scores, variations) or changed
+
+    white, black = (float(a) for a in scores["accuracy"][g])
+    review["accuracy"] = {"white": white, "black": black}
+    lichess_white, lichess_black = (None if np.isnan(a) else float(a) for a in scores["lichess_accuracy"][g])
+    review["lichessAccuracy"] = {"white": lichess_white, "black": lichess_black}
+    review["classifications"] = {
+        side: {name: int(n) for name, n in zip(CLASSIFICATIONS, scores["counts"][g, s])}
+        for s, side in enumerate(("white", "black"))
+    }
+    return changed
+
+
+def score_chunk(chunk: List[Tuple[int, Dict[str, Any], Dict[str, Any]]]):
+    """
+    score_packed over a chunk of (id, review, plies), variation plies included: they are
+    scored as extra games after the reviews. Returns the scores and, per review, the index
+    of its variation plies (None without variations).
+    """
+    inputs = [plies for _, _, plies in chunk]
+    variations: List[Optional[int]] = []
+    for _, _, plies in chunk:
+        if plies.get("variations"):
+            variations.append(len(inputs))
+            inputs.append(plies["variations"])
+        else:
+            variations.append(None)
+    return score_packed(inputs), variations
+
+
+def rescore_reviews(profile: Optional[str] = None, workers: Optional[int] = None,
+                    dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Rescore every stored review that has per-ply inputs (optionally only one profile's).
+    Returns counts of reviews rescored and changed, and the time taken.
+    """
+    store = get_review_store()
+    if not store.enabled:
+        raise RuntimeError("Review store unavailable")
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    rescored = changed = 0
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for batch in store.iter_scoring_inputs(profile, BATCH_SIZE):
+            chunks = [batch[i:i + CHUNK_SIZE] for i in range(0, len(batch), CHUNK_SIZE)]
+            results = pool.map(score_chunk, chunks) if pool else map(score_chunk, chunks)
+            updates: List[Dict[str, Any]] = []
+            for chunk, (scores, variations) in zip(chunks, results):
+                for g, (review_id, review, plies) in enumerate(chunk):
+                    changed += apply_scores(review, plies, scores, g, variations[g])
+                    updates.append({
+                        "id": review_id,
+                        "review": review,
+                        "white_accuracy": review["accuracy"]["white"],
+                        "black_accuracy": review["accuracy"]["black"],
+                    })
+            if not dry_run:
+                store.update_scores(updates)
+            rescored += len(updates)
+            logger.info(f"Rescored {rescored} reviews")
+    finally:
+        if pool:
+            pool.shutdown()
+    elapsed = time.perf_counter() - start
+    return {
+        "rescored": rescored,
+        "changed": changed,
+        "workers": workers,
+        "seconds": round(elapsed, 2),
+        "dryRun": dry_run,
+    }
@@ -0,0 +1,197 @@
+"""
+Review scoring on NumPy arrays: move classification and accuracy for one or many games at once.
+
+Every function works on flat per-ply arrays, so rescoring thousands of games after a
+threshold or formula change is a handful of vector operations instead of a Python loop
+per move. Evals are in pawns from the moving side's perspective, on the utils.score
+review scale (mates above every centipawn score); missing evals are NaN.
+"""
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence
+from utils.score import WIN_PERCENT_SLOPE
+
+# Classification codes are indexes into this tuple
+CLASSIFICATIONS = ("book", "brilliant", "best", "excellent", "good", "inaccuracy", "mistake", "blunder")
+BOOK, BRILLIANT, BEST = 0, 1, 2
+NOT_SCORED = -1  # eval missing on either side of the move
+
+# Chess.com thresholds (community verified): upper centipawn loss of best, excellent,
+# good, inaccuracy and mistake; anything above the last one is a blunder
+LOSS_THRESHOLDS = np.array([15, 25, 50, 100, 200])
+# A sacrifice (eval drops by more than this) that is still best is brilliant
+BRILLIANT_SACRIFICE_CP = 100
+
+# Lichess per-move accuracy curve (lila AccuracyPercent); the win% model is in utils.score
+MOVE_ACCURACY_A, MOVE_ACCURACY_K, MOVE_ACCURACY_B = 103.1668100711649, 0.04354415386753951, -3.166924740191411
+VOLATILITY_WEIGHT_RANGE = (0.5, 12.0)
+
+# Layout of the raw per-ply inputs stored with each review (see pack_plies)
+PLIES_VERSION = 1
+
+
+def centipawn_loss(eval_after: np.ndarray, best_eval: np.ndarray) -> np.ndarray:
+    return np.abs(best_eval - eval_after) * 100
+
+
+def classify_moves(eval_before: np.ndarray, eval_after: np.ndarray, best_eval: np.ndarray,
+                   is_book: Optional[np.ndarray] = None) -> np.ndarray:
+    """Classification code per ply (see CLASSIFICATIONS); NOT_SCORED where an eval is missing"""
+    eval_before, eval_after, best_eval = (np.asarray(a, dtype=float) for a in (eval_before, eval_after, best_eval))
+    loss = centipawn_loss(eval_after, best_eval)
+    codes = (BEST + np.searchsorted(LOSS_THRESHOLDS, loss, side="left")).astype(np.int8)
+    sacrifice = (eval_after - eval_before) * 100 < -BRILLIANT_SACRIFICE_CP
+    codes[sacrifice & (loss <= LOSS_THRESHOLDS[0])] = BRILLIANT
+    codes[np.isnan(eval_before) | np.isnan(eval_after) | np.isnan(best_eval)] = NOT_SCORED
+    if is_book is not None:
+        codes[np.asarray(is_book, dtype=bool)] = BOOK
+    return codes
+
+
+def chesscom_accuracy(loss: np.ndarray, codes: np.ndarray, groups: np.ndarray, n_groups: int) -> np.ndarray:
+    """
+    Accuracy per group (game * 2 + side): 103 - 7 * ln(average centipawn loss + 1), clamped
+    to [0, 100]. Only scored, non-book moves with a loss count; a group without any is 100.
+    """
+    counted = (codes > BOOK) & (loss > 0)
+    totals = np.bincount(groups[counted], weights=loss[counted], minlength=n_groups)
+    moves = np.bincount(groups[counted], minlength=n_groups)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        accuracy = 103.0 - 7.0 * np.log(totals / moves + 1.0)
+    accuracy = np.where(moves > 0, np.clip(accuracy, 0.0, 100.0), 100.0)
+    return np.round(accuracy, 1)
+
+
+def win_percent(pawns: np.ndarray) -> np.ndarray:
+    """Winning chances (0-100) for an eval in pawns"""
+    return 50 + 50 * (2 / (1 + np.exp(-WIN_PERCENT_SLOPE * np.asarray(pawns, dtype=float) * 100)) - 1)
+
+
+def move_accuracy(win_before: np.ndarray, win_after: np.ndarray) -> np.ndarray:
+    """Lichess per-move accuracy from the mover's win% before and after the move"""
+    drop = np.maximum(win_before - win_after, 0.0)
+    raw = MOVE_ACCURACY_A * np.exp(-MOVE_ACCURACY_K * drop) + MOVE_ACCURACY_B + 1  # +1 uncertainty bonus
+    return np.clip(raw, 0.0, 100.0)
+
+
+def lichess_accuracy(eval_before: np.ndarray, eval_after: np.ndarray, side: np.ndarray) -> np.ndarray:
+    """
+    Lichess game accuracy of one game for [white, black]: the mean of the volatility-weighted
+    and the harmonic mean of per-move accuracies. Weights are the standard deviation of White's
+    win% over a sliding window, so moves in sharp phases count more. NaN for a side without moves.
+    """
+    white_pov = np.where(side == 0, 1.0, -1.0)
+    win_before = win_percent(eval_before)
+    win_after = win_percent(eval_after)
+    accuracies = move_accuracy(win_before, win_after)
+
+    # White's win% after every position: the start of the first move, then after each move
+    white_win = win_percent(np.concatenate([eval_before[:1] * white_pov[:1], eval_after * white_pov]))
+    window = int(np.clip(len(white_win) // 10, 2, 8))
+    if len(white_win) >= window:
+        windows = np.lib.stride_tricks.sliding_window_view(white_win, window)
+        deviation = np.concatenate([np.repeat(windows[:1].std(axis=1), window - 2), windows.std(axis=1)])
+    else:
+        deviation = np.repeat(white_win.std(), len(accuracies))
+    weights = np.clip(deviation[:len(accuracies)], *VOLATILITY_WEIGHT_RANGE)
+
+    result = np.full(2, np.nan)
+    for s in (0, 1):
+        mine = side == s
+        if not mine.any():
+            continue
+        weighted = np.average(accuracies[mine], weights=weights[mine])
+        with np.errstate(divide="ignore"):
+            harmonic = mine.sum() / np.sum(1.0 / accuracies[mine])
+        result[s] = round((weighted + harmonic) / 2, 1)
+    return result
+
+
+def score_plies(eval_before, eval_after, best_eval, is_book, side, game=None,
+                n_games: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Score the plies of one or many games in one pass.
+
+    All inputs are flat per-ply arrays; `side` is 0 for White moves and 1 for Black,
+    `game` (default: all zeros) the game each ply belongs to, in ascending order.
+    Returns per ply "codes" and "loss" (centipawns), and per game and side ([game, side])
+    "accuracy" (Chess.com formula), "lichess_accuracy" and "counts" ([game, side, class]).
+    """
+    eval_before, eval_after, best_eval = (np.asarray(a, dtype=float) for a in (eval_before, eval_after, best_eval))
+    is_book = np.asarray(is_book, dtype=bool)
+    side = np.asarray(side, dtype=np.int64)
+    game = np.zeros(len(side), dtype=np.int64) if game is None else np.asarray(game, dtype=np.int64)
+    if n_games is None:
+        n_games = int(game.max()) + 1 if len(game) else 0
+
+    codes = classify_moves(eval_before, eval_after, best_eval, is_book)
+    loss = np.nan_to_num(centipawn_loss(eval_after, best_eval))
+    groups = game * 2 + side
+    scored = codes != NOT_SCORED
+    counts = np.bincount(groups[scored] * len(CLASSIFICATIONS) + codes[scored],
+                         minlength=n_games * 2 * len(CLASSIFICATIONS)).reshape(n_games, 2, len(CLASSIFICATIONS))
+
+    # Lichess accuracy needs each game's move sequence (for the volatility windows)
+    lichess = np.full((n_games, 2), np.nan)
+    engine_scored = scored & (codes != BOOK)
+    bounds = np.searchsorted(game, np.arange(n_games + 1))
+    for g in range(n_games):
+        plies = np.arange(bounds[g], bounds[g + 1])
+        plies = plies[engine_scored[plies]]
+        if len(plies):
+            lichess[g] = lichess_accuracy(eval_before[plies], eval_after[plies], side[plies])
+
+    return {
+        "codes": codes,
+        "loss": loss,
+        "accuracy": chesscom_accuracy(loss, codes, groups, n_games * 2).reshape(n_games, 2),
+        "lichess_accuracy": lichess,
+        "counts": counts,
+    }
+
+
+def pack_plies(move_index: Sequence[int], side, is_book, eval_before, eval_after, best_eval,
+               best_moves: Sequence[Optional[str]]) -> Dict[str, Any]:
+    """
+    JSON-ready per-ply scoring inputs of one review, one list per field (NaN stored as None).
+    Stored with the review, so a threshold or formula change can rescore it without the engine.
+    Reviews with variations also store the variation moves' inputs under "variations",
+    packed the same way with the move ids as `move_index`.
+    """
+    def floats(values):
+        return [None if np.isnan(v) else round(float(v), 2) for v in np.asarray(values, dtype=float)]
+
+    return {
+        "version": PLIES_VERSION,
+        "moveIndex": [int(i) for i in move_index],
+        "side": [int(s) for s in side],
+        "book": [bool(b) for b in is_book],
+        "evalBefore": floats(eval_before),
+        "evalAfter": floats(eval_after),
+        "bestEval": floats(best_eval),
+        "bestMove": list(best_moves),
+    }
+
+
+def score_packed(plies_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    score_plies over many stored reviews (pack_plies output) at once. The result also
+    holds "bounds": the plies of review g are codes[bounds[g]:bounds[g + 1]].
+    """
+    for plies in plies_list:
+        if plies.get("version") != PLIES_VERSION:
+            raise ValueError(f"Unsupported ply layout version {plies.get('version')}")
+    lengths = np.array([len(p["side"]) for p in plies_list], dtype=np.int64)
+
+    def column(name, dtype):
+        values = [v for p in plies_list for v in p[name]]
+        if dtype is float:
+            return np.array([np.nan if v is None else v for v in values], dtype=float)
+        return np.array(values, dtype=dtype)
+
+    scores = score_plies(
+        column("evalBefore", float), column("evalAfter", float), column("bestEval", float),
+        column("book", bool), column("side", np.int64),
+        np.repeat(np.arange(len(plies_list)), lengths), n_games=len(plies_list),
+    )
+    scores["bounds"] = np.concatenate([[0], np.cumsum(lengths)])
+    return scores
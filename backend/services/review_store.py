@@ -0,0 +1,199 @@
+"""
+Store of completed game reviews, so repeat requests skip the engine entirely
+"""
+import asyncio
+import logging
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+from sqlalchemy.exc import IntegrityError
+from models.games import GameReview, ReviewPosition
+
+logger = logging.getLogger(__name__)
+
+# Position keys per IN (...) query, well under every database's bound-parameter limit
+POSITION_QUERY_SIZE = 500
+
+
+class ReviewStore:
+    """
+    Reviews keyed by (moves_hash, profile) in the `game_reviews` table, and the engine
+    result of every position they reached keyed by (profile, position) in `review_positions`.
+    All database work runs in the default executor, never on the event loop.
+    Storage errors are logged and treated as misses.
+    """
+
+    def __init__(self):
+        self.session_factory = self._init_db()
+
+    def _init_db(self):
+        try:
+            from database import SessionLocal, init_db
+            init_db()
+            logger.info("Review store ready")
+            return SessionLocal
+        except Exception as e:
+            logger.error(f"Review store DISABLED: {e}. Every review will run the engine until this is fixed.")
+            return None
+
+    @property
+    def enabled(self) -> bool:
+        return self.session_factory is not None
+
+    def _get_sync(self, moves_hash: str, profile: str) -> Optional[Dict[str, Any]]:
+        with self.session_factory() as session:
+            row = (
+                session.query(GameReview.review)
+                .filter(GameReview.moves_hash == moves_hash, GameReview.profile == profile)
+                .first()
+            )
+            return row[0] if row else None
+
+    def _get_positions_sync(self, keys: List[str], profile: str) -> List[Dict[str, Any]]:
+        found = []
+        with self.session_factory() as session:
+            for i in range(0, len(keys), POSITION_QUERY_SIZE):
+                rows = (
+                    session.query(ReviewPosition)
+                    .filter(ReviewPosition.profile == profile,
+                            ReviewPosition.position_key.in_(keys[i:i + POSITION_QUERY_SIZE]))
+                    .all()
+                )
+                found.extend({"key": row.position_key, "eval": row.eval, "best": row.best_move, "full": row.full}
+                             for row in rows)
+        return found
+
+    def _save_positions_sync(self, profile: str, positions: List[Dict[str, Any]]):
+        """Insert new positions; a full search replaces a screening one, never the other way round"""
+        by_key = {entry["key"]: entry for entry in positions}
+        with self.session_factory() as session:
+            keys = list(by_key)
+            for i in range(0, len(keys), POSITION_QUERY_SIZE):
+                rows = (
+                    session.query(ReviewPosition)
+                    .filter(ReviewPosition.profile == profile,
+                            ReviewPosition.position_key.in_(keys[i:i + POSITION_QUERY_SIZE]))
+                    .all()
+                )
+                for row in rows:
+                    entry = by_key.pop(row.position_key)
+                    if entry["full"] or not row.full:
+                        row.eval, row.best_move, row.full = entry["eval"], entry["best"], entry["full"]
+            session.add_all(
+                ReviewPosition(profile=profile, position_key=key, eval=entry["eval"],
+                               best_move=entry["best"], full=entry["full"])
+                for key, entry in by_key.items()
+            )
+            try:
+                session.commit()
+            except IntegrityError:
+                # Another worker stored some of the same positions first; the review itself is saved
+                session.rollback()
+
+    def _save_sync(self, moves_hash: str, profile: str, pgn: str, review: Dict[str, Any],
+                   positions: Optional[List[Dict[str, Any]]], plies: Optional[Dict[str, Any]] = None):
+        accuracy = review.get("accuracy", {})
+        values = {
+            "pgn": pgn,
+            "total_moves": review.get("totalMoves"),
+            "white_accuracy": accuracy.get("white"),
+            "black_accuracy": accuracy.get("black"),
+            "review": review,
+            "plies": plies,
+        }
+        with self.session_factory() as session:
+            row = (
+                session.query(GameReview)
+                .filter(GameReview.moves_hash == moves_hash, GameReview.profile == profile)
+                .first()
+            )
+            if row:
+                for field, value in values.items():
+                    setattr(row, field, value)
+            else:
+                session.add(GameReview(moves_hash=moves_hash, profile=profile, **values))
+            try:
+                session.commit()
+            except IntegrityError:
+                # Another worker stored the same review first
+                session.rollback()
+        if positions:
+            self._save_positions_sync(profile, positions)
+
+    async def get(self, moves_hash: str, profile: str) -> Optional[Dict[str, Any]]:
+        """Stored review for this move sequence and profile, if any"""
+        if not self.enabled:
+            return None
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._get_sync, moves_hash, profile)
+        except Exception as e:
+            logger.error(f"Review store read error: {e}")
+            return None
+
+    async def get_positions(self, keys: List[str], profile: str) -> List[Dict[str, Any]]:
+        """
+        Stored engine results ({"key", "eval", "best", "full"}) for any of these positions
+        (Zobrist hashes, hex) searched with this profile, by whichever review reached them:
+        a game that shares an opening, or the first moves, with stored reviews reuses them.
+        """
+        if not self.enabled or not keys:
+            return []
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._get_positions_sync, keys, profile)
+        except Exception as e:
+            logger.error(f"Review store read error: {e}")
+            return []
+
+    async def save(self, moves_hash: str, profile: str, pgn: str, review: Dict[str, Any],
+                   positions: Optional[List[Dict[str, Any]]] = None, plies: Optional[Dict[str, Any]] = None):
+        """
+        Insert or replace the stored review (and its per-ply results) for this move sequence
+        and profile, and store its per-position results for other reviews to reuse
+        """
+        if not self.enabled:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._save_sync, moves_hash, profile, pgn, review, positions, plies)
+        except Exception as e:
+            logger.error(f"Review store write error: {e}")
+
+    # Bulk access for offline jobs (synchronous: run them in an executor or a CLI)
+
+    def iter_scoring_inputs(self, profile: Optional[str] = None,
+                            batch_size: int = 1000) -> Iterator[List[Tuple[int, Dict[str, Any], Dict[str, Any]]]]:
+        """Batches of (id, review, plies) for every review stored with its per-ply inputs, in id order"""
+        if not self.enabled:
+            return
+        last_id = 0
+        while True:
+            with self.session_factory() as session:
+                query = session.query(GameReview.id, GameReview.review, GameReview.plies).filter(
+                    GameReview.id > last_id, GameReview.plies.isnot(None)
+                )
+                if profile:
+                    query = query.filter(GameReview.profile == profile)
+                rows = query.order_by(GameReview.id).limit(batch_size).all()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [tuple(row) for row in rows]
+
+    def update_scores(self, updates: List[Dict[str, Any]]):
+        """Write rescored reviews: dicts with id, review, white_accuracy and black_accuracy"""
+        if not self.enabled or not updates:
+            return
+        with self.session_factory() as session:
+            session.bulk_update_mappings(GameReview, updates)
+            session.commit()
+
+
+# Global instance - lazy initialization
+review_store = None
+
+def get_review_store():
+    """Get or create the review store instance"""
+    global review_store
+    if review_store is None:
+        review_store = ReviewStore()
+    return review_store
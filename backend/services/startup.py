@@ -0,0 +1,115 @@
+"""
+Application startup: engine discovery, connections and engine prewarm, run concurrently
+"""
+import asyncio
+import time
+import logging
+from typing import Dict, Any, Callable, Awaitable
+from services.engine_discovery import discover_stockfish, get_stockfish_path
+from services.engine_pool import get_engine_pool
+from services.analysis_profiles import get_analysis_profile
+from services.opening_book import get_opening_book
+from services.tablebase import get_tablebase_service
+from services.review_store import get_review_store
+from services.eval_index import get_eval_index
+
+logger = logging.getLogger(__name__)
+
+# Seconds any single startup step may take before the app starts without it
+STEP_TIMEOUT = 10.0
+
+# What startup found; served by the readiness endpoint
+startup_state: Dict[str, Any] = {"ready": False, "steps": {}}
+
+
+async def _step(name: str, work: Callable[[], Awaitable[Dict[str, Any]]]):
+    """Run one step with a timeout; failures are recorded, never raised"""
+    start = time.perf_counter()
+    try:
+        detail = await asyncio.wait_for(work(), STEP_TIMEOUT)
+        state = {"ok": True, **detail}
+    except Exception as e:
+        logger.warning(f"Startup step '{name}' failed: {e!r}")
+        state = {"ok": False, "error": str(e) or type(e).__name__}
+    state["ms"] = round((time.perf_counter() - start) * 1000, 1)
+    startup_state["steps"][name] = state
+
+
+def _in_executor(fn: Callable[[], Dict[str, Any]]) -> Callable[[], Awaitable[Dict[str, Any]]]:
+    async def run():
+        return await asyncio.get_running_loop().run_in_executor(None, fn)
+    return run
+
+
+async def _stockfish() -> Dict[str, Any]:
+    path = await discover_stockfish()
+    if not path:
+        raise FileNotFoundError("Stockfish executable not found")
+    return {"path": path}
+
+
+async def _engines() -> Dict[str, Any]:
+    path = get_stockfish_path()
+    if not path:
+        raise FileNotFoundError("Stockfish executable not found")
+    pool = get_engine_pool(path)
+    ready = await pool.prewarm(get_analysis_profile())
+    if not ready:
+        raise RuntimeError("no engine reached readyok")
+    return {"engines_ready": ready, "pool_size": pool.size}
+
+
+def _analysis_service() -> Dict[str, Any]:
+    from services.enhanced_analysis_service import get_analysis_service
+    service = get_analysis_service()
+    return {"redis": service.redis_client is not None, "eval_index": service.eval_index.enabled}
+
+
+def _game_review_service() -> Dict[str, Any]:
+    from services.game_review_service import get_game_review_service
+    get_game_review_service()
+    return {}
+
+
+def _opening_book() -> Dict[str, Any]:
+    book = get_opening_book()
+    return {"polyglot": book.reader is not None, "named_positions": len(book.names)}
+
+
+def _tablebase() -> Dict[str, Any]:
+    return {"enabled": get_tablebase_service().enabled}
+
+
+def _review_store() -> Dict[str, Any]:
+    return {"enabled": get_review_store().enabled}
+
+
+def _eval_index() -> Dict[str, Any]:
+    index = get_eval_index()
+    return {"enabled": index.enabled, "positions": len(index)}
+
+
+async def run_startup():
+    """
+    Do all discovery and connection work before the first request. Independent
+    steps run concurrently in two phases: discovery and the shared resources
+    first, then engine prewarm and the services that are built on them.
+    """
+    start = time.perf_counter()
+    await asyncio.gather(
+        _step("stockfish", _stockfish),
+        _step("opening_book", _in_executor(_opening_book)),
+        _step("tablebase", _in_executor(_tablebase)),
+        _step("review_store", _in_executor(_review_store)),
+        _step("eval_index", _in_executor(_eval_index)),
+    )
+    await asyncio.gather(
+        _step("engines", _engines),
+        _step("analysis_service", _in_executor(_analysis_service)),
+        _step("game_review_service", _in_executor(_game_review_service)),
+    )
+
+    steps = startup_state["steps"]
+    startup_state["ready"] = all(steps[name]["ok"] for name in ("stockfish", "engines", "analysis_service"))
+    startup_state["startup_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    logger.info(f"Startup finished in {startup_state['startup_ms']} ms (ready={startup_state['ready']})")
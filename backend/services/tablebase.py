@@ -0,0 +1,109 @@
+"""
+Optional local Syzygy tablebase probing for endgame positions
+"""
+import os
+import logging
+from typing import Optional, Dict, Any
+import chess
+import chess.syzygy
+from config import SYZYGY_PATH, SYZYGY_MAX_PIECES
+
+logger = logging.getLogger(__name__)
+
+# Centipawn value reported for a tablebase win (mates still rank above it, see utils/score.py)
+TABLEBASE_WIN_CP = 20000
+
+
+class TablebaseService:
+    """
+    Exact WDL/DTZ results from a directory of Syzygy files (`.rtbw` / `.rtbz`).
+    Disabled when no directory is configured or nothing could be loaded.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_pieces: int = 5):
+        self.max_pieces = max_pieces
+        self.tablebase = None
+        if path and os.path.isdir(path):
+            try:
+                self.tablebase = chess.syzygy.open_tablebase(path)
+                logger.info(f"Syzygy tablebase opened: {path} (up to {max_pieces} pieces)")
+            except Exception as e:
+                logger.warning(f"Could not open Syzygy tablebase at {path}: {e}")
+        elif path:
+            logger.warning(f"Syzygy path not found: {path}")
+
+    @property
+    def enabled(self) -> bool:
+        return self.tablebase is not None
+
+    def covers(self, board: chess.Board) -> bool:
+        """Whether the position is within the configured piece limit"""
+        return (
+            self.enabled
+            and chess.popcount(board.occupied) <= self.max_pieces
+            and not board.castling_rights
+        )
+
+    def probe(self, board: chess.Board) -> Optional[Dict[str, Any]]:
+        """
+        Probe the position. Returns WDL/DTZ for the side to move and the
+        tablebase-best move, or None if the position is not covered.
+        """
+        if not self.covers(board):
+            return None
+        try:
+            wdl = self.tablebase.probe_wdl(board)
+            dtz = self.tablebase.probe_dtz(board)
+        except (KeyError, chess.syzygy.MissingTableError):
+            return None
+        except Exception as e:
+            logger.error(f"Tablebase probe error: {e}")
+            return None
+        return {"wdl": wdl, "dtz": dtz, "best_move": self._best_move(board)}
+
+    def _best_move(self, board: chess.Board) -> Optional[str]:
+        """Pick the move with the best WDL, then the fastest conversion (or slowest loss)"""
+        best_key = None
+        best_move = None
+        for move in board.legal_moves:
+            zeroing = board.is_zeroing(move)
+            board.push(move)
+            try:
+                wdl = -self.tablebase.probe_wdl(board)
+                dtz = abs(self.tablebase.probe_dtz(board))
+            except Exception:
+                return None
+            finally:
+                board.pop()
+            if wdl > 0:
+                key = (wdl, zeroing, -dtz)
+            else:
+                key = (wdl, not zeroing, dtz)
+            if best_key is None or key > best_key:
+                best_key, best_move = key, move
+        return best_move.uci() if best_move else None
+
+    @staticmethod
+    def wdl_to_cp(wdl: int) -> int:
+        """Side-to-move centipawns for a WDL value (cursed wins / blessed losses are draws)"""
+        if wdl >= 2:
+            return TABLEBASE_WIN_CP
+        if wdl <= -2:
+            return -TABLEBASE_WIN_CP
+        return 0
+
+    def close(self):
+        if self.tablebase is not None:
+            self.tablebase.close()
+            self.tablebase = None
+
+
+# Global instance - lazy initialization
+tablebase_service = None
+
+def get_tablebase_service():
+    """Get or create the tablebase service instance"""
+    global tablebase_service
+    if tablebase_service is None:
+        tablebase_service = TablebaseService(SYZYGY_PATH, SYZYGY_MAX_PIECES)
+    return tablebase_service
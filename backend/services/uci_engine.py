@@ -0,0 +1,313 @@
+"""
+UCI engine protocol layer used by the engine pool.
+
+`UciEngine` drives one engine process directly on the event loop (asyncio subprocess,
+no helper thread per engine or per search). During a search it only remembers the
+latest `info` line of each principal variation as raw text and parses those once
+`bestmove` arrives, with a single-pass tokenizer; streaming searches parse each line
+as it is forwarded. `ThreadedUciEngine` wraps python-chess's `SimpleEngine` behind
+the same interface for event loops without subprocess support (the Windows selector
+loop). Both raise python-chess `EngineError`s, so callers handle either the same way.
+"""
+import asyncio
+import logging
+import platform
+import threading
+from typing import Any, Callable, Dict, List, Optional
+import chess
+import chess.engine
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for the `uci` / `isready` handshakes and for `quit`
+HANDSHAKE_TIMEOUT = 10.0
+
+# `info` keys followed by one integer
+_INT_KEYS = frozenset(("depth", "seldepth", "multipv", "nodes", "nps", "hashfull",
+                       "tbhits", "cpuload", "currmovenumber", "sbhits"))
+
+InfoCallback = Callable[[chess.engine.InfoDict], None]
+
+
+def parse_info(line: str, turn: chess.Color = chess.WHITE) -> chess.engine.InfoDict:
+    """
+    One UCI `info` line as a python-chess InfoDict, in a single pass over its tokens.
+    `turn` is the side to move (UCI scores are relative to it). PV moves are taken as
+    sent: the engine only emits legal lines, so they are not replayed on a board.
+    """
+    tokens = line.split()
+    n = len(tokens)
+    i = 1 if n and tokens[0] == "info" else 0
+    info: Dict[str, Any] = {}
+    try:
+        while i < n:
+            key = tokens[i]
+            i += 1
+            if key in _INT_KEYS:
+                info[key] = int(tokens[i])
+                i += 1
+            elif key == "time":
+                info["time"] = int(tokens[i]) / 1000.0  # seconds, as python-chess reports it
+                i += 1
+            elif key == "score":
+                value = int(tokens[i + 1])
+                score = chess.engine.Cp(value) if tokens[i] == "cp" else chess.engine.Mate(value)
+                info["score"] = chess.engine.PovScore(score, turn)
+                i += 2
+                if i < n and tokens[i] in ("lowerbound", "upperbound"):
+                    info[tokens[i]] = True
+                    i += 1
+            elif key == "pv":
+                info["pv"] = [chess.Move.from_uci(token) for token in tokens[i:]]
+                break
+            elif key == "currmove":
+                info["currmove"] = chess.Move.from_uci(tokens[i])
+                i += 1
+            elif key == "wdl":
+                wins, draws, losses = (int(token) for token in tokens[i:i + 3])
+                info["wdl"] = chess.engine.PovWdl(chess.engine.Wdl(wins, draws, losses), turn)
+                i += 3
+            elif key == "string":
+                info["string"] = " ".join(tokens[i:])
+                break
+            elif key in ("refutation", "currline"):
+                break  # rest of the line is moves we don't use
+    except (IndexError, ValueError):
+        logger.warning(f"Ignoring malformed engine output: {line}")
+    return info
+
+
+def _multipv(line: str) -> int:
+    start = line.find(" multipv ")
+    if start < 0:
+        return 1
+    start += 9
+    end = line.find(" ", start)
+    return int(line[start:end if end > 0 else None])
+
+
+def go_command(limit: chess.engine.Limit) -> str:
+    parts = ["go"]
+    if limit.depth:
+        parts += ["depth", str(limit.depth)]
+    if limit.nodes:
+        parts += ["nodes", str(limit.nodes)]
+    if limit.mate:
+        parts += ["mate", str(limit.mate)]
+    if limit.time:
+        parts += ["movetime", str(max(1, int(limit.time * 1000)))]
+    if len(parts) == 1:
+        parts.append("infinite")
+    return " ".join(parts)
+
+
+def position_command(board: chess.Board) -> str:
+    """`position` with the game's root and moves, so the engine sees repetitions"""
+    root = board.root()
+    fen = root.fen()
+    command = "position startpos" if fen == chess.STARTING_FEN else f"position fen {fen}"
+    if board.move_stack:
+        command += " moves " + " ".join(move.uci() for move in board.move_stack)
+    return command
+
+
+class UciEngine:
+    """One UCI engine process driven directly on the event loop"""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.id: Dict[str, str] = {}
+        self.options: Dict[str, str] = {}  # option name (lower case) -> declared name
+        self.config: Dict[str, Any] = {}
+        self._game: object = None
+        self._first_game = True
+        self._searching = False
+
+    @classmethod
+    async def popen(cls, path: str) -> "UciEngine":
+        """Start the engine and complete the `uci` handshake"""
+        process = await asyncio.create_subprocess_exec(
+            path, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        engine = cls(process)
+        try:
+            await asyncio.wait_for(engine._handshake(), HANDSHAKE_TIMEOUT)
+        except BaseException:
+            engine.close()
+            raise
+        return engine
+
+    def _send(self, command: str):
+        if self.process.returncode is not None:
+            raise chess.engine.EngineTerminatedError(f"engine process died (exit code {self.process.returncode})")
+        self.process.stdin.write(command.encode() + b"\n")
+
+    async def _readline(self) -> str:
+        line = await self.process.stdout.readline()
+        if not line:
+            raise chess.engine.EngineTerminatedError("engine process died unexpectedly")
+        return line.decode(errors="replace").rstrip()
+
+    async def _handshake(self):
+        self._send("uci")
+        while True:
+            line = await self._readline()
+            if line == "uciok":
+                return
+            if line.startswith("id "):
+                _, key, *value = line.split(" ", 2)
+                self.id[key] = value[0] if value else ""
+            elif line.startswith("option name "):
+                name = line[12:].split(" type ")[0]
+                self.options[name.lower()] = name
+
+    async def ping(self):
+        """Wait until the engine is ready (`isready` / `readyok`)"""
+        self._send("isready")
+        while await self._readline() != "readyok":
+            pass
+
+    def _setoption(self, name: str, value: Any):
+        if self.config.get(name) == value:
+            return
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        self._send(f"setoption name {self.options.get(name.lower(), name)} value {value}")
+        self.config[name] = value
+
+    async def configure(self, options: Dict[str, Any]):
+        """Send changed UCI options"""
+        for name, value in options.items():
+            self._setoption(name, value)
+
+    async def search(self, board: chess.Board, limit: chess.engine.Limit, multipv: int = 1,
+                     game: object = None, on_info: Optional[InfoCallback] = None) -> List[chess.engine.InfoDict]:
+        """
+        Search `board` and return the final info of each principal variation.
+        `on_info` gets every `info` line as it arrives (parsed); without it, lines are
+        only parsed once the search is over. Like python-chess, `ucinewgame` is only
+        sent before the engine's first search and when `game` changes (searches
+        without a token count as one game), so the engine keeps its hash table.
+        """
+        if self._searching:
+            raise chess.engine.EngineError("engine is already searching")
+        self._searching = True
+        try:
+            if "multipv" in self.options:
+                self._setoption("MultiPV", multipv)
+            if self._first_game or game != self._game:
+                self._send("ucinewgame")
+                await self.ping()
+            self._first_game = False
+            self._game = game
+            self._send(position_command(board))
+            self._send(go_command(limit))
+
+            turn = board.turn
+            latest: Dict[int, str] = {}
+            while True:
+                line = await self._readline()
+                if line.startswith("info "):
+                    if on_info is not None:
+                        on_info(parse_info(line, turn))
+                    # Keep the newest exact score per line; fail-high/low re-searches follow
+                    if " score " in line and "bound" not in line:
+                        latest[_multipv(line)] = line
+                elif line.startswith("bestmove"):
+                    break
+            return [parse_info(latest[k], turn) for k in sorted(latest)] or [{}]
+        finally:
+            self._searching = False
+
+    def stop(self):
+        """Ask a running search to finish (its `bestmove` ends `search`)"""
+        if self._searching and self.process.returncode is None:
+            self._send("stop")
+
+    async def quit(self):
+        try:
+            self._send("quit")
+            await asyncio.wait_for(self.process.wait(), HANDSHAKE_TIMEOUT)
+        except (asyncio.TimeoutError, chess.engine.EngineError, ConnectionError):
+            self.close()
+
+    def close(self):
+        """Kill the process without waiting"""
+        if self.process.returncode is None:
+            try:
+                self.process.kill()
+            except ProcessLookupError:
+                pass
+
+
+class ThreadedUciEngine:
+    """
+    python-chess `SimpleEngine` behind the `UciEngine` interface. The engine runs its
+    own event loop in a thread and searches run in the default executor, so this
+    works on any event loop.
+    """
+
+    def __init__(self, engine: chess.engine.SimpleEngine):
+        self.engine = engine
+        self._running: Optional[chess.engine.SimpleAnalysisResult] = None
+        self._stopped = threading.Event()
+
+    @classmethod
+    async def popen(cls, path: str) -> "ThreadedUciEngine":
+        def spawn():
+            if platform.system() == "Windows":
+                # SimpleEngine runs its own loop in a thread; it needs the proactor loop on Windows
+                asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+            return chess.engine.SimpleEngine.popen_uci(path)
+        return cls(await asyncio.get_running_loop().run_in_executor(None, spawn))
+
+    async def ping(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.engine.ping)
+
+    async def configure(self, options: Dict[str, Any]):
+        await asyncio.get_running_loop().run_in_executor(None, self.engine.configure, options)
+
+    async def search(self, board: chess.Board, limit: chess.engine.Limit, multipv: int = 1,
+                     game: object = None, on_info: Optional[InfoCallback] = None) -> List[chess.engine.InfoDict]:
+        loop = asyncio.get_running_loop()
+        self._stopped.clear()
+
+        def run() -> List[chess.engine.InfoDict]:
+            with self.engine.analysis(board, limit, multipv=multipv, game=game) as analysis:
+                self._running = analysis
+                if self._stopped.is_set():
+                    analysis.stop()
+                try:
+                    for info in analysis:
+                        if on_info is not None:
+                            loop.call_soon_threadsafe(on_info, info)
+                finally:
+                    self._running = None
+                return analysis.multipv
+
+        return await loop.run_in_executor(None, run)
+
+    def stop(self):
+        self._stopped.set()
+        running = self._running
+        if running is not None:
+            running.stop()
+
+    async def quit(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.engine.quit)
+
+    def close(self):
+        try:
+            self.engine.close()
+        except Exception:
+            pass
+
+
+async def open_engine(path: str):
+    """Native engine client, or the threaded one where the loop can't run subprocesses"""
+    try:
+        return await UciEngine.popen(path)
+    except NotImplementedError:
+        logger.info("Event loop without subprocess support: using threaded python-chess engines")
+        return await ThreadedUciEngine.popen(path)
@@ -0,0 +1,56 @@
+"""Cached evaluations only answer requests they were searched deep enough for"""
+import asyncio
+from services.enhanced_analysis_service import EnhancedAnalysisService
+from services.eval_index import EvalIndex
+from services.tablebase import get_tablebase_service
+
+FEN = "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3"
+
+
+def shallow(depth):
+    return {"fen": FEN, "knodes": 120, "depth": depth, "pvs": [{"moves": "f1b5 a7a6", "cp": 31}]}
+
+
+def make_service(tmp_path):
+    # No Redis, no engines: only the on-disk index and the lookup logic under test
+    service = EnhancedAnalysisService.__new__(EnhancedAnalysisService)
+    service.eval_index = EvalIndex(str(tmp_path))
+    service.redis_client = None
+    service.stockfish_path = None
+    service.tablebase = get_tablebase_service()
+    return service
+
+
+def test_shallow_entry_is_a_miss_for_deeper_requests(tmp_path):
+    service = make_service(tmp_path)
+    service._save_to_cache(FEN, shallow(10))
+
+    assert service._get_from_cache(FEN, 1, min_depth=10)["depth"] == 10
+    assert service._get_from_cache(FEN, 1) is not None
+    assert service._get_from_cache(FEN, 1, min_depth=22) is None
+
+
+def test_deep_profile_searches_past_a_shallow_cache_entry(tmp_path):
+    service = make_service(tmp_path)
+    service._save_to_cache(FEN, shallow(10))
+    searched = []
+
+    async def no_cloud(fen, multi_pv=1):
+        return None
+
+    async def stockfish(fen, profile, multi_pv, priority):
+        searched.append(profile.depth)
+        return {"fen": fen, "knodes": 4000, "depth": profile.depth, "pvs": [{"moves": "f1b5", "cp": 35}]}
+
+    service._query_lichess = no_cloud
+    service._analyze_with_stockfish = stockfish
+
+    fast = asyncio.run(service.analyze_position(FEN, profile="fast", quality="full"))
+    assert fast.source == "cache"
+
+    deep = asyncio.run(service.analyze_position(FEN, profile="deep", quality="full"))
+    assert deep.source == "stockfish" and searched == [22]
+
+    # The explicit depth override counts the same way
+    override = asyncio.run(service.analyze_position(FEN, depth=30, profile="fast", quality="full"))
+    assert override.source == "stockfish" and searched == [22, 30]
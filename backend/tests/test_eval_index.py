@@ -0,0 +1,26 @@
+"""Workers sharing one evaluation index directory"""
+import os
+from services.eval_index import EvalIndex
+
+
+def record(n):
+    return bytes([n]) * 40
+
+
+def test_worker_rereads_a_new_log_that_reuses_the_old_inode(tmp_path):
+    writer, reader = EvalIndex(str(tmp_path)), EvalIndex(str(tmp_path))
+    writer.put_many([(k, record(k)) for k in range(1, 4)])
+    reader._refresh(force=True)
+    old_offset = reader._log_offset
+
+    writer.compact()
+    writer.put_many([(k, record(k)) for k in range(10, 16)])
+    assert os.path.getsize(writer.log_file) > old_offset
+
+    # The reader last saw the old log; pretend the new one got its inode back
+    reader._log_id = (os.stat(reader.log_file).st_ino, old_offset)
+    reader._refresh(force=True)
+
+    for k in (*range(1, 4), *range(10, 16)):
+        assert reader.get(k) == record(k)
+    assert set(reader._log) == set(range(10, 16))
@@ -0,0 +1,40 @@
+"""Rescoring stored reviews from their packed per-ply inputs"""
+from services.review_rescoring import apply_scores, score_chunk
+from services.review_scoring import pack_plies
+
+
+def stored_review():
+    # 1. e4 e5 with the sideline 1... g5?? (move id 3); classifications as an older scoring left them
+    plies = pack_plies([0, 1], [0, 1], [False, False], [0.3, -0.3], [0.3, -0.35], [0.3, -0.3], ["e2e4", "e7e5"])
+    plies["variations"] = pack_plies([3], [1], [False], [-0.3], [-3.5], [-0.3], ["e7e5"])
+    review = {
+        "moves": [
+            {"moveIndex": 0, "classification": "best", "evalDrop": 0.0},
+            {"moveIndex": 1, "classification": "good", "evalDrop": 5.0},
+        ],
+        "variations": [{"id": 3, "classification": "good", "evalDrop": 1.0}],
+    }
+    return review, plies
+
+
+def test_variation_moves_are_reclassified():
+    review, plies = stored_review()
+    scores, variations = score_chunk([(1, review, plies)])
+
+    assert variations == [1]
+    assert apply_scores(review, plies, scores, 0, variations[0])
+    variation = review["variations"][0]
+    assert variation["classification"] == "blunder"
+    assert variation["evalDrop"] == 320.0
+    # The variation doesn't count towards the game's own statistics
+    assert review["classifications"]["black"]["blunder"] == 0
+
+
+def test_reviews_without_variations_still_rescore():
+    review, plies = stored_review()
+    del plies["variations"], review["variations"]
+    scores, variations = score_chunk([(1, review, plies)])
+
+    assert variations == [None]
+    apply_scores(review, plies, scores, 0, variations[0])
+    assert [move["classification"] for move in review["moves"]] == ["best", "best"]
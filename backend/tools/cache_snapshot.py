@@ -0,0 +1,211 @@
+"""
+Evaluation cache snapshots: export every cache tier to one file, import it on a fresh node.
+
+A snapshot is a small header followed by a zlib stream of (position key, record)
+entries in the compact evaluation encoding (utils/eval_codec.py):
+
+    header   8s magic "EVALSNP1" | B snapshot version | B record encoding version | Q entries
+    stream   zlib( Q key | I length | record ... )
+
+Export reads the on-disk index and scans Redis (pipelined GETs), the index winning
+for positions in both. Import streams the file back: Redis gets pipelined SETEX
+batches, written on a separate thread while the next batch is decompressed, and the
+on-disk index is rebuilt once at the end with the snapshot filling in the positions
+it doesn't have (entries already on the node are kept).
+
+Usage (from backend/):
+    python -m tools.cache_snapshot export cache.evs [--no-redis] [--no-index] [--level 6]
+    python -m tools.cache_snapshot import cache.evs [--no-redis] [--no-index]
+"""
+import argparse
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+from config import REDIS_URL
+from services.eval_index import get_eval_index
+from utils.eval_codec import FORMAT_VERSION
+
+SNAPSHOT_MAGIC = b"EVALSNP1"
+SNAPSHOT_VERSION = 1
+_HEADER = struct.Struct("<8sBBQ")
+_ENTRY = struct.Struct("<QI")
+
+BATCH = 5000
+READ_SIZE = 1 << 20
+
+
+def connect_redis():
+    from redis import Redis
+    try:
+        client = Redis.from_url(REDIS_URL, socket_connect_timeout=1)
+        client.ping()
+        return client
+    except Exception as e:
+        print(f"Redis unavailable ({e}); skipping that tier")
+        return None
+
+
+def redis_entries(client, skip: set) -> Iterator[Tuple[int, bytes]]:
+    """Every evaluation in Redis not in `skip`, fetched with pipelined GETs"""
+    from services.enhanced_analysis_service import CACHE_KEY_PREFIX
+    prefix = CACHE_KEY_PREFIX.encode()
+    batch: List[bytes] = []
+
+    def fetch(names):
+        pipe = client.pipeline(transaction=False)
+        for name in names:
+            pipe.get(name)
+        for name, value in zip(names, pipe.execute()):
+            if value is not None:
+                yield int(name[len(prefix):], 16), value
+
+    for name in client.scan_iter(match=prefix + b"*", count=BATCH):
+        if int(name[len(prefix):], 16) in skip:
+            continue
+        batch.append(name)
+        if len(batch) == BATCH:
+            yield from fetch(batch)
+            batch = []
+    if batch:
+        yield from fetch(batch)
+
+
+def export_snapshot(path: str, use_index: bool, use_redis: bool, level: int):
+    start = time.perf_counter()
+    index = get_eval_index()
+    client = connect_redis() if use_redis else None
+    count = raw = 0
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, FORMAT_VERSION, 0))
+        compressor = zlib.compressobj(level)
+        seen = set()
+
+        def write(entries):
+            nonlocal count, raw
+            for key, record in entries:
+                chunk = _ENTRY.pack(key, len(record)) + record
+                raw += len(chunk)
+                count += 1
+                f.write(compressor.compress(chunk))
+
+        if use_index and index.enabled:
+            for key, record in index.items():
+                seen.add(key)
+                write([(key, record)])
+        if client:
+            write(redis_entries(client, seen))
+        f.write(compressor.flush())
+        f.seek(0)
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, FORMAT_VERSION, count))
+    os.replace(tmp, path)
+
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(path)
+    print(f"exported {count:,} positions to {path} in {elapsed:.1f}s ({count / max(elapsed, 1e-9):,.0f} positions/s)")
+    print(f"size: {size / 1e6:.1f} MB compressed, {raw / 1e6:.1f} MB raw "
+          f"({size / max(count, 1):.1f} bytes/position, {raw / max(size, 1):.2f}x compression)")
+
+
+def read_snapshot(path: str) -> Tuple[int, Iterator[List[Tuple[int, bytes]]]]:
+    """Entry count and an iterator of entry batches; raises ValueError for foreign or newer files"""
+    f = open(path, "rb")
+    magic, version, record_version, count = _HEADER.unpack(f.read(_HEADER.size))
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        f.close()
+        raise ValueError(f"{path} is not a version {SNAPSHOT_VERSION} evaluation snapshot")
+    if record_version != FORMAT_VERSION:
+        f.close()
+        raise ValueError(f"{path} holds evaluation encoding v{record_version}, this build reads v{FORMAT_VERSION}")
+
+    def batches():
+        decompressor = zlib.decompressobj()
+        buffer = b""
+        batch: List[Tuple[int, bytes]] = []
+        with f:
+            while True:
+                data = f.read(READ_SIZE)
+                buffer += decompressor.decompress(data) if data else decompressor.flush()
+                offset = 0
+                while offset + _ENTRY.size <= len(buffer):
+                    key, length = _ENTRY.unpack_from(buffer, offset)
+                    end = offset + _ENTRY.size + length
+                    if end > len(buffer):
+                        break
+                    batch.append((key, buffer[offset + _ENTRY.size:end]))
+                    offset = end
+                    if len(batch) == BATCH:
+                        yield batch
+                        batch = []
+                buffer = buffer[offset:]
+                if not data:
+                    break
+        if batch:
+            yield batch
+
+    return count, batches()
+
+
+def import_snapshot(path: str, use_index: bool, use_redis: bool):
+    from services.enhanced_analysis_service import EnhancedAnalysisService, CACHE_TTL
+    start = time.perf_counter()
+    count, batches = read_snapshot(path)
+    index = get_eval_index() if use_index and get_eval_index().enabled else None
+    client = connect_redis() if use_redis else None
+    if index is None and not client:
+        raise SystemExit("No cache tier to import into (set EVAL_INDEX_PATH and/or REDIS_URL)")
+
+    def write_redis(batch):
+        pipe = client.pipeline(transaction=False)
+        for key, record in batch:
+            pipe.setex(EnhancedAnalysisService._get_cache_key(key), CACHE_TTL, record)
+        pipe.execute()
+
+    imported = 0
+    pending: Optional[object] = None
+    fill: List[Tuple[int, bytes]] = []
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        for batch in batches:
+            if index is not None:
+                fill.extend(batch)
+            if client:
+                # One round trip in flight while the next batch is decompressed
+                if pending:
+                    pending.result()
+                pending = writer.submit(write_redis, batch)
+            imported += len(batch)
+            elapsed = time.perf_counter() - start
+            print(f"  {imported:,}/{count:,} positions, {imported / elapsed:,.0f} positions/s", end="\r")
+        if pending:
+            pending.result()
+    print()
+    if index is not None:
+        index.compact(fill)
+
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(path)
+    tiers = ", ".join(t for t, on in (("index", index is not None), ("redis", client)) if on)
+    print(f"imported {imported:,} positions into {tiers} in {elapsed:.1f}s "
+          f"({imported / max(elapsed, 1e-9):,.0f} positions/s, {size / 1e6 / max(elapsed, 1e-9):.1f} MB/s of snapshot)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("path", help="Snapshot file")
+    parser.add_argument("--no-index", action="store_true", help="Leave out the on-disk evaluation index")
+    parser.add_argument("--no-redis", action="store_true", help="Leave out Redis")
+    parser.add_argument("--level", type=int, default=6, help="zlib compression level for export")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_snapshot(args.path, not args.no_index, not args.no_redis, args.level)
+    else:
+        import_snapshot(args.path, not args.no_index, not args.no_redis)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Rescore stored game reviews after a change to the classification thresholds or the
+accuracy formulas, from the per-ply engine outputs stored with each review. No engine
+runs: the scoring is spread over --workers processes (default: every core).
+
+Reviews stored before per-ply inputs were kept are skipped; review them again to
+include them.
+
+Usage (from backend/):
+    python -m tools.rescore_reviews [--profile standard] [--workers N] [--dry-run]
+"""
+import argparse
+import logging
+from services.review_rescoring import rescore_reviews
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", help="Only rescore reviews made with this analysis profile")
+    parser.add_argument("--workers", type=int, help="Scoring processes (default: CPU count)")
+    parser.add_argument("--dry-run", action="store_true", help="Score without writing the results back")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    stats = rescore_reviews(args.profile, args.workers, args.dry_run)
+    print(f"rescored {stats['rescored']:,} reviews ({stats['changed']:,} with changed classifications) "
+          f"in {stats['seconds']:.1f}s on {stats['workers']} workers "
+          f"({stats['rescored'] / max(stats['seconds'], 1e-9):,.0f} reviews/s)"
+          + (", dry run: nothing written" if stats["dryRun"] else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Offline cache warm-up from a PGN corpus.
+
+After a deploy or a cache flush every popular opening and middlegame position
+misses and goes to Stockfish. This job finds those positions ahead of time and
+loads their analyses into the evaluation cache:
+
+1. count:   the corpus is streamed in chunks to a process pool; every worker counts
+            positions (up to --max-ply) by canonical position key, so transpositions
+            and move counters collapse into one entry
+2. resolve: a second streamed pass picks up a FEN for each of the --top most frequent keys
+3. analyse: the top positions go through the shared engine pool (bulk priority) and are
+            bulk-loaded into the cache tiers every --batch positions (one append to the
+            on-disk index, one pipelined Redis round trip); the index is compacted at the end
+
+Progress is kept in --state (the ranked top list) and <state>.done (positions already
+loaded), so an interrupted run picks up where it stopped. Positions already in the cache
+are skipped too.
+
+Usage (from backend/):
+    python -m tools.warm_cache games.pgn [--top 10000] [--max-ply 30] [--profile deep] [--workers 8]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+from typing import Dict, FrozenSet, Iterator, List, Optional, Tuple
+import chess
+import chess.pgn
+from utils.chess_utils import position_key
+
+GAMES_PER_CHUNK = 2000
+
+# Counter entries kept while counting; past this, positions seen once are dropped.
+# Popular positions are far above that floor, so the top of the ranking stays exact.
+MAX_TRACKED_KEYS = 5_000_000
+
+
+class _PositionVisitor(chess.pgn.BaseVisitor):
+    """Walks the mainline of each game and hands every position up to `max_ply` to `seen`"""
+
+    def __init__(self, max_ply: int, seen):
+        self.max_ply = max_ply
+        self.seen = seen
+        self.ply = 0
+
+    def begin_game(self):
+        self.ply = 0
+
+    def begin_variation(self):
+        return chess.pgn.SKIP
+
+    def begin_parse_san(self, board: chess.Board, san: str):
+        # SAN parsing dominates; moves past the counted plies are never parsed
+        return chess.pgn.SKIP if self.ply > self.max_ply else None
+
+    def visit_board(self, board: chess.Board):
+        if self.ply <= self.max_ply:
+            self.seen(board)
+        self.ply += 1
+
+    def handle_error(self, error: Exception):
+        pass  # a broken game shouldn't stop the corpus
+
+    def result(self):
+        return True  # read_game returns None only at the end of the input
+
+
+def _walk_chunk(text: str, max_ply: int, seen) -> int:
+    handle = StringIO(text)
+    games = 0
+    while chess.pgn.read_game(handle, Visitor=lambda: _PositionVisitor(max_ply, seen)) is not None:
+        games += 1
+    return games
+
+
+def count_chunk(text: str, max_ply: int) -> Tuple[Counter, int]:
+    """Worker: position key frequencies of one chunk of games"""
+    counts: Counter = Counter()
+
+    def seen(board: chess.Board):
+        counts[position_key(board)] += 1
+
+    return counts, _walk_chunk(text, max_ply, seen)
+
+
+_wanted: FrozenSet[int] = frozenset()
+
+
+def _init_resolver(wanted: FrozenSet[int]):
+    global _wanted
+    _wanted = wanted
+
+
+def resolve_chunk(text: str, max_ply: int) -> Dict[int, str]:
+    """Worker: a FEN for every wanted key that occurs in one chunk of games"""
+    fens: Dict[int, str] = {}
+
+    def seen(board: chess.Board):
+        key = position_key(board)
+        if key in _wanted and key not in fens:
+            fens[key] = board.fen()
+
+    _walk_chunk(text, max_ply, seen)
+    return fens
+
+
+def read_chunks(path: str, games_per_chunk: int = GAMES_PER_CHUNK) -> Iterator[str]:
+    """Stream a PGN file as text chunks of whole games (split on [Event tags)"""
+    lines: List[str] = []
+    games = 0
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if line.startswith("[Event "):
+                games += 1
+                if games > games_per_chunk:
+                    yield "".join(lines)
+                    lines, games = [], 1
+            lines.append(line)
+    if lines:
+        yield "".join(lines)
+
+
+def _map_chunks(executor: ProcessPoolExecutor, fn, path: str, max_ply: int, workers: int):
+    """Submit chunks as the pool frees up (bounded, so the corpus is never fully in memory)"""
+    pending = []
+    for chunk in read_chunks(path):
+        pending.append(executor.submit(fn, chunk, max_ply))
+        if len(pending) >= workers * 2:
+            yield pending.pop(0).result()
+    for future in pending:
+        yield future.result()
+
+
+def count_positions(path: str, max_ply: int, workers: int) -> Tuple[Counter, int]:
+    start = time.perf_counter()
+    counts: Counter = Counter()
+    games = positions = 0
+    with ProcessPoolExecutor(workers) as executor:
+        for chunk_counts, chunk_games in _map_chunks(executor, count_chunk, path, max_ply, workers):
+            counts.update(chunk_counts)
+            games += chunk_games
+            positions += sum(chunk_counts.values())
+            if len(counts) > MAX_TRACKED_KEYS:
+                counts = Counter({key: n for key, n in counts.items() if n > 1})
+    elapsed = time.perf_counter() - start
+    print(f"count:   {games:,} games, {positions:,} positions, {len(counts):,} distinct in {elapsed:.1f}s "
+          f"({games / elapsed:,.0f} games/s, {positions / elapsed:,.0f} positions/s)")
+    return counts, games
+
+
+def resolve_fens(path: str, keys: List[int], max_ply: int, workers: int) -> Dict[int, str]:
+    start = time.perf_counter()
+    fens: Dict[int, str] = {}
+    with ProcessPoolExecutor(workers, initializer=_init_resolver, initargs=(frozenset(keys),)) as executor:
+        for chunk_fens in _map_chunks(executor, resolve_chunk, path, max_ply, workers):
+            for key, fen in chunk_fens.items():
+                fens.setdefault(key, fen)
+            if len(fens) == len(keys):
+                # Popular positions turn up early: skip the rest of the corpus
+                executor.shutdown(cancel_futures=True)
+                break
+    print(f"resolve: {len(fens):,} FENs in {time.perf_counter() - start:.1f}s")
+    return fens
+
+
+def load_state(state_path: str, corpus: str, max_ply: int, top: int) -> Optional[List[list]]:
+    """The ranked top list from an earlier run over the same corpus, if there is one"""
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path) as f:
+        state = json.load(f)
+    if state.get("corpus") != corpus or state.get("max_ply") != max_ply or state.get("requested", 0) < top:
+        return None
+    return state["top"][:top]
+
+
+def load_done(done_path: str) -> set:
+    if not os.path.exists(done_path):
+        return set()
+    with open(done_path) as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+async def warm(top: List[list], done_path: str, profile_name: str, multi_pv: int, batch: int, force: bool):
+    from services.enhanced_analysis_service import get_analysis_service
+    from services.analysis_profiles import get_analysis_profile
+
+    service = get_analysis_service()
+    profile = get_analysis_profile(profile_name)
+    if not service.engine_pool.available:
+        raise SystemExit("Stockfish not found")
+    if not service.cache_enabled:
+        print("warning: no cache tier is configured (EVAL_INDEX_PATH / Redis) - analyses will not be stored")
+
+    done = load_done(done_path)
+    todo = [(key, fen) for key, fen, _ in top if key not in done]
+    if not force and todo:
+        cached = service.cache_contains([fen for _, fen in todo])
+        skipped = sum(cached)
+        todo = [item for item, hit in zip(todo, cached) if not hit]
+    else:
+        skipped = 0
+    print(f"analyse: {len(done):,} done in earlier runs, {skipped:,} already cached, {len(todo):,} to go "
+          f"(profile {profile.name}, multipv {multi_pv}, {service.engine_pool.size} engines)")
+
+    start = time.perf_counter()
+    analysed = stored = knodes = 0
+    try:
+        with open(done_path, "a") as done_file:
+            for i in range(0, len(todo), batch):
+                items = todo[i:i + batch]
+                results = await asyncio.gather(*[
+                    service._analyze_with_stockfish(fen, profile, multi_pv, priority="bulk")
+                    for _, fen in items
+                ])
+                entries = [result for result in results if result]
+                saved = {f"{key:016x}" for key in service.save_many_to_cache(entries)}
+                stored += len(saved)
+                analysed += len(entries)
+                knodes += sum(entry.get("knodes", 0) for entry in entries)
+                # Only positions the cache confirmed: a resumed run retries the rest
+                done_file.writelines(f"{key}\n" for key, _ in items if key in saved)
+                done_file.flush()
+                elapsed = time.perf_counter() - start
+                print(f"  {i + len(items):,}/{len(todo):,} positions, {analysed / elapsed:.1f} positions/s, "
+                      f"{knodes / elapsed:,.0f} knodes/s")
+        if stored and service.eval_index.enabled:
+            service.eval_index.compact()
+    finally:
+        await service.cleanup()
+
+    elapsed = time.perf_counter() - start
+    if analysed:
+        print(f"analyse: {analysed:,} positions in {elapsed:.1f}s ({analysed / elapsed:.1f} positions/s, "
+              f"{elapsed / analysed * 1000:.0f} ms each), {stored:,} cache writes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pgn", help="PGN corpus (any size; it is streamed)")
+    parser.add_argument("--top", type=int, default=10000, help="Most frequent positions to analyse")
+    parser.add_argument("--max-ply", type=int, default=30, help="Only count positions up to this ply")
+    parser.add_argument("--profile", default="deep", help="Analysis profile for the warm-up searches")
+    parser.add_argument("--multipv", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes for PGN parsing")
+    parser.add_argument("--engines", type=int, help="Engine pool size (defaults to ENGINE_POOL_SIZE)")
+    parser.add_argument("--batch", type=int, default=100, help="Positions per analysis batch / cache write")
+    parser.add_argument("--state", default="warm_cache.state.json", help="Progress file for resuming")
+    parser.add_argument("--force", action="store_true", help="Re-analyse positions that are already cached")
+    args = parser.parse_args()
+
+    if args.engines:
+        os.environ["ENGINE_POOL_SIZE"] = str(args.engines)  # read by config on first import
+
+    corpus = os.path.abspath(args.pgn)
+    top = load_state(args.state, corpus, args.max_ply, args.top)
+    if top is not None:
+        print(f"resuming: top {len(top):,} positions from {args.state}")
+    else:
+        counts, _ = count_positions(corpus, args.max_ply, args.workers)
+        ranked = counts.most_common(args.top)
+        fens = resolve_fens(corpus, [key for key, _ in ranked], args.max_ply, args.workers)
+        top = [[f"{key:016x}", fens[key], n] for key, n in ranked if key in fens]
+        with open(args.state, "w") as f:
+            json.dump({"corpus": corpus, "max_ply": args.max_ply, "requested": args.top, "top": top}, f)
+        if top:
+            print(f"top:     {len(top):,} positions, seen {top[0][2]:,} to {top[-1][2]:,} times")
+
+    asyncio.run(warm(top, args.state + ".done", args.profile, args.multipv, args.batch, args.force))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 import chess
 import chess.pgn
+import chess.polyglot
+import hashlib
 from io import StringIO
-from typing import List
+from typing import Any, Dict, List
 
 def parse_pgn_moves(pgn_text: str):
     game = chess.pgn.read_game(StringIO(pgn_text))
@@ -29,10 +31,70 @@ def parse_pgn_moves(pgn_text: str):
                 raise ValueError(f"Illegal move or error parsing move {move}: {e}")
     return moves
 
-def pgn_to_fens(pgn_text: str, every_n_moves: int = 1) -> List[str]:
+def pgn_tree(game: chess.pgn.Game) -> List[Dict[str, Any]]:
     """
-    Convert PGN to list of FEN strings, sampling every N moves
+    Every move of the game tree, mainline and all variations, depth first with the
+    mainline continuation before its alternatives. Each node: id, parent (node id, None
+    for moves from the starting position), ply, san, move, mainline, board (after the
+    move) and key (position_key of that board, equal across branches and transpositions).
     """
+    nodes: List[Dict[str, Any]] = []
+    stack = [(child, None, game.board(), i == 0) for i, child in reversed(list(enumerate(game.variations)))]
+    while stack:
+        node, parent, board_before, mainline = stack.pop()
+        board = board_before.copy(stack=False)
+        san = board.san(node.move)
+        board.push(node.move)
+        nodes.append({
+            "id": len(nodes),
+            "parent": parent,
+            "ply": board.ply(),
+            "san": san,
+            "move": node.move,
+            "mainline": mainline,
+            "board": board,
+            "key": position_key(board),
+        })
+        for i, child in reversed(list(enumerate(node.variations))):
+            stack.append((child, nodes[-1]["id"], board, nodes[-1]["mainline"] and i == 0))
+    return nodes
+
+def tree_positions(pgn_text: str, every_n_moves: int = 1) -> List[Dict[str, Any]]:
+    """
+    Unique positions of the whole PGN tree (starting position included), sampling
+    every N plies and every line's last position. Positions reached in several
+    branches or by transposition appear once: fen, ply of the first node reaching it
+    and the number of tree nodes that reach it.
+    """
+    game = chess.pgn.read_game(StringIO(pgn_text))
+    if not game:
+        raise ValueError("No valid game found in PGN.")
+    start = game.board()
+    positions: Dict[int, Dict[str, Any]] = {
+        position_key(start): {"fen": start.fen(), "ply": start.ply(), "nodes": 1}
+    }
+    nodes = pgn_tree(game)
+    has_children = {node["parent"] for node in nodes}
+    for node in nodes:
+        if (node["ply"] - start.ply()) % every_n_moves and node["id"] in has_children:
+            continue
+        entry = positions.get(node["key"])
+        if entry is None:
+            positions[node["key"]] = {"fen": node["board"].fen(), "ply": node["ply"], "nodes": 1}
+        else:
+            entry["nodes"] += 1
+    return list(positions.values())
+
+def pgn_to_fens(pgn_text: str, every_n_moves: int = 1, variations: bool = False) -> List[str]:
+    """
+    Convert PGN to list of FEN strings, sampling every N moves. With `variations`,
+    every line of the game tree is sampled and each position is listed once.
+    """
+    if variations:
+        try:
+            return [position["fen"] for position in tree_positions(pgn_text, every_n_moves)]
+        except Exception as e:
+            raise ValueError(f"Error parsing PGN: {e}")
     try:
         game = chess.pgn.read_game(StringIO(pgn_text))
         if not game:
@@ -83,3 +145,19 @@ def fen_to_move_number(pgn_text: str, target_fen: str) -> int:
         
     except Exception:
         return -1
+
+def moves_hash(start_board: chess.Board, moves: List[chess.Move]) -> str:
+    """
+    Normalised game key: starting position + UCI move sequence.
+    Headers, comments and clock annotations don't affect it.
+    """
+    key = start_board.fen() + "|" + " ".join(move.uci() for move in moves)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+def position_key(board: chess.Board) -> int:
+    """
+    Canonical 64-bit position key (Polyglot Zobrist hash): pieces, side to move,
+    castling rights and a capturable en passant square. Move counters and
+    transpositions don't change it.
+    """
+    return chess.polyglot.zobrist_hash(board)
@@ -0,0 +1,122 @@
+"""
+Compact binary encoding for cached position evaluations.
+
+Cache entries are Lichess cloud-eval dicts ({"fen", "knodes", "depth", "pvs": [...]}).
+As JSON, most of an entry is the echoed FEN, key names and space-separated UCI
+strings. The binary layout (little endian, version 1) stores only the numbers:
+
+    header   B version | B flags | B depth | I knodes | B number of lines
+    [flags & HAS_TABLEBASE]   b wdl | h dtz
+    per line h score | B number of moves | H move * n
+
+- score: a utils.score.Score from White's perspective: int16 centipawns (clamped
+  to ±32000), or a mate stored as sign * (32767 - moves), i.e. in the reserved
+  band above ±32511
+- move: 16 bits, from square | to square << 6 | promotion piece code << 12
+
+The FEN is not stored: the cache key already identifies the position, so the
+caller passes it back in when decoding.
+"""
+import struct
+from functools import lru_cache
+from typing import Any, Dict, List
+import chess
+from utils.score import Score
+
+FORMAT_VERSION = 1
+
+HAS_TABLEBASE = 0x01
+
+_HEADER = struct.Struct("<BBBIB")
+_TABLEBASE = struct.Struct("<bh")
+_LINE = struct.Struct("<hB")
+
+MAX_CP = 32000
+MATE_BASE = 32767
+MAX_MATE = 255
+
+# Every from/to/promotion combination, precomputed: one table lookup per move
+# instead of parsing, since this runs for every move of every cached line
+_MOVE_NAMES = [""] * (1 << 15)
+for _code in range(1, 1 << 15):
+    _promotion = _code >> 12
+    if _promotion <= 4:
+        _MOVE_NAMES[_code] = (chess.SQUARE_NAMES[_code & 0x3F] + chess.SQUARE_NAMES[(_code >> 6) & 0x3F]
+                              + ("", "n", "b", "r", "q")[_promotion])
+_MOVE_NAMES[0] = "0000"
+_MOVE_CODES = {name: code for code, name in enumerate(_MOVE_NAMES) if name}
+
+
+def encode_move(uci: str) -> int:
+    try:
+        return _MOVE_CODES[uci]
+    except KeyError:
+        raise ValueError(f"Cannot encode move '{uci}'")
+
+
+def decode_move(code: int) -> str:
+    return _MOVE_NAMES[code]
+
+
+def encode_score(score: Score) -> int:
+    if score.is_mate:
+        moves = min(abs(score.mate), MAX_MATE)
+        return MATE_BASE - moves if score.mate >= 0 else -(MATE_BASE - moves)
+    return max(-MAX_CP, min(MAX_CP, score.cp))
+
+
+# Scores are immutable, so decoded ones are shared between entries
+@lru_cache(maxsize=8192)
+def decode_score(value: int) -> Score:
+    if abs(value) > MATE_BASE - MAX_MATE - 1:
+        moves = MATE_BASE - abs(value)
+        return Score(mate=moves if value > 0 else -moves)
+    return Score(cp=value)
+
+
+def encode_eval(analysis: Dict[str, Any]) -> bytes:
+    """Pack a Lichess-format evaluation (the "fen" field is dropped)"""
+    pvs: List[Dict[str, Any]] = analysis.get("pvs", [])[:255]
+    has_tablebase = analysis.get("wdl") is not None
+    parts = [_HEADER.pack(
+        FORMAT_VERSION,
+        HAS_TABLEBASE if has_tablebase else 0,
+        min(int(analysis.get("depth") or 0), 255),
+        min(int(analysis.get("knodes") or 0), 0xFFFFFFFF),
+        len(pvs),
+    )]
+    if has_tablebase:
+        parts.append(_TABLEBASE.pack(analysis["wdl"], max(-32768, min(32767, analysis.get("dtz") or 0))))
+    for pv in pvs:
+        try:
+            moves = [_MOVE_CODES[uci] for uci in (pv.get("moves") or "").split()[:255]]
+        except KeyError as e:
+            raise ValueError(f"Cannot encode move {e}")
+        parts.append(_LINE.pack(encode_score(Score.from_pv(pv) or Score(cp=0)), len(moves)))
+        parts.append(struct.pack(f"<{len(moves)}H", *moves))
+    return b"".join(parts)
+
+
+def decode_eval(data: bytes, fen: str) -> Dict[str, Any]:
+    """Unpack an entry written by `encode_eval`; raises ValueError for unknown versions or corrupt data"""
+    try:
+        version, flags, depth, knodes, line_count = _HEADER.unpack_from(data, 0)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported evaluation encoding version {version}")
+        offset = _HEADER.size
+        analysis: Dict[str, Any] = {"fen": fen, "knodes": knodes, "depth": depth}
+        if flags & HAS_TABLEBASE:
+            analysis["wdl"], analysis["dtz"] = _TABLEBASE.unpack_from(data, offset)
+            offset += _TABLEBASE.size
+        pvs = []
+        for _ in range(line_count):
+            value, move_count = _LINE.unpack_from(data, offset)
+            offset += _LINE.size
+            moves = struct.unpack_from(f"<{move_count}H", data, offset)
+            offset += 2 * move_count
+            score = decode_score(value)
+            pvs.append({"moves": " ".join([_MOVE_NAMES[code] for code in moves]), "cp": score.cp, "mate": score.mate})
+        analysis["pvs"] = pvs
+        return analysis
+    except struct.error as e:
+        raise ValueError(f"Corrupt evaluation entry: {e}")
@@ -0,0 +1,44 @@
+"""
+Request-scoped cancellation for analysis endpoints
+"""
+import asyncio
+from typing import Awaitable, Optional, TypeVar
+from fastapi import Request
+
+T = TypeVar("T")
+
+
+class ClientDisconnected(Exception):
+    """The HTTP client went away before the analysis finished"""
+
+
+async def run_request_scoped(request: Request, work: Awaitable[T],
+                             deadline: Optional[float] = None,
+                             poll_interval: float = 0.5) -> T:
+    """
+    Run `work` as a task tied to the HTTP request.
+
+    The task is cancelled when the client disconnects (ClientDisconnected) or when
+    `deadline` seconds pass (asyncio.TimeoutError). Cancellation propagates into the
+    engine layer: the running search is stopped, its engine goes back to the pool and
+    plies that were still queued are never searched.
+    """
+    task = asyncio.ensure_future(work)
+    loop = asyncio.get_running_loop()
+    expires = loop.time() + deadline if deadline else None
+    try:
+        while True:
+            timeout = poll_interval
+            if expires is not None:
+                timeout = max(0.0, min(poll_interval, expires - loop.time()))
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise ClientDisconnected()
+            if expires is not None and loop.time() >= expires:
+                raise asyncio.TimeoutError(f"analysis exceeded its {deadline:.0f}s deadline")
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
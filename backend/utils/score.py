@@ -0,0 +1,86 @@
+"""
+Engine scores shared by the analysis services, the review and the cache encoding.
+
+A `Score` is either centipawns or moves to mate, from one side's perspective:
+positive is good for that side, and `mate` counts that side's moves to deliver
+mate (negative: that side gets mated; 0: that side is checkmated). Cached and
+Lichess-format evaluations are from White's perspective; `pov` converts between
+White's and the side to move's.
+
+Reviews compare scores on one bounded scale in pawns (`pawns`): centipawns up to
+CP_CEILING_PAWNS, then mates, shorter mates higher, up to MATE_PAWNS for a
+checkmate on the board.
+"""
+import math
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+import chess
+import chess.engine
+
+# Review scale, in pawns: every mate ranks above every centipawn score
+MATE_PAWNS = 20.0
+MATE_STEP_PAWNS = 0.1  # each extra move to mate costs this much...
+MATE_STEPS = 10  # ...for up to this many moves
+CP_CEILING_PAWNS = MATE_PAWNS - (MATE_STEPS + 1) * MATE_STEP_PAWNS
+
+# Lichess win% model (lila WinPercent), on centipawns
+WIN_PERCENT_SLOPE = 0.00368208
+
+
+@dataclass(frozen=True, slots=True)
+class Score:
+    """Centipawns or moves to mate (exactly one is set)"""
+    cp: Optional[int] = None
+    mate: Optional[int] = None
+
+    @classmethod
+    def from_engine(cls, score: chess.engine.PovScore, color: chess.Color = chess.WHITE) -> "Score":
+        """From a python-chess score, as seen by `color`"""
+        relative = score.pov(color)
+        if relative.is_mate():
+            return cls(mate=relative.mate())
+        return cls(cp=relative.score())
+
+    @classmethod
+    def from_pv(cls, pv: Dict[str, Any]) -> Optional["Score"]:
+        """From a Lichess-format line ({"cp": ..., "mate": ...}); None when it has neither"""
+        if pv.get("mate") is not None:
+            return cls(mate=int(pv["mate"]))
+        if pv.get("cp") is not None:
+            return cls(cp=int(pv["cp"]))
+        return None
+
+    def to_pv(self) -> Dict[str, Optional[int]]:
+        return {"cp": self.cp, "mate": self.mate}
+
+    @property
+    def is_mate(self) -> bool:
+        return self.mate is not None
+
+    def __neg__(self) -> "Score":
+        return Score(mate=-self.mate) if self.is_mate else Score(cp=-self.cp)
+
+    def pov(self, color: chess.Color) -> "Score":
+        """
+        The same score for `color`, given one from White's perspective (and the other
+        way round: a score for the side to move comes back from White's perspective)
+        """
+        return self if color == chess.WHITE else -self
+
+    def pawns(self) -> float:
+        """Position on the review scale (see module docstring)"""
+        if self.is_mate:
+            steps = min(abs(self.mate), MATE_STEPS) if self.mate else 0
+            value = MATE_PAWNS - steps * MATE_STEP_PAWNS
+            return value if self.mate > 0 else -value
+        return max(-CP_CEILING_PAWNS, min(CP_CEILING_PAWNS, self.cp / 100.0))
+
+    def win_percent(self) -> float:
+        """Winning chances (0-100) of the side the score is for, on the review scale"""
+        return 50 + 50 * (2 / (1 + math.exp(-WIN_PERCENT_SLOPE * self.pawns() * 100)) - 1)
+
+    def __str__(self) -> str:
+        if self.is_mate:
+            return f"#{self.mate}"
+        return f"{self.cp / 100:+.2f}"
+
@@ -1,9 +1,9 @@
 "use client";
 
-import { useState, useEffect, useCallback } from "react";
+import { useState, useEffect, useCallback, useRef } from "react";
 import { Chess } from "chess.js";
 import { Chessboard } from "react-chessboard";
-import { getEnhancedEvaluation, LichessEvaluation, EnhancedAnalysisResult } from "../lib/lichessAPI";
+import { getEnhancedEvaluation, openLiveAnalysis, LiveAnalysisConnection, LichessEvaluation, EnhancedAnalysisResult } from "../lib/lichessAPI";
 import EvaluationDisplay from "./EvaluationDisplay";
 import EvaluationBar from "./EvaluationBar";
 import { Game } from "../types/chess";
@@ -25,6 +25,10 @@ export default function GameViewer({ pgn, gameData, initialMoveIndex }: GameView
   const [evaluationEnabled, setEvaluationEnabled] = useState(false);
   const [evaluationSource, setEvaluationSource] = useState<string>("");
   const [lastEvaluatedPosition, setLastEvaluatedPosition] = useState<string>("");
+  const evaluationController = useRef<AbortController | null>(null);
+  const liveAnalysis = useRef<LiveAnalysisConnection | null>(null);
+  const liveFen = useRef<string>("");
+  const liveDone = useRef(true); // liveFen's search finished (or failed)
 
   // Load PGN when it changes
   useEffect(() => {
@@ -79,6 +83,31 @@ export default function GameViewer({ pgn, gameData, initialMoveIndex }: GameView
     }
   }, [pgn]); // Remove 'game' from dependencies
 
+  // One HTTP request per position (when the live channel is unavailable)
+  const evaluateOverHttp = useCallback(async (position: string) => {
+    evaluationController.current?.abort();
+    const controller = new AbortController();
+    evaluationController.current = controller;
+    
+    try {
+      const result = await getEnhancedEvaluation(position, 15, controller.signal);
+      if (controller.signal.aborted) return;
+      if (result && result.evaluation) {
+        setCurrentEvaluation(result.evaluation);
+        setEvaluationSource(result.source);
+      } else {
+        setCurrentEvaluation(null);
+        setEvaluationSource("");
+      }
+    } catch (error) {
+      console.error("Failed to get evaluation:", error);
+      setCurrentEvaluation(null);
+      setEvaluationSource("");
+    } finally {
+      if (!controller.signal.aborted) setIsEvaluationLoading(false);
+    }
+  }, []);
+
   const updateBoard = useCallback(async (index: number) => {
     if (!cleanedPgn || index < 0) return;
     
@@ -112,25 +141,22 @@ export default function GameViewer({ pgn, gameData, initialMoveIndex }: GameView
           setIsEvaluationLoading(true);
           setLastEvaluatedPosition(newFen); // Set immediately to prevent duplicate requests
           
-          try {
-            const result = await getEnhancedEvaluation(newFen);
-            if (result && result.evaluation) {
-              setCurrentEvaluation(result.evaluation);
-              setEvaluationSource(result.source);
-            } else {
-              setCurrentEvaluation(null);
-              setEvaluationSource("");
-            }
-          } catch (error) {
-            console.error("Failed to get evaluation:", error);
-            setCurrentEvaluation(null);
-            setEvaluationSource("");
-          } finally {
-            setIsEvaluationLoading(false);
+          // Cancel the search for the position we just left
+          evaluationController.current?.abort();
+          
+          // Live channel: the backend stops the previous search and streams the new one
+          if (liveAnalysis.current) {
+            liveFen.current = newFen;
+            liveDone.current = false;
+            liveAnalysis.current.analyze(newFen);
+            return;
           }
+          
+          await evaluateOverHttp(newFen);
         }
       } else {
         // Clear evaluation when disabled
+        evaluationController.current?.abort();
         setCurrentEvaluation(null);
         setEvaluationSource("");
         setLastEvaluatedPosition("");
@@ -138,7 +164,40 @@ export default function GameViewer({ pgn, gameData, initialMoveIndex }: GameView
     } catch (error) {
       console.error("Error updating board:", error);
     }
-  }, [cleanedPgn, evaluationEnabled, lastEvaluatedPosition]);
+  }, [cleanedPgn, evaluationEnabled, lastEvaluatedPosition, evaluateOverHttp]);
+
+  // Keep a live analysis connection open while evaluation is shown
+  useEffect(() => {
+    if (!evaluationEnabled) return;
+    const connection = openLiveAnalysis((message) => {
+      if (message.fen !== liveFen.current) return; // Update for a position we already left
+      if (message.type !== "info") liveDone.current = true; // Final answer (or failure) for this position
+      if (message.evaluation) {
+        setCurrentEvaluation(message.evaluation);
+        setEvaluationSource(message.source || "stockfish");
+      }
+      setIsEvaluationLoading(false);
+    }, 3, () => {
+      // Fall back to one HTTP request per position
+      if (liveAnalysis.current !== connection) return;
+      liveAnalysis.current = null;
+      // The position sent last was never finished: ask for it over HTTP instead
+      if (liveFen.current && !liveDone.current) {
+        liveDone.current = true;
+        evaluateOverHttp(liveFen.current);
+      }
+    });
+    liveAnalysis.current = connection;
+    return () => {
+      liveAnalysis.current = null;
+      connection.close();
+    };
+  }, [evaluationEnabled, evaluateOverHttp]);
+
+  // Stop any pending evaluation when the viewer unmounts
+  useEffect(() => {
+    return () => evaluationController.current?.abort();
+  }, []);
 
   // Handle initial move index when provided
   useEffect(() => {
@@ -1,18 +1,12 @@
 import { Game } from "@/types/chess";
 
+const BACKEND_URL = process.env.NEXT_PUBLIC_BACKEND_URL || "http://localhost:8000";
+
 export async function fetchRecentGames(username: string): Promise<Game[]> {
-  // Get archives first
-  const archiveRes = await fetch(
-    `https://api.chess.com/pub/player/${username}/games/archives`
+  // Latest month archive through the backend's archive cache (Chess.com API format)
+  const gamesRes = await fetch(
+    `${BACKEND_URL}/games/archives/${encodeURIComponent(username)}?months=1`
   );
-  if (!archiveRes.ok) throw new Error("Failed to fetch archives");
-  const archives = await archiveRes.json();
-
-  // Get the latest month archive
-  const latestArchive = archives.archives.pop();
-  if (!latestArchive) return [];
-
-  const gamesRes = await fetch(latestArchive);
   if (!gamesRes.ok) throw new Error("Failed to fetch games");
   const data = await gamesRes.json();
 
@@ -48,11 +48,12 @@ export async function getLichessEvaluation(fen: string, multiPv: number = 3): Pr
 }
 
 // Enhanced backend analysis functions
-export async function getEnhancedEvaluation(fen: string, depth: number = 15): Promise<EnhancedAnalysisResult | null> {
+// Pass an AbortSignal to cancel the request; the backend then stops the engine search too
+export async function getEnhancedEvaluation(fen: string, depth: number = 15, signal?: AbortSignal): Promise<EnhancedAnalysisResult | null> {
   try {
     const url = `${BACKEND_URL}/games/analyze-fen?fen=${encodeURIComponent(fen)}&depth=${depth}`;
     
-    const response = await fetch(url);
+    const response = await fetch(url, { signal });
     if (!response.ok) {
       console.error(`Enhanced analysis failed: ${response.status}`);
       return null;
@@ -61,11 +62,64 @@ export async function getEnhancedEvaluation(fen: string, depth: number = 15): Pr
     const data = await response.json();
     return data;
   } catch (error) {
+    if (error instanceof DOMException && error.name === "AbortError") {
+      return null;
+    }
     console.error("Error fetching enhanced evaluation:", error);
     return null;
   }
 }
 
+// Live analysis over a WebSocket: one engine session per board, streamed updates
+export interface LiveAnalysisMessage {
+  type: "eval" | "info" | "done" | "error";
+  fen?: string;
+  source?: string;
+  depth?: number;
+  evaluation?: LichessEvaluation | null;
+  detail?: string;
+}
+
+export interface LiveAnalysisConnection {
+  analyze: (fen: string) => void;
+  stop: () => void;
+  close: () => void;
+}
+
+export function openLiveAnalysis(
+  onMessage: (message: LiveAnalysisMessage) => void,
+  multiPv: number = 3,
+  onClose?: () => void
+): LiveAnalysisConnection {
+  const socket = new WebSocket(`${BACKEND_URL.replace(/^http/, "ws")}/games/live`);
+  let pending: string | null = null;
+
+  const send = (payload: object) => {
+    const data = JSON.stringify(payload);
+    if (socket.readyState === WebSocket.OPEN) {
+      socket.send(data);
+    } else {
+      pending = data; // Only the latest position matters
+    }
+  };
+
+  socket.onopen = () => {
+    if (pending) {
+      socket.send(pending);
+      pending = null;
+    }
+  };
+  socket.onmessage = (event) => onMessage(JSON.parse(event.data));
+  socket.onerror = (error) => console.error("Live analysis connection error:", error);
+  socket.onclose = () => onClose?.();
+
+  return {
+    analyze: (fen: string) => send({ fen, multi_pv: multiPv }),
+    stop: () => send({ type: "stop" }),
+    close: () => socket.close(),
+  };
+}
+
 export async function getBatchEvaluation(fens: string[], depth: number = 12): Promise<BatchAnalysisResult | null> {
   try {
     const url = `${BACKEND_URL}/games/analyze-batch`;